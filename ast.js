@@ -4,8 +4,10 @@ var fs = require('fs')
   , util = require('util')
   , async = require('async')
   , Tokenizer = require('./tokenizer')
+  , LineIndex = require('./util/lines')
   , autoimport = require('./util/autoimport');
 
+
 function indent(level) {
     var buf = '';
     for (var i=0; i < level; i++) {
@@ -41,8 +43,11 @@ function Ast(path, buffer, options) {
         this.log = function(){};
     }
 
-    if (options)
+    if (options) {
         this.fromJavap = options.fromJavap;
+        this.declarationsOnly = options.declarationsOnly;
+        this.lazyBodies = options.lazyBodies;
+    }
 
     var self = this;
     this.on('qualified', function(node) {
@@ -147,6 +152,28 @@ Ast.prototype.locate = function(line, ch) {
     return this._root.locate(line, ch);
 };
 
+/**
+ * Find every node that overlaps the given lines
+ *
+ * @param first First line to look at
+ * @param last (optional) Last line, inclusive; if not
+ *  provided, we only look at `first`
+ * @return An array of nodes, each parent before its kids
+ */
+Ast.prototype.nodesBetween = function(first, last) {
+    if (!this._root)
+        throw new Error("Ast not parsed yet");
+
+    if (last === undefined)
+        last = first;
+
+    var root = this._part || this._root;
+    var found = [];
+    if (root.start.line <= last && root.end.line >= first)
+        root._collectBetween(first, last, found);
+    return found;
+};
+
 /** Generally called for you... */
 Ast.prototype.parse = function(startType) {
 
@@ -163,6 +190,195 @@ Ast.prototype.parse = function(startType) {
     return this._root;
 };
 
+/**
+ * Update this (fully-parsed) Ast in place after an edit,
+ *  re-parsing only the innermost method or initializer block
+ *  that encloses the changed lines, splicing it into the
+ *  existing tree, and shifting the positions of everything
+ *  after it.
+ *
+ * @param buffer The full, edited buffer
+ * @param changed A dict describing the edit, in terms of the
+ *  lines of the buffer we were parsed from:
+ *  - start: First (1-indexed) line that was replaced
+ *  - end: Last line that was replaced; for a pure insertion
+ *      before `start`, this is `start - 1`
+ *  - delta: Number of lines added (negative if removed)
+ * @return True if we were able to update; if false, the
+ *  edit couldn't be isolated and you should do a full parse
+ */
+Ast.prototype.reparse = function(buffer, changed) {
+    var root = this._root;
+    if (!(root instanceof CompilationUnit) || this._part)
+        return false;
+
+    var target = _findReparseTarget(root, changed.start, changed.end);
+    if (!target)
+        return false;
+
+    var text = buffer.text || buffer;
+    var lines = LineIndex.of(text);
+    var startOffset = lines.offsetOf(target.start.line, target.start.ch);
+    var endOffset = lines.offsetOf(target.end.line + changed.delta, target.end.ch);
+    if (startOffset < 0 || endOffset <= startOffset)
+        return false;
+
+    var body = target.getParent();
+    var tok = new Tokenizer(this.tok._path, {
+        type: 'full'
+      , text: text.slice(startOffset, endOffset)
+      , start: target.start.line
+    }, {
+        strict: false
+      , ch: target.start.ch
+    });
+
+    // the new subtree will publish its own qualifieds;
+    //  keep a copy in case we have to back out
+    var previous = this.qualifieds;
+    var oldNodes = _collectQualified(target);
+    this.qualifieds = util._extend({}, previous);
+
+    var replacement;
+    var bodyTok = body.tok;
+    tok.getJavadoc(); // don't pick up anything stale
+    body.tok = tok;
+    try {
+        replacement = body._readDeclaration();
+    } catch (e) {
+        replacement = null;
+    } finally {
+        body.tok = bodyTok;
+    }
+
+    // blocks quietly end at EOF, so if the edit
+    //  unbalanced the braces we have to check
+    var unbalanced = !replacement
+        || (replacement.body || replacement)._unclosed
+        || tok.errors.some(function(err) {
+            return ~err.message.indexOf('Expecting=`}`');
+        });
+    if (unbalanced
+            || replacement.constructor != target.constructor
+            || replacement.name != target.name
+            || tok.prepare().pos != endOffset - startOffset) {
+        this.qualifieds = previous;
+        return false;
+    }
+
+    // drop whatever the old subtree declared, but don't let
+    //  the new one clobber (eg) another overload of itself
+    var published = this.qualifieds;
+    var qualifieds = this.qualifieds = {};
+    Object.keys(previous).forEach(function(name) {
+        if (!~oldNodes.indexOf(previous[name]))
+            qualifieds[name] = previous[name];
+    });
+    Object.keys(published).forEach(function(name) {
+        if (!(name in qualifieds) && !~oldNodes.indexOf(published[name]))
+            qualifieds[name] = published[name];
+    });
+
+    // splice it in
+    ['kids', 'methods', 'constructors', 'blocks'].forEach(function(key) {
+        var index = body[key].indexOf(target);
+        if (~index)
+            body[key][index] = replacement;
+    });
+    body._sortedKids = undefined;
+
+    _shiftPositions(root, target.end, changed.delta, replacement);
+
+    this.tok = new Tokenizer(this.tok._path, buffer);
+    this.emit('end', this);
+    return true;
+};
+
+/**
+ * Find the innermost ClassBody member (a method with
+ *  a body, or an initializer block) that strictly encloses
+ *  the lines [first, last]; IE: its first and last lines
+ *  are untouched
+ */
+function _findReparseTarget(node, first, last) {
+    var kids = node.getKids();
+    for (var i=0; i < kids.length; i++) {
+        var kid = kids[i];
+        if (!(kid.start && kid.end
+                && kid.start.line < first && kid.end.line > last))
+            continue;
+
+        var deeper = _findReparseTarget(kid, first, last);
+        if (deeper)
+            return deeper;
+
+        if (node instanceof ClassBody
+                && ((kid instanceof Method && kid.body)
+                    || kid instanceof Block))
+            return kid;
+    }
+}
+
+/** Collect the node and all its descendants that have a qualifiedName */
+function _collectQualified(node, found) {
+    if (!found)
+        found = [];
+
+    if (node.qualifiedName)
+        found.push(node);
+
+    node.getKids().forEach(function(kid) {
+        _collectQualified(kid, found);
+    });
+    return found;
+}
+
+/**
+ * Move every position at or after `after` by `delta` lines,
+ *  skipping the subtree at `skip`. Position objects are often
+ *  shared between nodes (a Method's start is its Modifiers'
+ *  start, for example), so we take care to move each only once
+ */
+function _shiftPositions(root, after, delta, skip) {
+    if (!delta)
+        return;
+
+    var line = after.line;
+    var ch = after.ch;
+    var stamp = {};
+
+    function isBefore(pos) {
+        return pos.line < line || (pos.line == line && pos.ch < ch);
+    }
+
+    function shift(pos) {
+        if (!pos || pos._shifted === stamp || isBefore(pos))
+            return;
+
+        Object.defineProperty(pos, '_shifted', {
+            value: stamp
+          , configurable: true
+        });
+        pos.line += delta;
+    }
+
+    (function visit(node) {
+        if (node === skip || !node.end || isBefore(node.end))
+            return; // entirely before the edit
+
+        shift(node.start);
+        shift(node.end);
+        if (node._lazy) {
+            // not parsed yet; when it is, it
+            //  should come out already shifted
+            node._lazy.line += delta;
+            return;
+        }
+
+        node.getKids().forEach(visit);
+    })(root);
+}
+
 Ast.prototype.getImports = function() {
     return (this._root instanceof CompilationUnit)
         ? this._root.imports
@@ -181,6 +397,15 @@ Ast.prototype.getParent = function() {
     return null; // never
 };
 
+/** @return The length of the source we parsed, in bytes */
+Ast.prototype.getSourceLength = function() {
+    return this.tok._fp.length;
+};
+
+Ast.prototype.getPath = function() {
+    return this.tok._path;
+};
+
 
 Ast.prototype.getStaticImportType = function(methodName) {
     var path = this._root.namedImports[methodName];
@@ -461,11 +686,13 @@ SimpleNode.prototype.locate = function(line, ch) {
         return false; // quick reject... WE don't contain, so kids can't
     }
 
-    var kids = this.getKids()
-    if (kids) {
-        var matching = kids.filter(function(kid) {
-            return kid.contains(line, ch);
-        });
+    var kids = this._getSortedKids();
+    if (kids.length) {
+        var matching = [];
+        for (var i = _lastStartingBefore(kids, line, ch);
+                i >= 0 && kids[i].contains(line, ch); i--) {
+            matching.push(kids[i]);
+        }
 
         if (matching.length == 1) {
             // recurse! Is stack overflow a concern?
@@ -485,6 +712,68 @@ SimpleNode.prototype.locate = function(line, ch) {
 };
 
 
+/**
+ * Collect this node and all its descendants that overlap
+ *  the lines [first, last] into `found`, parents first
+ */
+SimpleNode.prototype._collectBetween = function(first, last, found) {
+    found.push(this);
+
+    // skip the kids that end before `first`
+    var kids = this._getSortedKids();
+    var low = 0;
+    var high = kids.length;
+    while (low < high) {
+        var mid = (low + high) >> 1;
+        if (kids[mid].end.line < first)
+            low = mid + 1;
+        else
+            high = mid;
+    }
+
+    for (var i = low; i < kids.length && kids[i].start.line <= last; i++) {
+        kids[i]._collectBetween(first, last, found);
+    }
+};
+
+/**
+ * @return Our kids, sorted by start position. This is
+ *  cached, so if you change our kids after parsing
+ *  (see reparse) you must clear _sortedKids
+ */
+SimpleNode.prototype._getSortedKids = function() {
+    if (!this._sortedKids) {
+        this._sortedKids = this.getKids().slice().sort(function(a, b) {
+            return a.start.line - b.start.line
+                || a.start.ch - b.start.ch;
+        });
+    }
+
+    return this._sortedKids;
+};
+
+/**
+ * @return The index of the last of the sorted nodes
+ *  that starts at or before line/ch, or -1 if none do
+ */
+function _lastStartingBefore(nodes, line, ch) {
+    var low = 0;
+    var high = nodes.length - 1;
+    var found = -1;
+    while (low <= high) {
+        var mid = (low + high) >> 1;
+        var start = nodes[mid].start;
+        if (start.line < line || (start.line == line && start.ch <= ch)) {
+            found = mid;
+            low = mid + 1;
+        } else {
+            high = mid - 1;
+        }
+    }
+
+    return found;
+}
+
 SimpleNode.prototype.getParent = function() {
     return this._prev;
 }
@@ -1644,6 +1933,28 @@ function Block(prev) {
 
     var tok = this.tok;
     tok.expectBlockOpen();
+
+    var root = this._root;
+    if (root.declarationsOnly || root.lazyBodies) {
+        var state = tok.save();
+        if (!tok.skipBlock())
+            this._unclosed = true;
+
+        // declarationsOnly means nobody's going to look inside
+        if (root.lazyBodies)
+            this._defer(state);
+
+        this._end();
+        return;
+    }
+
+    this._readStatements();
+    this._end();
+}
+util.inherits(Block, ScopeNode);
+
+Block.prototype._readStatements = function() {
+    var tok = this.tok;
     var closed = false;
     while (!((closed = tok.readBlockClose()) || tok.isEof())) {
         // ex: while(...) { ; } 
@@ -1657,9 +1968,47 @@ function Block(prev) {
         }
     }
 
-    this._end();
-}
-util.inherits(Block, ScopeNode);
+    if (!closed)
+        this._unclosed = true; // ran out of input
+};
+
+/**
+ * Don't parse our statements until someone asks
+ *  for our kids (getKids, locate, searchScope, etc.)
+ *
+ * @param state Tokenizer state just inside our open brace
+ */
+Block.prototype._defer = function(state) {
+    this._lazy = state;
+    Object.defineProperty(this, 'kids', {
+        get: this._materialize
+      , enumerable: true // so getKids finds us
+      , configurable: true
+    });
+};
+
+Block.prototype._materialize = function() {
+    var state = this._lazy;
+    this._lazy = undefined;
+    Object.defineProperty(this, 'kids', {
+        value: []
+      , writable: true
+      , enumerable: true
+      , configurable: true
+    });
+
+    var tok = this.tok;
+    var resume = tok.save();
+    tok.restore(state);
+    try {
+        this._readStatements();
+    } finally {
+        tok.restore(resume);
+        tok.getJavadoc(); // don't leak anything from in here
+    }
+
+    return this.kids;
+};
 
 Block.prototype._getVars = function() {
     return this.kids.filter(function(statement) {
@@ -3801,8 +4150,20 @@ module.exports = {
      *      event `missing` will be emitted
      *  - fromJavap: True if we're parsing the output of javap. There are
      *      some differences, such as type names being fully qualified, etc.
+     *  - declarationsOnly: (default: false) Skip over the contents
+     *      of method bodies and initializer blocks without parsing
+     *      them. Much cheaper when all you want are the declared
+     *      types and members (IE: for indexing)
+     *  - lazyBodies: (default: false) Like declarationsOnly, but
+     *      method bodies and initializer blocks are parsed the first
+     *      time something (locate, searchScope, etc.) looks inside.
+     *      Their contents won't be in `qualifieds` until then, and
+     *      errors in them won't be reported until then
      *  - loader: A ClassLoader to use when checking imports. If not
      *      provided, we will fetch a cached one if needed
+     *  - base: For partial buffers, the Ast of the whole file to
+     *      parse onto. If not provided, we get it from the cached
+     *      ClassLoader
      */
     parseFile: function(path, buffer, options, callback) {
         if (!callback) {
@@ -3814,8 +4175,7 @@ module.exports = {
             // partial buffer! We need the base ast
             // and then we'll parse on top. Generally,
             // the base Ast should already be cached
-            require('./classloader').cachedFromSource(path)
-            .openAst(path, options, function(err, ast) {
+            var onBase = function(err, ast) {
                 if (err) return callback(err);
 
                 try {
@@ -3827,7 +4187,13 @@ module.exports = {
                 }
 
                 callback(null, ast);
-            });
+            };
+
+            if (options.base)
+                return onBase(null, options.base);
+
+            require('./classloader').cachedFromSource(path)
+            .openAst(path, options, onBase);
             return;
         }
 
@@ -3842,6 +4208,36 @@ module.exports = {
         callback(null, ast);
     },
 
+    /**
+     * Update a previously-parsed Ast for an edited buffer,
+     *  only re-parsing the method or block that changed if
+     *  we can, falling back to a full parseFile otherwise.
+     *  The previous Ast should not be used after calling this,
+     *  since it may have been updated in place.
+     *
+     * @param ast The previous Ast for the path
+     * @param buffer The full, edited buffer
+     * @param changed The changed lines; see Ast.reparse
+     */
+    reparse: function(ast, buffer, changed, options, callback) {
+        if (!callback) {
+            callback = options;
+            options = {};
+        }
+
+        var updated;
+        try {
+            updated = ast.reparse(buffer, changed);
+        } catch (e) {
+            updated = false;
+        }
+
+        if (updated)
+            return callback(null, ast);
+
+        module.exports.parseFile(ast.getPath(), buffer, options, callback);
+    },
+
     /**
      * Convenience for when you don't already have a buffer
      */
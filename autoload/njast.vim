@@ -19,6 +19,24 @@ if !exists('g:njast#command')
   let g:njast#command = ["node", expand('<sfile>:h:h') . '/server.js']
 endif
 
+if !exists('g:njast#daemon')
+  " share one server (and its warm caches) between every
+  "  vim, instead of starting one for each
+  let g:njast#daemon = 0
+endif
+
+if !exists('g:njast#daemonIdle')
+  " seconds the shared server waits without requests
+  "  before exiting
+  let g:njast#daemonIdle = 1800
+endif
+
+if !exists('g:njast#asyncCompletion')
+  " fetch completions in the background and pop them
+  "  up when they arrive; requires timers
+  let g:njast#asyncCompletion = has('timers')
+endif
+
 " ------------------------------------------------------------------------
 " Vim interface
 " ------------------------------------------------------------------------
@@ -65,22 +83,48 @@ function! njast#ShowJavadoc()
     wincmd p
 endfunction
 
+function! njast#DumpStats()
+    call njast#util#showWindow()
+
+    setlocal ft=
+
+    " where the server and client are spending their time
+    py Njast.dumpStats()
+
+    call njast#util#resizeWindow()
+
+    " pop back
+    wincmd p
+endfunction
+
 
 function! njast#Complete(findstart, complWord)
     if a:findstart
         py Njast.ensureCompletionCached()
         return b:njastLastCompletionPos['start']
-    elseif b:njastLastCompletionPos['end'] - b:njastLastCompletionPos['start'] == len(a:complWord)
-        return b:njastLastCompletion
-
-    else
-        let rest = []
-        for entry in b:njastLastCompletion
-            if stridx(entry["word"], a:complWord) == 0
-                call add(rest, entry)
-            endif
-        endfor
-        return rest
+    endif
+
+    " the server already matched them against what's typed
+    "  (not just by prefix) and ranked them; keep them as-is,
+    "  and come back for each character typed
+    return {'words': b:njastLastCompletion, 'refresh': 'always'}
+endfunction
+
+
+function! njast#_awaitCompletion()
+    if exists('s:completionTimer')
+        call timer_stop(s:completionTimer)
+    endif
+    let s:completionTimer = timer_start(20, 'njast#_pollCompletion',
+        \ {'repeat': -1})
+endfunction
+
+function! njast#_pollCompletion(timer)
+    if !pyeval('int(Njast.deliverCompletion())')
+        call timer_stop(a:timer)
+        if exists('s:completionTimer') && s:completionTimer == a:timer
+            unlet s:completionTimer
+        endif
     endif
 endfunction
 
@@ -99,10 +143,13 @@ function! njast#Enable()
     nnoremap <buffer> K :call njast#ShowJavadoc()<cr>
     nnoremap <buffer> gd :call njast#GotoDefinition()<cr>
 
+    command! -buffer NjastStats call njast#DumpStats()
+
     augroup NjastBuffer
         autocmd! * <buffer>
         autocmd BufWritePost <buffer> :py Njast.update()
         autocmd CursorHold,CursorHoldI <buffer> :py Njast.onInterval()
+        autocmd BufUnload <buffer> :py Njast.close(vim.eval('expand("<afile>:p")'), int(vim.eval('expand("<abuf>")')))
     augroup END
 
     " if g:tern_map_keys
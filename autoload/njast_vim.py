@@ -5,13 +5,162 @@ except ImportError:
     # hopefully running in unit test!
     pass
 
-import os, platform, subprocess, urllib2, json, re, time, inspect
-from threading import Thread
+# this is loaded as soon as the first java buffer opens,
+#  so keep the imports light; the rest are imported where used
+import os, sys, subprocess, httplib, socket, json, re, time
+from collections import OrderedDict
+from threading import Thread, Lock, Event
 
 #
 # Utilities
 #
 
+class StaleBufferError(Exception):
+
+    """Raised when the server doesn't have the buffer
+    version we based an incremental sync on"""
+
+class RequestCancelled(Exception):
+
+    """Raised when a request's ticket was cancelled"""
+
+class RequestTicket(object):
+
+    """Handle on an in-flight request that lets another thread
+    cancel it once it's been superseded. Cancelling shuts down
+    the request's socket, if it has one yet; either way, the
+    request will raise RequestCancelled instead of returning"""
+
+    def __init__(self):
+        self.cancelled = False
+        self._conn = None
+        self._lock = Lock()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            conn = self._conn
+
+        if conn is not None and conn.sock is not None:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass # already closed
+
+    def _attach(self, conn):
+        with self._lock:
+            self._conn = conn
+            return not self.cancelled
+
+class ConnectionPool(object):
+
+    """Keeps persistent HTTP/1.1 connections to the njast
+    server, so repeated requests don't pay for connection
+    setup and teardown. Also records per-endpoint latency"""
+
+    # connections kept around while not in use
+    MAX_IDLE = 4
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.latency = {}
+        self._idle = []
+        self._lock = Lock()
+
+    def request(self, path, body, timeout, ticket=None):
+        """POST the (json) body to the given path
+
+        :ticket: (optional) a RequestTicket that may be
+            used to cancel the request
+        :returns: a tuple of (status, responseBody)
+        :raises: socket.error or httplib.HTTPException
+            if we couldn't talk to the server, or
+            RequestCancelled if the ticket was cancelled
+
+        """
+        start = time.time()
+        conn = self._acquire(timeout)
+        try:
+            try:
+                self._attachTicket(ticket, conn)
+                result = self._send(conn, path, body)
+            except socket.timeout:
+                raise
+            except (socket.error, httplib.HTTPException):
+                if ticket is not None and ticket.cancelled:
+                    raise RequestCancelled()
+
+                # the server probably closed our idle
+                #  keep-alive connection; reconnect once
+                conn.close()
+                conn = self._connect(timeout)
+                self._attachTicket(ticket, conn)
+                result = self._send(conn, path, body)
+
+            self._attachTicket(ticket, None)
+        except:
+            conn.close()
+            if ticket is not None and ticket.cancelled:
+                raise RequestCancelled()
+            raise
+
+        self._release(conn)
+        self._record(path, time.time() - start)
+        return result
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+        for conn in idle:
+            conn.close()
+
+    def _acquire(self, timeout):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+
+        if conn is None:
+            return self._connect(timeout)
+
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def _attachTicket(self, ticket, conn):
+        if ticket is not None and not ticket._attach(conn):
+            raise RequestCancelled()
+
+    def _connect(self, timeout):
+        return httplib.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.MAX_IDLE:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _record(self, path, elapsed):
+        with self._lock:
+            stats = self.latency.get(path)
+            if stats is None:
+                stats = {'count': 0, 'total': 0.0, 'max': 0.0}
+                self.latency[path] = stats
+            stats['count'] += 1
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            stats['last'] = elapsed
+
+    @staticmethod
+    def _send(conn, path, body):
+        conn.request('POST', path, body, \
+            {'Content-Type': 'application/json'})
+        res = conn.getresponse()
+        return res.status, res.read()
+
 def publicmethod(method):
     """Make a method public accessible as a static method
     on a singleton class. That class MUST be decorated with
@@ -35,8 +184,7 @@ def __publicmethod_container(klass):
     if not hasattr(klass, 'get'):
         raise Exception(str(klass) + ' must have factory method get()')
 
-    methods = inspect.getmembers(klass, predicate=inspect.ismethod)
-    for methodName, m in methods:
+    for methodName, m in klass.__dict__.items():
         if hasattr(m, '__is_public'):
             method = __gen_method(methodName)
             setattr(klass, methodName[1:], classmethod(method))
@@ -60,29 +208,110 @@ class Njast(object):
 
     # lines
     MAX_FULL_BUFFER_SIZE = 750
+
+    # sent with synced buffers; every vim versions its buffers
+    #  with its own changedtick, so a server shared by several
+    #  (see g:njast#daemon) keeps each one's separately
+    CLIENT = os.urandom(8).encode('hex')
     BASE_PARTIAL_PREV = 50
     BASE_PARTIAL_NEXT = 50
 
+    IDENTIFIER_CHAR = re.compile(r'[\w$]')
+
+    # suggestions we ask for at a time; the server sends
+    #  the best matches for what's typed so far
+    COMPLETION_LIMIT = 50
+
+    # types whose formatted completions we keep; see
+    #  _cachedCompletions
+    MAX_CACHED_TYPES = 20
+
+    # how many members we'll fetch to cache a whole type
+    MAX_TYPE_MEMBERS = 5000
+
+    # identifiers whose define/document results we keep
+    #  per buffer; see _prefetch
+    MAX_PREFETCHED = 8
+
+    # seconds to wait for a daemon we started to come up
+    DAEMON_START_TIMEOUT = 10
+
+    # seconds async requests wait for the server to start
+    #  before giving up on it
+    START_TIMEOUT = 20
+
+    # seconds after failing to start the server before
+    #  we'll try again
+    RETRY_DELAY = 30
+
+    # time spent (and bytes produced) serializing
+    #  buffers for requests; see bufferSlice
+    serialization = {'count': 0, 'bytes': 0, 'total': 0.0, 'max': 0.0}
+
+    # name -> time spent in other client-side phases;
+    #  see recordTiming
+    timings = {}
+
     _instance = None
 
     def __init__(self):
         """Private constructor; prefer the #get() singleton accessor """
 
         self.proc = None
+        self.port = None
+        self.connections = None
+        self.last_failed = None
+
+        # set once we know whether the server started
+        self._ready = Event()
+        self._startError = None
+        self._stopped = False
+
         if vim.eval('exists("g:njast#port")') != '0':
             # specifying g:njast#port triggers debug
             #  mode, where we only connect to that port.
             #  Otherwise, we'll start up our own!
-            self.port = vim.eval("g:njast#port")
+            self._started(vim.eval("g:njast#port"))
         else:
-            self.port = self._startServer()
+            # node takes a while to boot, so don't make vim wait;
+            #  requests made meanwhile wait (async) or no-op (sync)
+            command = vim.eval('g:njast#command')
+            if vim.eval('g:njast#daemon') != '0':
+                # share a server with every other vim
+                idle = vim.eval('g:njast#daemonIdle')
+                start = lambda: self._connectDaemon(command, idle)
+            else:
+                start = lambda: self._startServer(command)
+            Thread(target=self._start, args=(start,)).start()
+
+        # bufnr -> (version, lines) last synced to the server
+        self._synced = {}
 
         self._lastImplementations = None
         self._lastUpdate = None
 
+        # the in-flight async suggest request, if any
+        self._pendingCompletion = None
+
+        # path whose project is being indexed in the
+        #  background (see init), and its latest progress
+        self._indexing = None
+        self._indexProgress = None
+        self._pollingIndex = False
+
+        # bufnr -> define/document results fetched while idle;
+        #  see _prefetch
+        self._prefetched = {}
+
+        # type -> formatted completions for its members, least
+        #  recently used first; see _cachedCompletions
+        self._completions = OrderedDict()
+
     @publicmethod
     def _gotoDefinition(self):
-        data = self._run('define')
+        data = self._cachedResult('define', \
+                vim.current.window, vim.current.buffer) \
+            or self._run('define')
         if not data:
             Njast.displayError("Could not resolve definition")
             return
@@ -105,7 +334,8 @@ class Njast(object):
         win = vim.windows[winno-1] # indexing is different
         buf = vim.buffers[bufno]   # indexing is the same (?!)
 
-        data = self._run('document', vimWindow=win, vimBuffer=buf)
+        data = self._cachedResult('document', win, buf) \
+            or self._run('document', vimWindow=win, vimBuffer=buf)
         if not data:
             Njast.appendText("Could not resolve definition")
             return
@@ -138,6 +368,12 @@ class Njast(object):
         """Called periodically
 
         """
+        self._showStartError()
+        self._checkIndexProgress()
+
+        if vim.eval('mode()') == 'n':
+            self._prefetch(vim.current.window, vim.current.buffer)
+
         if not self._lastUpdate:
             return
         self.log("Interval", self._lastUpdate)
@@ -148,6 +384,125 @@ class Njast(object):
 
         # it's been handled!
         self._lastUpdate = None
+
+    def _checkIndexProgress(self):
+        """Report the progress of the background indexing
+        started by init, and poll for more if it's not done
+
+        """
+        if self._indexing is None or self._pollingIndex:
+            return
+
+        progress = self._indexProgress
+        self._indexProgress = None
+        if progress is not None:
+            if not progress.get('indexing'):
+                # done (or the server went away)
+                self._indexing = None
+                if progress.get('found'):
+                    vim.command("echo 'njast: indexed %d files'" \
+                        % progress['found'])
+                return
+
+            vim.command("echo 'njast: indexing %d/%d'" \
+                % (progress['indexed'], progress['found']))
+
+        def on_progress(data):
+            self._indexProgress = data if data else {}
+            self._pollingIndex = False
+
+        self._pollingIndex = True
+        self._asyncRequest('progress', {'path': self._indexing}, on_progress)
+
+    def _prefetch(self, vimWindow, vimBuffer):
+        """Speculatively fetch the definition and javadoc of the
+        identifier under the cursor in the background, so gd and
+        K can answer from the cache (see _cachedResult). Results
+        are kept by (changedtick, position), so any edit to the
+        buffer invalidates them
+
+        """
+        if not self.port:
+            return
+
+        key = self._prefetchKey(vimWindow, vimBuffer)
+        if key is None:
+            return
+
+        version, row, start = key
+        cache = self._prefetched.get(vimBuffer.number)
+        if cache is None or cache['version'] != version:
+            # edited since; whatever we had is stale
+            cache = {'version': version, 'entries': {}, 'order': []}
+            self._prefetched[vimBuffer.number] = cache
+
+        if cache['entries'].has_key((row, start)):
+            return # already have it (or are getting it)
+
+        if len(cache['order']) >= Njast.MAX_PREFETCHED:
+            del cache['entries'][cache['order'].pop(0)]
+
+        results = {}
+        cache['entries'][(row, start)] = results
+        cache['order'].append((row, start))
+
+        # as if the cursor were on the first char (see _buildRequest)
+        doc = self._buildRequest([row, start + 1], vimWindow, vimBuffer)
+        synced = self._synced.get(vimBuffer.number)
+
+        # send them one after the other, so the second can just
+        #  refer to the buffer version the first one synced
+        following = dict(doc)
+        if doc['buffer'].has_key('version'):
+            following['buffer'] = {
+                'type': 'same',
+                'version': doc['buffer']['version'],
+                'client': Njast.CLIENT
+            }
+
+        def on_document(data):
+            if data is not None:
+                results['document'] = data
+
+        def on_define(data):
+            if data is not None:
+                results['define'] = data
+            self._asyncRequest('document', following, \
+                callback=on_document, synced=synced)
+
+        self._asyncRequest('define', doc, callback=on_define, synced=synced)
+
+    def _prefetchKey(self, vimWindow, vimBuffer):
+        """:returns: the (version, row, start) of the identifier
+            under the cursor, or None if it isn't on one
+
+        """
+        row, col = vimWindow.cursor
+        start = Njast.identifierStart(vimBuffer[row - 1], col)
+        if start is None:
+            return None
+
+        return (Njast.bufferVersion(vimBuffer), row, start)
+
+    def _cachedResult(self, type, vimWindow, vimBuffer):
+        """:returns: the prefetched result of a define or document
+            request for the identifier under the cursor, if we
+            have one for the current version of the buffer
+
+        """
+        cache = self._prefetched.get(vimBuffer.number)
+        if cache is None:
+            return None
+
+        key = self._prefetchKey(vimWindow, vimBuffer)
+        if key is None or key[0] != cache['version']:
+            return None
+
+        results = cache['entries'].get(key[1:])
+        if results is None:
+            return None
+
+        return results.get(type)
             
     @publicmethod
     def _ensureCompletionCached(self):
@@ -158,14 +513,117 @@ class Njast(object):
         curRow, curCol = vim.current.window.cursor
         curLine = vim.current.buffer[curRow - 1]
         
+        params = {'limit': Njast.COMPLETION_LIMIT}
+
+        # don't send what we already have
+        known = dict((type, cache['version']) \
+            for type, cache in self._completions.iteritems() \
+            if cache['complete'] and cache['version'] is not None)
+        if known:
+            params['known'] = known
+
         # TODO grok this; it's borrowed verbatim from tern
         if (curRow == int(cached["row"]) and curCol >= int(cached["end"]) and
                 curLine[int(cached["start"]):int(cached["end"])] == cached["word"] and
                 (not re.match(".*\\W", curLine[int(cached["end"]):curCol]))):
+            if curCol == int(cached["end"]):
+                return
+
+            # they're matched and ranked against what was typed
+            #  then; ask again for what's typed now, skipping
+            #  re-resolving the type (unless it's declared in
+            #  the buffer, and so may have changed since)
+            if cached.get("version"):
+                params['type'] = cached["type"]
+
+        if not Njast.isAsyncCompletion():
+            data = self._run('suggest', [curRow, curCol], params=params)
+            self._inflateCompletion(data, curRow, curCol, curLine)
             return
 
-        data = self._run('suggest', [curRow, curCol])
+        # fetch in the background and pop up the menu when it
+        #  arrives; until then, leave completion mode quietly
+        vim.command("let b:njastLastCompletionPos.start = -3")
+        pending = self._pendingCompletion
+        if pending is not None \
+                and pending['bufnr'] == vim.current.buffer.number \
+                and (pending['row'], pending['col']) == (curRow, curCol):
+            return # already on it
+
+        self._suggestAsync(curRow, curCol, params)
+
+    @publicmethod
+    def _deliverCompletion(self):
+        """Check on the async suggest request, inflating and
+        popping up its results if they've arrived and are still
+        relevant to the cursor position. Called periodically from
+        a vim timer (see njast#_awaitCompletion), since only the
+        main thread may touch vim
+
+        :returns: True if we're still waiting on the request
+
+        """
+        pending = self._pendingCompletion
+        if pending is None:
+            return False
+
+        if not pending['done']:
+            if time.time() - pending['started'] < Njast.ASYNC_TIMEOUT:
+                return True
+
+            # give up
+            pending['ticket'].cancel()
+            self._pendingCompletion = None
+            return False
+
+        self._pendingCompletion = None
+        data = pending['data']
+        if data is None:
+            return False
+
+        # drop it if the cursor has moved on
+        curRow, curCol = vim.current.window.cursor
+        curLine = vim.current.buffer[curRow - 1]
+        if vim.current.buffer.number != pending['bufnr'] \
+                or curRow != pending['row'] \
+                or curCol < pending['col'] \
+                or re.match(".*\\W", curLine[pending['col']:curCol]):
+            return False
+
         self._inflateCompletion(data, curRow, curCol, curLine)
+        if vim.eval('mode()') == 'i':
+            vim.command('call feedkeys("\\<c-x>\\<c-o>", "n")')
+        return False
+
+    def _suggestAsync(self, curRow, curCol, params):
+        """Fire off a suggest request in the background,
+        cancelling any that it supersedes
+
+        """
+        if self._pendingCompletion is not None:
+            self._pendingCompletion['ticket'].cancel()
+
+        doc = self._buildRequest([curRow, curCol], \
+            vim.current.window, vim.current.buffer)
+        doc.update(params)
+        pending = {
+            'bufnr': vim.current.buffer.number,
+            'row': curRow,
+            'col': curCol,
+            'started': time.time(),
+            'ticket': RequestTicket(),
+            'done': False
+        }
+        self._pendingCompletion = pending
+
+        def on_result(data):
+            pending['data'] = data
+            pending['done'] = True
+
+        self._asyncRequest('suggest', doc, callback=on_result, \
+            ticket=pending['ticket'], \
+            synced=self._synced.get(vim.current.buffer.number))
+        vim.command('call njast#_awaitCompletion()')
 
     @publicmethod
     def _fetchImplementations(self):
@@ -209,13 +667,26 @@ class Njast(object):
             UltiSnips_Manager.expand_anon(buf, trigger=word)
         except: pass
         
+    @publicmethod
+    def _dumpStats(self):
+        """Append the server's request stats (see util/stats.js)
+        and our own timings to the current buffer
+
+        """
+        server = self._makeRequest('stats', {})
+        latency = self.connections.latency if self.connections else {}
+        Njast.appendText('\n'.join(Njast.formatStats(server, latency)))
+
     @publicmethod
     def _log(self, message, obj=None):
         self._makeRequest('log', {'data': message, 'obj': obj})
 
     @publicmethod
-    def _run(self, type, pos=None, vimWindow=None, vimBuffer=None):
+    def _run(self, type, pos=None, vimWindow=None, vimBuffer=None, \
+            params=None):
         """Run a command
+
+        :params: if provided, extra fields for the request
         """
 
         if vimWindow is None:
@@ -223,6 +694,30 @@ class Njast(object):
         if vimBuffer is None:
             vimBuffer = vim.current.buffer
 
+        doc = self._buildRequest(pos, vimWindow, vimBuffer)
+        if params:
+            doc.update(params)
+
+        data = None
+        try:
+            data = self._makeRequest(type, doc)
+        except StaleBufferError:
+            # the server lost track of our buffer
+            #  (restarted, maybe?); start over
+            self._synced.pop(vimBuffer.number, None)
+            doc['buffer'] = self._syncBuffer(vimWindow, vimBuffer)
+            try:
+                data = self._makeRequest(type, doc)
+            except: pass
+        except: pass
+
+        return data
+
+    def _buildRequest(self, pos, vimWindow, vimBuffer):
+        """Build the request doc for a buffer-based endpoint
+
+        """
+        started = time.time()
         if pos is None:
             row, col = vimWindow.cursor
             if vim.eval('mode()') == 'n':
@@ -230,28 +725,70 @@ class Njast(object):
             # pos = {'line': row, 'ch': col}
             pos = [row, col]
 
-        # TODO this stuff
-        # seq = vim.eval("undotree()['seq_cur']")
-        
         doc = {
             'path': vimBuffer.name,
             'pos': pos,
-            'buffer': Njast.extractBuffer(vimWindow, vimBuffer)
+            'buffer': self._syncBuffer(vimWindow, vimBuffer)
         }
+        Njast.recordTiming('buildRequest', time.time() - started)
+        return doc
 
-        data = None
-        try:
-            data = self._makeRequest(type, doc)
-            if data is None: return None
-        except: pass
+    def _syncBuffer(self, vimWindow, vimBuffer):
+        """Build the buffer to send with a request. Buffers small
+        enough to be sent in full are instead kept in sync with
+        the server incrementally, keyed on vim's changedtick: an
+        unchanged buffer sends just its version, and an edited
+        one sends only the lines that changed.
 
-        return data
+        """
+
+        if len(vimBuffer) >= Njast.MAX_FULL_BUFFER_SIZE:
+            self._synced.pop(vimBuffer.number, None)
+            return Njast.extractBuffer(vimWindow, vimBuffer)
+
+        version = Njast.bufferVersion(vimBuffer)
+        last = self._synced.get(vimBuffer.number)
+        if last is not None and last[0] == version:
+            return {'type': 'same', 'version': version, 'client': Njast.CLIENT}
+
+        lines = vimBuffer[:]
+        self._synced[vimBuffer.number] = (version, lines)
+        if last is None:
+            return {
+                'type': 'full',
+                'text': Njast.bufferSlice(lines),
+                'version': version,
+                'client': Njast.CLIENT
+            }
+
+        changes = []
+        changed = Njast.diffLines(last[1], lines)
+        if changed is not None:
+            start, end, replacement = changed
+            changes.append({
+                'start': start,
+                'end': end,
+                'text': Njast.bufferSlice(replacement)
+            })
+
+        return {
+            'type': 'delta',
+            'base': last[0],
+            'version': version,
+            'changes': changes,
+            'client': Njast.CLIENT
+        }
 
     @publicmethod
     def _stop(self):
         """Stops the njast server, if started
         """
         
+        # if it's still starting, _start stops it once it has
+        self._stopped = True
+        if self.connections is not None:
+            self.connections.close()
+
         proc = self.proc
         self.proc = None
         if proc is None: return
@@ -271,11 +808,24 @@ class Njast(object):
 
         def on_result(data):
             Njast.log("update result!", data)
+            if data:
+                # whatever we'd formatted for these is stale
+                for type in data.get('types', []):
+                    cache = self._completions.get(type)
+                    if cache is not None:
+                        cache['version'] = None
             self._lastUpdate = data
         
         self._asyncRequest('update', {'path': path}, callback=on_result)
 
     def _inflateCompletion(self, data, curRow, curCol, curLine):
+        started = time.time()
+        try:
+            self._inflateCompletionImpl(data, curRow, curCol, curLine)
+        finally:
+            Njast.recordTiming('inflateCompletion', time.time() - started)
+
+    def _inflateCompletionImpl(self, data, curRow, curCol, curLine):
         if data is None: 
             # cancel silently, but stay in complete mode;
             #   hopefully ycm will work
@@ -283,62 +833,173 @@ class Njast(object):
             vim.command("let b:njastLastCompletion = []")
             return
 
+        start, end = (data["start"]["ch"], data["end"]["ch"])
+        type = data.get("type")
+        version = data.get("version")
+        cache = self._cachedCompletions(type, version)
+
         completions = []
-        for type, entries in data["results"].iteritems():
-            formatter = getattr(Njast.SuggestFormat, type)
+        missing = False
+        for kind, entries in data["results"].iteritems():
+            formatter = getattr(Njast.SuggestFormat, kind)
             for entry in entries:
 
-                try:
-                    completions.append(formatter(entry))
-                except:
-                    self._log("Error formatting", entry)
+                completion = None
+                if cache is not None:
+                    completion = cache['entries'].get(entry.get('id'))
+                if completion is None:
+                    if not entry.has_key('name'):
+                        # we were supposed to have this one
+                        missing = True
+                        continue
+
+                    try:
+                        completion = formatter(entry)
+                    except:
+                        self._log("Error formatting", entry)
+                        continue
+
+                    if cache is not None:
+                        cache['entries'][entry['id']] = completion
+
+                completions.append((entry.get('rank', 0), completion))
+
+        if missing:
+            self._completions.pop(type, None)
+        elif cache is not None and not cache['complete']:
+            if start == end and data.get("next") is None:
+                cache['complete'] = True # that was everything
+            else:
+                self._fillCompletions(type, version, curRow, curCol)
+
+        # best matches first
+        completions.sort(key=lambda completion: completion[0])
+        completions = [completion for _, completion in completions]
 
         vim.command("let b:njastLastCompletion = " + json.dumps(completions))
-        start, end = (data["start"]["ch"], data["end"]["ch"])
         vim.command("let b:njastLastCompletionPos = " + json.dumps({
             "row": curRow,
             "start": start,
             "end": end,
-            "word": curLine[start:end]
+            "word": curLine[start:end],
+            "type": data.get("type") or "",
+            "version": version or ""
         }))
 
-    def _makeRequest(self, type, doc, raiseErrors=True, timeout=None):
+    def _cachedCompletions(self, type, version):
+        """Formatted completions for the members of a type, so
+        we needn't re-format them (or, once we have them all,
+        have the server re-send them) for each completion on
+        the same type
+
+        :returns: a dict with the 'version' of the type they're
+            for, its 'entries' (member id -> completion) and
+            whether they're 'complete'; or None if the type
+            can't be cached (IE: it's declared in the buffer)
+
+        """
+        if not type or version is None:
+            return None
+
+        cache = self._completions.pop(type, None)
+        if cache is None or cache['version'] != version:
+            cache = {'version': version, 'entries': {}, 'complete': False}
+
+        self._completions[type] = cache
+        while len(self._completions) > Njast.MAX_CACHED_TYPES:
+            self._completions.popitem(last=False)
+        return cache
+
+    def _fillCompletions(self, type, version, curRow, curCol):
+        """Fetch and format every member of the type in the
+        background, so the next completion on it is cheap
+
+        """
+        cache = self._completions.get(type)
+        if cache is None or cache.get('filling'):
+            return
+
+        cache['filling'] = True
+        doc = self._buildRequest([curRow, curCol], \
+            vim.current.window, vim.current.buffer)
+        doc.update({'type': type, 'prefix': '', \
+            'limit': Njast.MAX_TYPE_MEMBERS})
+
+        def on_result(data):
+            # NB: on the request's thread
+            cache['filling'] = False
+            if not data or data.get('version') != version \
+                    or cache['version'] != version:
+                return
+
+            entries = {}
+            for kind, members in data['results'].iteritems():
+                formatter = getattr(Njast.SuggestFormat, kind)
+                for member in members:
+                    try:
+                        entries[member['id']] = formatter(member)
+                    except:
+                        pass # we'll just have to ask again
+
+            cache['entries'] = entries
+            cache['complete'] = data.get('next') is None
+
+        self._asyncRequest('suggest', doc, callback=on_result, \
+            synced=self._synced.get(vim.current.buffer.number))
+
+    def _makeRequest(self, type, doc, raiseErrors=True, timeout=None, \
+            ticket=None):
         
         if timeout is None:
             timeout = self.TIMEOUT
 
-        try:
-          # float(vim.eval("g:tern_request_timeout"))
-            url = 'http://localhost:' + str(self.port) + '/' + type
-            # req = self.opener.open(url, \
-            #                     json.dumps(doc), \
-            #                     self.TIMEOUT)
-            req = urllib2.Request(url, \
-                data=json.dumps(doc), \
-                headers={'Content-Type':'application/json'})
-            res = urllib2.urlopen(req, timeout=timeout)
-            if res.getcode() == 204:
-                return True # indicate success somehow
-
-            return json.loads(res.read())
-        except urllib2.HTTPError, error:
+        if not self.port:
             if raiseErrors:
-                Njast.displayError(error.read())
+                self._showStartError()
             return None
-        except urllib2.URLError:
+
+        try:
+            status, body = self.connections.request('/' + type, \
+                json.dumps(doc), timeout, ticket=ticket)
+        except (socket.timeout, RequestCancelled):
+            return None
+        except (socket.error, httplib.HTTPException):
             # probably, connection refused
             Njast._instance = None
             return None
 
-    def _asyncRequest(self, type, doc, callback=None):
+        if status == 204:
+            return True # indicate success somehow
+
+        if status == 409:
+            raise StaleBufferError(body)
+
+        if status >= 400:
+            if raiseErrors:
+                Njast.displayError(body)
+            return None
+
+        return json.loads(body)
+
+    def _asyncRequest(self, type, doc, callback=None, ticket=None, \
+            synced=None):
         """Create a request via _makeRequest and 
-        run it asynchronously. This is just designed
-        to update the server's state without slowing
-        down vim; it cannot be used to retrieve any data
+        run it asynchronously, so as not to slow
+        down vim. NB: the callback is run on the
+        request's thread, so it must not touch vim;
+        stash the data somewhere and pick it up
+        from the main thread (see _onInterval and
+        _deliverCompletion)
 
         :type: Endpoint to hit
         :doc: dict with json data to send
         :callback: if provided, called on complete
+        :ticket: if provided, a RequestTicket that can
+            be used to cancel the request
+        :synced: if provided, the (version, lines) from _synced
+            that the doc's buffer was built from; if the server
+            doesn't have that version, it's resent in full. Get
+            it on vim's thread, since _synced is only touched there
 
         """
 
@@ -346,10 +1007,23 @@ class Njast(object):
         #  silently, in case the server isn't running
         #  or whatever
         def safe_caller():
+            # queue behind the server starting up
+            self._ready.wait(Njast.START_TIMEOUT)
+
+            request = lambda doc: self._makeRequest(type, doc, \
+                raiseErrors=False, \
+                timeout=Njast.ASYNC_TIMEOUT, \
+                ticket=ticket)
             try:
-                data = self._makeRequest(type, doc, \
-                    raiseErrors=False, \
-                    timeout=Njast.ASYNC_TIMEOUT)
+                try:
+                    data = request(doc)
+                except StaleBufferError:
+                    # the server lost track of our buffer (restarted,
+                    #  maybe?); send it in full, like _run does
+                    resent = Njast.resendBuffer(doc, synced)
+                    if resent is None:
+                        raise
+                    data = request(resent)
             except Exception, e: 
                 Njast.log('ASYNC ERROR', e.message)
                 if callback is not None:
@@ -363,43 +1037,160 @@ class Njast(object):
             
         Thread(target=safe_caller).start()
 
-    def _startServer(self):
+    def _start(self, start):
+        """Start the server on a background thread (so this
+        must not touch vim), then let any waiting requests
+        through. Errors are shown by _showStartError
+
+        :start: Function that starts (or finds) the server
+            and returns its port, else None
+
+        """
+        try:
+            port = start()
+        except Exception, e:
+            # no node, probably
+            self._startError = "Failed to start server: %s" % e
+            port = None
+
+        if port:
+            self._started(port)
+            if self._stopped:
+                # vim quit while we were starting
+                self._stop()
+        else:
+            self.last_failed = time.time()
+            self._ready.set()
+
+    def _started(self, port):
+        self.connections = ConnectionPool('localhost', port)
+        self.port = port
+        self._ready.set()
+
+    def _showStartError(self):
+        error = self._startError
+        if error is not None:
+            self._startError = None
+            Njast.displayError(error)
+
+    def _startServer(self, command):
         """Initialize the njast server
+
+        :command: node and the path to server.js
         :returns: the port on which we started, else None
 
         """
 
         # FIXME ensure that npm install was run
 
-        win = platform.system() == "Windows"
-        env = None
-        if platform.system() == "Darwin":
-            env = os.environ.copy()
-            env["PATH"] += ":/usr/local/bin"
-        command = vim.eval('g:njast#command') # node (path)
         dir = os.path.dirname(command[1])
-        proc = subprocess.Popen(command,
-                              env=env, cwd=dir,
+        proc = self._spawnServer(command,
                               stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                              stderr=subprocess.STDOUT, shell=win)
+                              stderr=subprocess.STDOUT)
         output = ""
         while True:
             line = proc.stdout.readline()
             if not line:
-                self.displayError(command[1] + " :: " + dir)
-                self.displayError("Failed to start server" +\
-                    (output and ":\n" + output))
-                self.last_failed = time.time()
+                self._startError = command[1] + " :: " + dir + "\n" +\
+                    "Failed to start server" + (output and ":\n" + output)
                 return None
             match = re.match("Listening on port (\\d+)", line)
             if match:
-                port = int(match.group(1))
-                self.port = port
                 self.proc = proc
-                return port
+                return int(match.group(1))
             else:
                 output += line
 
+    def _connectDaemon(self, command, idle):
+        """Connect to the njast daemon shared by all of the
+        user's vims, starting it if it isn't running. We
+        don't own it, so _stop leaves it be; it exits on
+        its own after g:njast#daemonIdle seconds unused
+
+        :command: node and the path to server.js
+        :idle: Seconds the daemon should wait unused before exiting
+        :returns: the daemon's port, else None
+
+        """
+        runtimeDir = Njast.runtimeDir()
+        lockfile = os.path.join(runtimeDir, 'daemon.json')
+        port = Njast.daemonPort(lockfile)
+        if port:
+            return port
+
+        if not os.path.isdir(runtimeDir):
+            os.makedirs(runtimeDir, 0700)
+
+        logPath = os.path.join(runtimeDir, 'daemon.log')
+        command = command + ['--daemon', runtimeDir, '--idle', str(idle)]
+
+        # detach it, so it outlives us
+        if sys.platform == "win32":
+            detach = {'creationflags': 0x00000008 | 0x00000200}
+        else:
+            detach = {'preexec_fn': os.setsid, 'close_fds': True}
+
+        log = open(logPath, 'a')
+        try:
+            self._spawnServer(command, stdin=open(os.devnull), \
+                stdout=log, stderr=subprocess.STDOUT, **detach)
+        finally:
+            log.close()
+
+        # if another vim started one at the same time, ours
+        #  exits and the lockfile points at theirs
+        deadline = time.time() + self.DAEMON_START_TIMEOUT
+        while time.time() < deadline:
+            port = Njast.daemonPort(lockfile)
+            if port:
+                return port
+            time.sleep(0.05)
+
+        self._startError = "Failed to start daemon; see " + logPath
+        return None
+
+    def _spawnServer(self, command, **kwargs):
+        """Popen the njast server from its dir"""
+        win = sys.platform == "win32"
+        env = None
+        if sys.platform == "darwin":
+            env = os.environ.copy()
+            env["PATH"] += ":/usr/local/bin"
+        dir = os.path.dirname(command[1])
+        return subprocess.Popen(command, env=env, cwd=dir, shell=win, \
+            **kwargs)
+
+    @staticmethod
+    def runtimeDir():
+        """:returns: the per-user dir for the daemon's lockfile and log"""
+        import tempfile, getpass
+        base = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+        if hasattr(os, 'getuid'):
+            user = os.getuid()
+        else:
+            user = getpass.getuser()
+        return os.path.join(base, 'njast-%s' % user)
+
+    @staticmethod
+    def daemonPort(lockfile):
+        """Check for a running daemon
+
+        :lockfile: Path to the daemon's lockfile
+        :returns: the port it's listening on, if it is
+
+        """
+        try:
+            with open(lockfile) as fp:
+                port = int(json.load(fp)['port'])
+        except (IOError, ValueError, KeyError, TypeError):
+            return None
+
+        try:
+            socket.create_connection(('localhost', port), 0.5).close()
+        except socket.error:
+            return None # stale; it's gone
+        return port
+
     @staticmethod
     def appendText(text):
         """Append text to the current buffer
@@ -409,17 +1200,162 @@ class Njast(object):
         """
         vim.current.buffer.append(text.split('\n'))
 
+    @staticmethod
+    def resendBuffer(doc, synced):
+        """Build a copy of a request doc whose buffer was synced
+        from the given (version, lines), with the full text instead.
+        Doesn't touch vim, so it's safe off vim's thread
+
+        :returns: the new doc, or None if its buffer isn't from synced
+
+        """
+        buf = doc.get('buffer')
+        if synced is None or not isinstance(buf, dict) \
+                or buf.get('version') != synced[0]:
+            return None
+
+        version, lines = synced
+        resent = dict(doc)
+        resent['buffer'] = {
+            'type': 'full',
+            'text': '\n'.join(lines) + '\n' if lines else '',
+            'version': version,
+            'client': Njast.CLIENT
+        }
+        return resent
+
     @staticmethod
     def bufferSlice(buf, first=0, last=None):
-        text = ""
+        """Serialize lines [first, last) of the buffer, each
+        terminated by a newline. The range is fetched from vim
+        in a single slice and joined once
+
+        """
+        started = time.time()
         if last is None:
             last = len(buf)
 
-        while first < last:
-            text += buf[first] + "\n"
-            first += 1
+        lines = buf[first:last]
+        text = '\n'.join(lines) + '\n' if lines else ''
+
+        stats = Njast.serialization
+        elapsed = time.time() - started
+        stats['count'] += 1
+        stats['bytes'] += len(text)
+        stats['total'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+        stats['last'] = elapsed
         return text
 
+    @staticmethod
+    def recordTiming(name, elapsed):
+        """Record time (in seconds) spent in a client-side phase"""
+        stats = Njast.timings.get(name)
+        if stats is None:
+            stats = {'count': 0, 'total': 0.0, 'max': 0.0}
+            Njast.timings[name] = stats
+        stats['count'] += 1
+        stats['total'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+        stats['last'] = elapsed
+
+    @staticmethod
+    def formatStats(server, latency):
+        """Format the server's stats report and our own
+        timings for display
+
+        :server: the /stats response, or None
+        :latency: the ConnectionPool's latency dict
+        :returns: a list of lines
+
+        """
+        lines = ['Server (ms)']
+        if not server:
+            lines.append('  (unavailable)')
+        else:
+            for name, hist in sorted(server['histograms'].iteritems()):
+                lines.append('  %-40s n=%-5d mean=%-8.2f p90=%-6g max=%.2f' \
+                    % (name, hist['count'], hist['mean'], hist['p90'], \
+                        hist['max']))
+
+            lines.append('')
+            lines.append('Caches')
+            for name, cache in sorted(server['caches'].iteritems()):
+                lines.append('  %-16s entries=%-6d hits=%-6d misses=%-6d evictions=%d' \
+                    % (name, cache['entries'], cache['hits'], \
+                        cache['misses'], cache['evictions']))
+
+            lines.append('')
+            lines.append('Recent requests (ms)')
+            for request in server['recent']:
+                phases = ', '.join(['%s=%.2f' % it for it in \
+                    sorted(request['phases'].iteritems())])
+                lines.append('  %-12s %8.2f  %s' \
+                    % (request['endpoint'], request['total'], phases))
+
+        client = dict(latency)
+        client.update(Njast.timings)
+        client['serialization'] = Njast.serialization
+
+        lines.append('')
+        lines.append('Client (ms)')
+        for name, stats in sorted(client.iteritems()):
+            if not stats['count']:
+                continue
+            lines.append('  %-40s n=%-5d mean=%-8.2f max=%.2f' \
+                % (name, stats['count'], \
+                    stats['total'] * 1000 / stats['count'], \
+                    stats['max'] * 1000))
+
+        return lines
+
+    @staticmethod
+    def identifierStart(line, col):
+        """:returns: the column where the identifier containing
+            col starts, or None if col isn't in one
+
+        """
+        if col >= len(line) or not Njast.IDENTIFIER_CHAR.match(line[col]):
+            return None
+
+        start = col
+        while start > 0 and Njast.IDENTIFIER_CHAR.match(line[start - 1]):
+            start -= 1
+        return start
+
+    @staticmethod
+    def bufferVersion(buf):
+        """:returns: the buffer's changedtick"""
+        return int(vim.eval('getbufvar(%d, "changedtick")' % buf.number))
+
+    @staticmethod
+    def diffLines(old, new):
+        """Find the single range of lines that changed
+        between two versions of a buffer
+
+        :returns: (start, end, replacement) such that replacing
+            old[start:end] with replacement gives new, or None
+            if nothing changed
+
+        """
+        if old == new:
+            return None
+
+        oldLen = len(old)
+        newLen = len(new)
+        limit = min(oldLen, newLen)
+
+        start = 0
+        while start < limit and old[start] == new[start]:
+            start += 1
+
+        end = 0
+        while end < limit - start \
+                and old[oldLen - end - 1] == new[newLen - end - 1]:
+            end += 1
+
+        return start, oldLen - end, new[start:newLen - end]
+
     @staticmethod
     def extractBuffer(vimWindow, buf):
         """Extract the appropriate buffer type/amount
@@ -427,9 +1363,6 @@ class Njast(object):
 
         """
 
-        # TODO if we haven't changed anything,
-        #  maybe we don't need any buffer
-
         lines = len(buf)
 
         if lines < Njast.MAX_FULL_BUFFER_SIZE:
@@ -491,6 +1424,12 @@ class Njast(object):
             'start': start + 1 # these lines are zero-indexed
         }
 
+    @staticmethod
+    def isAsyncCompletion():
+        """:returns: True if completions should be fetched
+        in the background; see g:njast#asyncCompletion"""
+        return vim.eval('g:njast#asyncCompletion') != '0'
+
     @staticmethod
     def displayError(err):
         vim.command("echo " + json.dumps(str(err)))
@@ -508,14 +1447,15 @@ class Njast(object):
         :returns: the global Njast instance
 
         """
-        if cls._instance is not None:
-            return cls._instance
+        njast = cls._instance
+        if njast is not None and (njast.last_failed is None \
+                or time.time() - njast.last_failed < cls.RETRY_DELAY):
+            return njast
 
-        newInstance = Njast()
-        if newInstance.port:
-            # only save it if it succesfully connected
-            cls._instance = newInstance
-        return newInstance
+        # save it while it's starting, so we only start one;
+        #  if that fails, we try again after RETRY_DELAY
+        cls._instance = Njast()
+        return cls._instance
 
     @classmethod
     def init(cls):
@@ -534,9 +1474,27 @@ class Njast(object):
         #         njast._lastUpdate = data['missing']
         
         njast._asyncRequest('init', {'path': path})
+        njast._indexing = path
+
+    @classmethod
+    def close(cls, path, bufnr):
+        """Let the server know we're done with a buffer,
+        so it can free up whatever it was holding for it
+
+        """
+        njast = cls._instance
+        if njast is None:
+            return
+
+        njast._synced.pop(bufnr, None)
+        njast._prefetched.pop(bufnr, None)
+        njast._asyncRequest('close', {'path': path, 'client': Njast.CLIENT})
 
     class SuggestFormat:
-        """Formats suggestions, etc. by type"""
+        """Formats suggestions, etc. by type. They're all
+        'equal' so vim doesn't drop the ones the server matched
+        without their name starting with what was typed (IE:
+        camel case or fuzzy matches); see njast#Complete"""
 
         @staticmethod
         def classes(item):
@@ -555,7 +1513,8 @@ class Njast(object):
             return {
                 'word': item['name'],
                 'menu': 'class: ' + item['qualified'],
-                'info': info
+                'info': info,
+                'equal': 1
             }
 
         @staticmethod
@@ -572,7 +1531,8 @@ class Njast(object):
             return {
                 'word': item['name'],
                 'menu': 'field: ' + item['type'] + ' ' + item['name'],
-                'info': info
+                'info': info,
+                'equal': 1
             }
 
         @staticmethod
@@ -597,7 +1557,8 @@ class Njast(object):
             return {
                 'word': item['name'],
                 'menu': 'method: ' + item['qualified'],
-                'info': info
+                'info': info,
+                'equal': 1
             }
 
     class UpdateHandler:
@@ -0,0 +1,546 @@
+#!/usr/bin/env python
+"""
+Replays recorded editing sessions through Njast, against either a
+local stand-in server (the default) or a real server.js, and reports
+the latency of each operation and the bytes sent per request.
+
+A session is a json file like:
+
+    {
+        "path": "test/Foo.java",
+        "events": [
+            {"op": "init"},
+            {"op": "move", "pos": [14, 23]},
+            {"op": "complete"},
+            {"op": "type", "text": "ba"},
+            {"op": "idle"},
+            {"op": "define"},
+            {"op": "document"},
+            {"op": "save"}
+        ]
+    }
+
+where the path is relative to the repo root, and positions are vim
+cursors (1-based rows, 0-based columns). Ops:
+
+    init        njast#Enable (starts indexing the project)
+    move        Move the cursor
+    type        Insert text at the cursor (may include newlines)
+    complete    Omnicomplete at the cursor
+    idle        CursorHold; prefetches define/document
+    define      gd
+    document    K
+    save        BufWritePost
+
+Usage: replay.py [options] session.json [session.json ...]
+
+    --server        Run against a real server.js instead
+    --latency <ms>  Simulated processing time of the stand-in server
+    --repeat <n>    Replay each session n times (default: 10)
+    --async         Use async completion (g:njast#asyncCompletion)
+    --json          Print the report as json
+"""
+
+import os, sys, re, json, time, socket, threading
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+import njast_vim
+from njast_vim import Njast
+from test import VimBuffer, VimWindow
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ops whose latency we report; the rest just set things up
+MEASURED_OPS = ['init', 'complete', 'idle', 'define', 'document', 'save']
+
+# Mocks {{{1
+# ReplayVim {{{2
+class ReplayVim(object):
+
+    """Stands in for the vim module, with just enough of
+    vim's behavior for Njast to run"""
+
+    def __init__(self, port=None, asyncCompletion=False):
+        self.current = self
+        self.port = port
+        self.asyncCompletion = asyncCompletion
+        self.mode = 'n'
+        self.windows = []
+        self.buffers = {}
+        self.bufferVars = {}
+
+    def open(self, buf):
+        self.buffer = buf
+        self.window = VimWindow(buf)
+        self.windows = [self.window]
+        self.buffers[buf.number] = buf
+        self.bufferVars = {
+            'njastLastCompletion': [],
+            'njastLastCompletionPos': {'row': -1, 'start': 0, 'end': 0}
+        }
+
+    def eval(self, expr):
+        if expr == 'exists("g:njast#port")':
+            return '1' if self.port else '0'
+        elif expr == 'g:njast#port':
+            return str(self.port)
+        elif expr == 'g:njast#command':
+            return ['node', os.path.join(ROOT, 'server.js')]
+        elif expr == 'g:njast#daemon':
+            return '0'
+        elif expr == 'g:njast#asyncCompletion':
+            return '1' if self.asyncCompletion else '0'
+        elif expr == 'mode()':
+            return self.mode
+        elif expr == "expand('<cword>')":
+            row, col = self.window.cursor
+            line = self.buffer[row - 1]
+            start = Njast.identifierStart(line, col)
+            if start is None:
+                return ''
+            return re.match(r'[\w$]*', line[start:]).group(0)
+        elif expr.startswith('b:'):
+            return self.bufferVars[expr[2:]]
+
+        match = re.match(r'getbufvar\((\d+), "changedtick"\)', expr)
+        if match:
+            return str(self.buffers[int(match.group(1))].changedtick)
+
+        raise ValueError("Unexpected vim.eval: " + expr)
+
+    def command(self, cmd):
+        match = re.match(r'let b:(\w+)(?:\.(\w+))? = (.*)', cmd)
+        if not match:
+            return # norm, echo, feedkeys, etc.
+
+        name, key, value = match.groups()
+        value = json.loads(value)
+        if key is None:
+            self.bufferVars[name] = value
+        else:
+            self.bufferVars[name][key] = value
+
+# ReplayBuffer {{{2
+class ReplayBuffer(VimBuffer):
+
+    """A VimBuffer that can be edited, and tracks changedtick"""
+
+    def __init__(self, name, number, lines):
+        VimBuffer.__init__(self, lines)
+        self.name = name
+        self.number = number
+        self.changedtick = 1
+
+    def insert(self, row, col, text):
+        """Insert text at the (1-based) row and (0-based) col
+
+        :returns: the cursor position after the text
+
+        """
+        line = self._lines[row - 1]
+        inserted = (line[:col] + text).split('\n')
+        rest = line[col:]
+        end = (row + len(inserted) - 1, len(inserted[-1]))
+
+        inserted[-1] += rest
+        self._lines[row - 1:row] = inserted
+        self.changedtick += 1
+        return end
+
+    def reset(self, lines):
+        self._lines = list(lines)
+        self.changedtick += 1
+
+    def __getitem__(self, index):
+        return self._lines[index]
+
+# TrackedThread {{{2
+class TrackedThread(threading.Thread):
+
+    """Thread that remembers itself, so we can tell when
+    the async requests an op started are all done"""
+
+    started = []
+    lock = threading.Lock()
+
+    def start(self):
+        with TrackedThread.lock:
+            TrackedThread.started.append(self)
+        threading.Thread.start(self)
+
+    @classmethod
+    def joinAll(cls):
+        while True:
+            with cls.lock:
+                threads = cls.started
+                cls.started = []
+            if not threads:
+                return
+            for thread in threads:
+                thread.join()
+
+# StandInServer {{{2
+class StandInServer(ThreadingMixIn, HTTPServer):
+
+    """Local server that answers like server.js would, with
+    canned results and (optionally) simulated latency"""
+
+    daemon_threads = True
+
+    def __init__(self, latency=0):
+        HTTPServer.__init__(self, ('localhost', 0), StandInHandler)
+        self.latency = latency / 1000.0
+        self.versions = {}
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self.server_address[1]
+
+    def resolve(self, path, buf):
+        """Track synced buffer versions like util/buffers.js
+
+        :returns: False if the client's version is stale
+
+        """
+        if not isinstance(buf, dict) or not buf.has_key('version'):
+            return True
+
+        type = buf.get('type')
+        key = (buf.get('client'), path)
+        current = self.versions.get(key)
+        if type == 'same' and current != buf['version']:
+            return False
+        elif type == 'delta' and current != buf['base']:
+            return False
+
+        self.versions[key] = buf['version']
+        return True
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    # buffer responses rather than sending each header in its own
+    #  packet; with those, or any response bigger than the buffer,
+    #  Nagle's algorithm adds ~40ms per request unless disabled
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    TYPE = 'net.dhleong.njast.Foo'
+    VERSION = '1.0'
+
+    METHODS = [{
+        'id': 'm%d' % i,
+        'name': 'method%d' % i,
+        'qualified': 'net.dhleong.njast.Foo#method%d' % i,
+        'mods': 'public',
+        'returns': 'java.lang.String',
+        'params': [{'type': 'int', 'name': 'arg0'}],
+        'javadoc': 'Does thing %d' % i
+    } for i in xrange(40)]
+
+    FIELDS = [{
+        'id': 'f%d' % i,
+        'name': 'field%d' % i,
+        'mods': 'private',
+        'type': 'int'
+    } for i in xrange(10)]
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if body.has_key('buffer') \
+                and not self.server.resolve(body['path'], body['buffer']):
+            return self.respond(409, 'Stale buffer version')
+
+        endpoint = self.path[1:]
+        if endpoint == 'suggest':
+            ch = body['pos'][1]
+            methods, fields = self.METHODS, self.FIELDS
+            if body.get('known', {}).get(self.TYPE) == self.VERSION:
+                methods = [{'id': m['id']} for m in methods]
+                fields = [{'id': f['id']} for f in fields]
+            self.respond(200, {
+                'start': {'ch': ch},
+                'end': {'ch': ch},
+                'type': self.TYPE,
+                'version': self.VERSION,
+                'results': {'methods': methods, 'fields': fields}
+            })
+        elif endpoint == 'define':
+            self.respond(200, {'line': 5, 'path': body['path']})
+        elif endpoint == 'document':
+            self.respond(200, {'type': 'method', 'result': self.METHODS[0]})
+        elif endpoint == 'progress':
+            self.respond(200, {'indexing': False, 'found': 0, 'indexed': 0})
+        elif endpoint in ('update', 'log'):
+            self.respond(200, {})
+        elif endpoint in ('init', 'close'):
+            self.respond(204)
+        else:
+            self.respond(404, 'Unknown endpoint')
+
+    def respond(self, status, body=None):
+        if body is None:
+            data = ''
+        elif isinstance(body, basestring):
+            data = body
+        else:
+            data = json.dumps(body)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass # shhh
+
+# }}}1
+
+# Replayer {{{1
+class Replayer(object):
+
+    """Drives Njast through sessions, recording how long each
+    op took and how many bytes each request sent"""
+
+    def __init__(self, port=None, asyncCompletion=False):
+        self.vim = ReplayVim(port, asyncCompletion)
+        self.latency = {}   # op -> [seconds]
+        self.sent = {}      # endpoint -> [bytes]
+        self._bufnr = 0
+
+    def __enter__(self):
+        self._saved = (njast_vim.__dict__.get('vim'), njast_vim.Thread, \
+            Njast._instance)
+        njast_vim.vim = self.vim
+        njast_vim.Thread = TrackedThread
+        Njast._instance = None
+        return self
+
+    def __exit__(self, *args):
+        if Njast._instance is not None:
+            Njast.stop()
+        TrackedThread.joinAll()
+
+        vim, njast_vim.Thread, Njast._instance = self._saved
+        if vim is None:
+            del njast_vim.vim
+        else:
+            njast_vim.vim = vim
+
+    def replay(self, session, repeat=1):
+        path = os.path.join(ROOT, session['path'])
+        with open(path) as fp:
+            lines = fp.read().split('\n')
+
+        self._bufnr += 1
+        buf = ReplayBuffer(path, self._bufnr, lines)
+        self.vim.open(buf)
+
+        # a real server starts in the background; don't
+        #  count that against the first requests
+        njast = Njast.get()
+        njast._ready.wait(Njast.START_TIMEOUT)
+        if not njast.port:
+            raise RuntimeError(njast._startError or "Failed to start server")
+        self._instrument(njast)
+
+        for _ in xrange(repeat):
+            buf.reset(lines)
+            self.vim.window.cursor = (1, 0)
+            for event in session['events']:
+                self._run(event)
+
+        Njast.close(path, buf.number)
+        TrackedThread.joinAll()
+
+    def report(self):
+        """:returns: a dict of op -> latency summary (in ms), and
+            endpoint -> summary of bytes sent per request
+
+        """
+        return {
+            'latency': dict((op, summarize([t * 1000 for t in times])) \
+                for op, times in self.latency.iteritems()),
+            'sent': dict((endpoint, summarize(sizes)) \
+                for endpoint, sizes in self.sent.iteritems())
+        }
+
+    def _instrument(self, njast):
+        connections = njast.connections
+        if getattr(connections, '_replayed', False):
+            return
+
+        request = connections.request
+        def recordingRequest(path, body, timeout, ticket=None):
+            self.sent.setdefault(path, []).append(len(body))
+            return request(path, body, timeout, ticket=ticket)
+
+        connections.request = recordingRequest
+        connections._replayed = True
+
+    def _run(self, event):
+        op = event['op']
+        vim = self.vim
+        window = vim.window
+
+        if op == 'move':
+            window.cursor = tuple(event['pos'])
+            return
+        elif op == 'type':
+            row, col = window.cursor
+            window.cursor = vim.buffer.insert(row, col, event['text'])
+            return
+
+        started = time.time()
+        if op == 'init':
+            Njast.init()
+        elif op == 'complete':
+            self._complete()
+        elif op == 'idle':
+            Njast.onInterval()
+        elif op == 'define':
+            Njast.gotoDefinition()
+        elif op == 'document':
+            self._document()
+        elif op == 'save':
+            Njast.update()
+        else:
+            raise ValueError("Unknown op: " + op)
+
+        # async ops are done when their requests are
+        TrackedThread.joinAll()
+
+        self.latency.setdefault(op, []).append(time.time() - started)
+
+    def _complete(self):
+        vim = self.vim
+        vim.mode = 'i'
+        try:
+            Njast.ensureCompletionCached()
+            if vim.asyncCompletion:
+                # as the timer would
+                while True:
+                    TrackedThread.joinAll()
+                    if not Njast.deliverCompletion():
+                        break
+        finally:
+            vim.mode = 'n'
+
+    def _document(self):
+        # K shows the javadoc in a new preview window
+        vim = self.vim
+        buf = vim.buffer
+        vim.buffer = VimBuffer([''])
+        try:
+            Njast.showJavadoc(1, buf.number)
+        finally:
+            vim.buffer = buf
+
+# }}}1
+
+# Utilities {{{1
+def percentile(values, p):
+    """Nearest-rank percentile of the (sorted) values"""
+    if not values:
+        return 0
+    rank = int(round(p / 100.0 * len(values) + 0.5)) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': values[-1] if values else 0,
+        'total': sum(values)
+    }
+
+def formatReport(report):
+    """:returns: the report as a list of lines"""
+    lines = ['Latency (ms)']
+    for op in MEASURED_OPS:
+        stats = report['latency'].get(op)
+        if stats is None:
+            continue
+        lines.append('  %-10s n=%-5d p50=%-8.2f p95=%-8.2f p99=%-8.2f max=%.2f' \
+            % (op, stats['count'], stats['p50'], stats['p95'], \
+                stats['p99'], stats['max']))
+
+    lines.append('')
+    lines.append('Bytes sent per request')
+    for endpoint, stats in sorted(report['sent'].iteritems()):
+        lines.append('  %-10s n=%-5d p50=%-8d p95=%-8d max=%-8d total=%d' \
+            % (endpoint, stats['count'], stats['p50'], stats['p95'], \
+                stats['max'], stats['total']))
+    return lines
+
+def main(args):
+    useServer = False
+    latency = 0
+    repeat = 10
+    asyncCompletion = False
+    asJson = False
+    sessions = []
+
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == '--server':
+            useServer = True
+        elif arg == '--latency':
+            latency = float(args.pop(0))
+        elif arg == '--repeat':
+            repeat = int(args.pop(0))
+        elif arg == '--async':
+            asyncCompletion = True
+        elif arg == '--json':
+            asJson = True
+        else:
+            sessions.append(arg)
+
+    if not sessions:
+        print __doc__
+        return 1
+
+    server = None
+    port = None
+    if not useServer:
+        server = StandInServer(latency)
+        port = server.start()
+
+    try:
+        with Replayer(port, asyncCompletion) as replayer:
+            for session in sessions:
+                with open(session) as fp:
+                    replayer.replay(json.load(fp), repeat)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    report = replayer.report()
+    if asJson:
+        print json.dumps(report, indent=2, sort_keys=True)
+    else:
+        print '\n'.join(formatReport(report))
+    return 0
+
+# }}}1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+# vim: set sw=4 sts=4 et fdm=marker:
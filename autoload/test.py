@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 
-import unittest
-from njast_vim import Njast
+import unittest, json, os, sys, shutil, tempfile, time
+from threading import Thread, Event
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+import njast_vim
+from njast_vim import Njast, ConnectionPool, RequestTicket, RequestCancelled
 
 # Mock object class definitions {{{1
 # VimMock {{{2
@@ -64,6 +67,42 @@ class VimWindow(object):
         self.buffer = buffer
         self.cursor = cursor
 
+# EchoServer {{{2
+class EchoServer(HTTPServer):
+
+    """Local HTTP/1.1 server that echoes the request body back,
+    and remembers which client connections it has seen"""
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('localhost', 0), EchoHandler)
+        self.clients = set()
+        self.closeAfter = None
+
+    def start(self):
+        thread = Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self.server_address[1]
+
+class EchoHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.server.clients.add(self.client_address)
+        body = self.rfile.read(int(self.headers['Content-Length']))
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.closeAfter == self.path:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass # shhh
+
 # }}}1
 
 # global vim
@@ -173,6 +212,481 @@ class BufferExtraction(unittest.TestCase):
         self.assertEquals(buf['start'], 3)
         self.assertEquals(buf['mode'], 'body')
 
+    def test_Slice(self):
+        count = Njast.serialization['count']
+        text = Njast.bufferSlice(vim.buffer, 2, 4)
+        self.assertEquals(text, \
+            '    void onReceive(final Message pkt) {\n\n')
+        self.assertEquals(Njast.bufferSlice(vim.buffer, 4, 4), '')
+        self.assertEquals(Njast.serialization['count'], count + 2)
+
+class BufferSync(unittest.TestCase):
+
+    def setUp(self):
+        self.buf = VimBuffer(['class Foo {', '    int bar;', '}'])
+        self.buf.number = 1
+        self.buf.version = 1
+        self.win = VimWindow(self.buf, cursor=(2, 4))
+
+        self.__bufferVersion = Njast.__dict__['bufferVersion']
+        Njast.bufferVersion = staticmethod(lambda buf: buf.version)
+
+        self.njast = Njast.__new__(Njast)
+        self.njast._synced = {}
+
+    def tearDown(self):
+        Njast.bufferVersion = self.__bufferVersion
+
+    def sync(self):
+        return self.njast._syncBuffer(self.win, self.buf)
+
+    def test_FullFirst(self):
+        buf = self.sync()
+        self.assertEquals(buf['type'], 'full')
+        self.assertEquals(buf['text'], 'class Foo {\n    int bar;\n}\n')
+        self.assertEquals(buf['version'], 1)
+        self.assertEquals(buf['client'], Njast.CLIENT)
+
+    def test_Same(self):
+        self.sync()
+        self.assertEquals(self.sync(), \
+            {'type': 'same', 'version': 1, 'client': Njast.CLIENT})
+
+    def test_Delta(self):
+        self.sync()
+        self.buf.append('    int baz;', 2)
+        self.buf.version = 2
+
+        buf = self.sync()
+        self.assertEquals(buf['type'], 'delta')
+        self.assertEquals(buf['base'], 1)
+        self.assertEquals(buf['version'], 2)
+        self.assertEquals(buf['changes'], [{
+            'start': 2,
+            'end': 2,
+            'text': '    int baz;\n'
+        }])
+
+    def test_AsyncResend(self):
+        self.sync()
+        doc = {'path': 'Foo.java', 'buffer': self.sync()}
+
+        sent = []
+        def makeRequest(type, doc, **kwargs):
+            sent.append(doc)
+            if doc['buffer']['type'] != 'full':
+                raise njast_vim.StaleBufferError('Stale buffer version')
+            return {'ok': True}
+        self.njast._makeRequest = makeRequest
+        self.njast._ready = Event()
+        self.njast._ready.set()
+
+        results = []
+        done = Event()
+        def callback(data):
+            results.append(data)
+            done.set()
+
+        synced = self.njast._synced[1]
+        self.njast._asyncRequest('suggest', doc, callback, synced=synced)
+        done.wait(5)
+
+        # retried once, in full, without dropping what we've synced
+        self.assertEquals(results, [{'ok': True}])
+        self.assertEquals([d['buffer']['type'] for d in sent], ['same', 'full'])
+        self.assertEquals(sent[1]['buffer']['text'], \
+            'class Foo {\n    int bar;\n}\n')
+        self.assertEquals(sent[1]['buffer']['version'], 1)
+        self.assertEquals(sent[1]['path'], 'Foo.java')
+        self.assertEquals(self.njast._synced[1], synced)
+
+    def test_DiffLines(self):
+        self.assertEquals(Njast.diffLines(['a', 'b'], ['a', 'b']), None)
+        self.assertEquals(Njast.diffLines(['a', 'b', 'c'], ['a', 'c']), \
+            (1, 2, []))
+        self.assertEquals(Njast.diffLines(['a', 'b'], ['a', 'x', 'b']), \
+            (1, 1, ['x']))
+        self.assertEquals(Njast.diffLines(['a', 'a'], ['a', 'a', 'a']), \
+            (2, 2, ['a']))
+
+class Prefetch(unittest.TestCase):
+
+    def setUp(self):
+        self.buf = VimBuffer(['class Foo {', '    Bar bar;', '}'])
+        self.buf.name = 'Foo.java'
+        self.buf.number = 1
+        self.buf.version = 1
+        self.win = VimWindow(self.buf, cursor=(2, 5))
+
+        self.__bufferVersion = Njast.__dict__['bufferVersion']
+        Njast.bufferVersion = staticmethod(lambda buf: buf.version)
+
+        self.requests = []
+        def asyncRequest(type, doc, callback=None, ticket=None, synced=None):
+            self.requests.append((type, doc))
+            callback({'type': type})
+
+        self.njast = Njast.__new__(Njast)
+        self.njast.port = 1
+        self.njast._synced = {}
+        self.njast._prefetched = {}
+        self.njast._asyncRequest = asyncRequest
+
+    def tearDown(self):
+        Njast.bufferVersion = self.__bufferVersion
+
+    def test_IdentifierStart(self):
+        self.assertEquals(Njast.identifierStart('    Bar bar;', 6), 4)
+        self.assertEquals(Njast.identifierStart('    Bar bar;', 4), 4)
+        self.assertEquals(Njast.identifierStart('    Bar bar;', 7), None)
+        self.assertEquals(Njast.identifierStart('a.$b', 3), 2)
+
+    def test_Prefetch(self):
+        self.njast._prefetch(self.win, self.buf)
+        self.assertEquals([r[0] for r in self.requests], ['define', 'document'])
+        self.assertEquals(self.requests[0][1]['pos'], [2, 5])
+        self.assertEquals(self.requests[1][1]['buffer'], \
+            {'type': 'same', 'version': 1, 'client': Njast.CLIENT})
+
+        # anywhere in the same identifier
+        self.win.cursor = (2, 6)
+        self.assertEquals(self.njast._cachedResult('define', \
+            self.win, self.buf), {'type': 'define'})
+        self.assertEquals(self.njast._cachedResult('document', \
+            self.win, self.buf), {'type': 'document'})
+
+        # only once
+        self.njast._prefetch(self.win, self.buf)
+        self.assertEquals(len(self.requests), 2)
+
+    def test_Invalidated(self):
+        self.njast._prefetch(self.win, self.buf)
+        self.buf.version = 2
+        self.assertEquals(self.njast._cachedResult('define', \
+            self.win, self.buf), None)
+
+        self.win.cursor = (2, 9)
+        self.assertEquals(self.njast._cachedResult('define', \
+            self.win, self.buf), None)
+
+class Stats(unittest.TestCase):
+
+    def setUp(self):
+        self.__timings = Njast.timings
+        Njast.timings = {}
+
+    def tearDown(self):
+        Njast.timings = self.__timings
+
+    def test_RecordTiming(self):
+        Njast.recordTiming('buildRequest', 0.002)
+        Njast.recordTiming('buildRequest', 0.004)
+        stats = Njast.timings['buildRequest']
+        self.assertEquals(stats['count'], 2)
+        self.assertAlmostEquals(stats['max'], 0.004)
+        self.assertAlmostEquals(stats['last'], 0.004)
+
+    def test_FormatStats(self):
+        Njast.recordTiming('buildRequest', 0.002)
+        server = {
+            'histograms': {
+                '/suggest': {'count': 2, 'mean': 10.5, 'p90': 20, 'max': 12.25}
+            },
+            'caches': {
+                'asts': {'entries': 1, 'hits': 2, 'misses': 3, 'evictions': 0}
+            },
+            'recent': [
+                {'endpoint': '/suggest', 'total': 12.25, \
+                    'phases': {'parse': 8.5, 'locate': 0.25}}
+            ]
+        }
+        lines = Njast.formatStats(server, \
+            {'/suggest': {'count': 1, 'total': 0.02, 'max': 0.02}})
+
+        self.assertTrue(any(l.startswith('  /suggest ') and 'n=2' in l \
+            for l in lines))
+        self.assertTrue(any('asts' in l and 'misses=3' in l for l in lines))
+        self.assertTrue(any('locate=0.25, parse=8.50' in l for l in lines))
+        self.assertTrue(any('buildRequest' in l and 'mean=2.00' in l \
+            for l in lines))
+
+    def test_FormatWithoutServer(self):
+        lines = Njast.formatStats(None, {})
+        self.assertEquals(lines[1], '  (unavailable)')
+
+class Replay(unittest.TestCase):
+
+    def test_Session(self):
+        from replay import Replayer, StandInServer
+
+        server = StandInServer()
+        port = server.start()
+        try:
+            with Replayer(port) as replayer:
+                with open('../test/sessions/foo.json') as fp:
+                    replayer.replay(json.load(fp))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        report = replayer.report()
+        self.assertEquals(report['latency']['complete']['count'], 3)
+        self.assertEquals(report['latency']['define']['count'], 2)
+
+        # one was prefetched while idle, the other was not
+        self.assertEquals(report['sent']['/define']['count'], 2)
+        self.assertTrue(report['sent']['/suggest']['max'] > 0)
+
+class Completion(unittest.TestCase):
+
+    class CommandVim(object):
+        def __init__(self):
+            self.vars = {}
+            self.current = self
+
+        def eval(self, expr):
+            if expr.startswith('b:'):
+                return self.vars[expr[2:]]
+            return {'g:njast#asyncCompletion': '0'}[expr]
+
+        def command(self, cmd):
+            name, value = cmd[len('let b:'):].split(' = ', 1)
+            self.vars[name] = json.loads(value)
+
+    def setUp(self):
+        self.vim = Completion.CommandVim()
+        self.__vim = njast_vim.__dict__.get('vim')
+        njast_vim.vim = self.vim
+        self.njast = Njast.__new__(Njast)
+        self.njast._completions = njast_vim.OrderedDict()
+
+    def tearDown(self):
+        if self.__vim is None:
+            del njast_vim.vim
+        else:
+            njast_vim.vim = self.__vim
+
+    def test_Ranked(self):
+        self.njast._inflateCompletionImpl({
+            'start': {'ch': 15},
+            'end': {'ch': 17},
+            'type': 'net.dhleong.njast.Foo',
+            'next': 2,
+            'results': {
+                'methods': [{'name': 'getBar', 'mods': 'public', \
+                    'returns': 'Bar', 'params': [], \
+                    'qualified': 'Foo#getBar', 'rank': 1}],
+                'fields': [{'name': 'gb', 'type': 'int', 'rank': 0}]
+            }
+        }, 1, 17, '        field1.gb')
+
+        words = [c['word'] for c in self.vim.vars['njastLastCompletion']]
+        self.assertEquals(words, ['gb', 'getBar'])
+        self.assertEquals(self.vim.vars['njastLastCompletionPos'], {
+            'row': 1, 'start': 15, 'end': 17, 'word': 'gb',
+            'type': 'net.dhleong.njast.Foo', 'version': ''
+        })
+
+    def test_Refetch(self):
+        sent = []
+        self.njast._lastImplementations = None
+        self.njast._run = lambda type, pos, params=None: sent.append(params)
+        self.njast._inflateCompletion = lambda *args: None
+        self.njast._fillCompletions = lambda *args: None
+
+        def refetch(version):
+            self.njast._inflateCompletionImpl({
+                'start': {'ch': 15},
+                'end': {'ch': 15},
+                'type': 'net.dhleong.njast.Foo',
+                'version': version,
+                'results': {'methods': [], 'fields': []}
+            }, 1, 15, '        field1.')
+
+            self.vim.window = VimWindow(VimBuffer(["        field1.gb"]), (1, 17))
+            self.vim.buffer = self.vim.window.buffer
+            self.njast._ensureCompletionCached()
+            return sent.pop()
+
+        # declared in the buffer; it has to be resolved again
+        self.assertFalse(refetch(None).has_key('type'))
+        self.assertEquals(refetch('1.1')['type'], 'net.dhleong.njast.Foo')
+
+    def test_Cached(self):
+        def response(version, known=False):
+            method = {'id': 'm0', 'rank': 0}
+            if not known:
+                method.update({'name': 'getBar', 'mods': 'public', \
+                    'returns': 'Bar', 'params': [], \
+                    'qualified': 'Foo#getBar'})
+            return {
+                'start': {'ch': 15},
+                'end': {'ch': 15},
+                'type': 'net.dhleong.njast.Foo',
+                'version': version,
+                'results': {'methods': [method], 'fields': []}
+            }
+
+        self.njast._inflateCompletionImpl(response('1.1'), 1, 15, '        field1.')
+        full = self.vim.vars['njastLastCompletion']
+        self.assertTrue(self.njast._completions['net.dhleong.njast.Foo']['complete'])
+
+        # the server only sent ids; we had the rest
+        self.njast._inflateCompletionImpl(response('1.1', True), 1, 15, '        field1.')
+        self.assertEquals(self.vim.vars['njastLastCompletion'], full)
+
+        # a new version of the type replaces what we had
+        self.njast._inflateCompletionImpl(response('1.2', True), 1, 15, '        field1.')
+        self.assertEquals(self.vim.vars['njastLastCompletion'], [])
+        self.assertFalse(self.njast._completions.has_key('net.dhleong.njast.Foo'))
+
+class Startup(unittest.TestCase):
+
+    class ConfigVim(object):
+        def __init__(self, config):
+            self.config = config
+            self.messages = []
+
+        def eval(self, expr):
+            return self.config[expr]
+
+        def command(self, cmd):
+            self.messages.append(cmd)
+
+    def setUp(self):
+        self.server = EchoServer()
+        port = self.server.start()
+
+        # a slow-booting "server" that reports the echo server's port
+        self.dir = tempfile.mkdtemp()
+        script = os.path.join(self.dir, 'server.py')
+        with open(script, 'w') as fp:
+            fp.write('import sys, time\n' \
+                + 'time.sleep(0.3)\n' \
+                + 'print "Listening on port %d"\n' % port \
+                + 'sys.stdout.flush()\n' \
+                + 'sys.stdin.read()\n')
+
+        self.vim = Startup.ConfigVim({
+            'exists("g:njast#port")': '0',
+            'g:njast#daemon': '0',
+            'g:njast#command': [sys.executable, script]
+        })
+        self.__vim = njast_vim.__dict__.get('vim')
+        njast_vim.vim = self.vim
+
+    def tearDown(self):
+        if self.__vim is None:
+            del njast_vim.vim
+        else:
+            njast_vim.vim = self.__vim
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir)
+
+    def test_Background(self):
+        started = time.time()
+        njast = Njast()
+        self.assertTrue(time.time() - started < 0.2)
+
+        # sync requests don't wait...
+        self.assertIsNone(njast._makeRequest('log', {}, raiseErrors=False))
+
+        # ...but async ones do
+        results = []
+        njast._asyncRequest('suggest', {'i': 1}, results.append)
+        deadline = time.time() + 5
+        while not results and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEquals(results, [{'i': 1}])
+        self.assertIsNotNone(njast.proc)
+        njast._stop()
+
+    def test_Failed(self):
+        self.vim.config['g:njast#command'] = \
+            [os.path.join(self.dir, 'missing'), 'server.js']
+        njast = Njast()
+        self.assertTrue(njast._ready.wait(5))
+        self.assertIsNone(njast.port)
+        self.assertIsNotNone(njast.last_failed)
+
+        # the error's shown from the main thread
+        njast._makeRequest('define', {})
+        self.assertEquals(len(self.vim.messages), 1)
+        self.assertTrue('Failed to start server' in self.vim.messages[0])
+
+class Daemon(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.lockfile = os.path.join(self.dir, 'daemon.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def lock(self, port):
+        with open(self.lockfile, 'w') as fp:
+            json.dump({'pid': 1, 'port': port}, fp)
+
+    def test_Running(self):
+        server = EchoServer()
+        port = server.start()
+        try:
+            self.lock(port)
+            self.assertEquals(Njast.daemonPort(self.lockfile), port)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # and now it's not
+        self.assertIsNone(Njast.daemonPort(self.lockfile))
+
+    def test_Missing(self):
+        self.assertIsNone(Njast.daemonPort(self.lockfile))
+
+        with open(self.lockfile, 'w') as fp:
+            fp.write('{"pid": 1, "po') # half-written
+        self.assertIsNone(Njast.daemonPort(self.lockfile))
+
+class KeepAlive(unittest.TestCase):
+
+    def setUp(self):
+        self.server = EchoServer()
+        self.pool = ConnectionPool('localhost', self.server.start())
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_ReusesConnection(self):
+        for i in xrange(3):
+            status, body = self.pool.request('/suggest', \
+                json.dumps({'i': i}), 1)
+            self.assertEquals(status, 200)
+            self.assertEquals(json.loads(body), {'i': i})
+
+        self.assertEquals(len(self.server.clients), 1)
+        self.assertEquals(self.pool.latency['/suggest']['count'], 3)
+
+    def test_Reconnects(self):
+        self.server.closeAfter = '/define'
+        self.pool.request('/define', '{}', 1)
+        status, _ = self.pool.request('/define', '{}', 1)
+        self.assertEquals(status, 200)
+        self.assertEquals(len(self.server.clients), 2)
+
+    def test_Cancelled(self):
+        ticket = RequestTicket()
+        ticket.cancel()
+        self.assertRaises(RequestCancelled, self.pool.request, \
+            '/suggest', '{}', 1, ticket=ticket)
+
+        # still usable
+        status, _ = self.pool.request('/suggest', '{}', 1, \
+            ticket=RequestTicket())
+        self.assertEquals(status, 200)
 
 if __name__ == '__main__':
     tester = unittest.main(failfast=True, exit=False)
@@ -5,15 +5,54 @@ var async = require('async')
   , path = require('path')
   , fs = require('fs')
   , Q = require('q')
-  , StreamSplitter = require('stream-splitter')
-  , spawn = require('child_process').spawn
   
   , Ast = require('./ast')  
+  , ClassFile = require('./util/classfile')
+  , JarFile = require('./util/jar')
+  , JarIndex = require('./util/diskcache')
+  , NameIndex = require('./util/nameindex')
+  , TypeRegistry = require('./util/typeregistry')
+  , WorkerPool = require('./util/workerpool')
+  , LruCache = require('./util/cache')
+  , SingleFlight = require('./util/singleflight')
+  , Stats = require('./util/stats')
   , parseFile = Ast.parseFile
   , readFile = Ast.readFile
   
   , MAX_PARALLEL = 20
-  , SUGGEST_LIMIT = 2500;
+  , INDEX_WORKER = path.join(__dirname, 'util', 'indexworker.js')
+
+  // processes to parse files in when indexing a project;
+  //  one per core, unless NJAST_INDEX_WORKERS says otherwise
+  , INDEX_WORKERS = parseInt(process.env.NJAST_INDEX_WORKERS, 10) || undefined
+
+  // default budgets for our in-memory caches; see LruCache.budget
+  , AST_BUDGET = {maxEntries: 200, maxBytes: 256 * 1024 * 1024}
+  , PROJECTION_BUDGET = {maxEntries: 5000, maxBytes: 64 * 1024 * 1024}
+  , MISSES_BUDGET = {maxEntries: 10000}
+
+  // very rough guess at the memory used by an
+  //  Ast for every byte of source it was parsed from
+  , AST_BYTES_PER_CHAR = 20
+
+  // for dependencies, we mostly just need the declarations
+  , DEPENDENCY_PARSE_OPTIONS = {strict: false, lazyBodies: true};
+
+// type versions are shared by every loader in the process
+//  (and by every process serving one client; see setVersions):
+//  type -> how many changes ago it last changed, or null if
+//  it's changed and waiting on a version. See typeVersion()
+var _versions = {}
+  , _generation = 0
+
+  // part of every type version; see setVersions()
+  , _epoch = process.pid + '.' + Date.now()
+
+  // see onTypesChanged()
+  , _onTypesChanged = null
+
+  // see indexWith()
+  , _indexer = null;
 
 /**
  * Base ClassLoader interface; mostly for the
@@ -115,6 +154,18 @@ ClassLoader.prototype.suggestImport = function(/* name, callback */) {
     throw new Error("suggestImport not implemented");
 };
 
+/**
+ * Optional. Used by the ComposedClassLoader to route lookups
+ *  straight to the loaders that could have a type.
+ *
+ * @return True if this loader has types in the package,
+ *  false if it definitely does not, or undefined if it
+ *  can't tell (yet)
+ */
+ClassLoader.prototype.hasPackage = function(/* pkg */) {
+    return undefined;
+};
+
 
 
 /**
@@ -124,7 +175,15 @@ ClassLoader.prototype.suggestImport = function(/* name, callback */) {
  */
 function ComposedClassLoader(loaders) {
     this._loaders = loaders;
-    this._cached = {};
+    this._cached = newProjectionCache('projections');
+
+    // lookups that no loader could satisfy; since any
+    //  new type could satisfy one (even a method lookup,
+    //  via a new superclass), this is cleared by putCache
+    //  and whenever our loaders change
+    this._misses = new LruCache('misses',
+        LruCache.budget('misses', MISSES_BUDGET));
+    this._missesLoaders = loaders.length;
 }
 
 ComposedClassLoader.prototype.openAst = function(path, buf, options, callback) {
@@ -179,17 +238,32 @@ ComposedClassLoader.prototype.openClass = function(qualifiedName,
     }
 
     // FIXME match projection
-    if (qualifiedName in this._cached)
-        return callback(null, this._cached[qualifiedName]);
+    var cached = this._cached.get(qualifiedName);
+    if (cached)
+        return callback(null, cached);
+
+    // a type that's missing is missing for any projection,
+    //  but a specific member might not be
+    var missKey = projection && !Array.isArray(projection)
+        ? qualifiedName + ':' + JSON.stringify(projection)
+        : qualifiedName;
+    var misses = getMisses(this);
+    var missed = misses.get(missKey);
+    if (missed)
+        return callback(missed);
 
     var self = this;
     var result = [null, null];
-    async.detect(this._loaders, function(loader, resolve) {
+    var version = typeVersion(qualifiedName);
+    var stop = Stats.time('classloader.openClass');
+    async.detect(routeLoaders(this._loaders, qualifiedName), function(loader, resolve) {
         loader.openClass(qualifiedName, projection, function(err, projected) {
-            // cache successful results
+            // cache successful results, unless the
+            //  type changed while we were projecting it
             // FIXME *merge* the projection types
-            if (projected && !err && Array.isArray(projection))
-                self._cached[qualifiedName] = projected;
+            if (projected && !err && Array.isArray(projection)
+                    && version && version === typeVersion(qualifiedName))
+                self._cached.set(qualifiedName, projected);
 
             else if (err && !result[1]) {
                 result[0] = err;
@@ -201,7 +275,12 @@ ComposedClassLoader.prototype.openClass = function(qualifiedName,
             result[1] = projected;
             resolve(true);
         });
-    }, function() {
+    }, function(found) {
+        stop();
+        if (!found) {
+            result[0] = result[0] || new Error("Could not find " + qualifiedName);
+            misses.set(missKey, result[0]);
+        }
 
         callback(result[0], result[1]);
     })
@@ -209,6 +288,14 @@ ComposedClassLoader.prototype.openClass = function(qualifiedName,
 
 ComposedClassLoader.prototype.putCache = function(path, obj) {
 
+    // it may have brought new types that we've missed,
+    //  and changed the ones it declares
+    var types = obj && obj.qualifieds
+        ? Object.keys(obj.qualifieds).filter(isType)
+        : [];
+    forget(this, types);
+    typesChanged(path, types);
+
     this._loaders.some(function(loader) {
         if (loader.putCache(path, obj))
             return true;
@@ -217,20 +304,41 @@ ComposedClassLoader.prototype.putCache = function(path, obj) {
     });
 };
 
+/**
+ * The file at path (declaring the types) was changed
+ *  somewhere else (IE: putCache'd in another process);
+ *  drop what we knew about it, so it's read again
+ */
+ComposedClassLoader.prototype.invalidate = function(path, types) {
+    forget(this, types);
+
+    this._loaders.forEach(function(loader) {
+        if (loader.invalidate)
+            loader.invalidate(path, types);
+    });
+};
+
 
 ComposedClassLoader.prototype.resolveMethodReturnType = function(type, name, cb) {
     var qualifiedName = type + '#' + name; // TODO args?
-    if (qualifiedName in this._cached)
-        return cb(null, this._cached[qualifiedName]);
+    var cached = this._cached.get(qualifiedName);
+    if (cached)
+        return cb(null, cached);
+
+    var misses = getMisses(this);
+    var missed = misses.get(qualifiedName);
+    if (missed)
+        return cb(missed);
 
     // use detect!
     var self = this;
     var result = [null, null];
-    async.detect(this._loaders, function(loader, resolve) {
+    var stop = Stats.time('classloader.resolveMethodReturnType');
+    async.detect(routeLoaders(this._loaders, type), function(loader, resolve) {
         loader.resolveMethodReturnType(type, name, function(err, resolved) {
             // cache successful results
             if (resolved && !err)
-                self._cached[qualifiedName] = resolved;
+                self._cached.set(qualifiedName, resolved);
 
             else if (err) {
                 result[0] = err;
@@ -242,7 +350,10 @@ ComposedClassLoader.prototype.resolveMethodReturnType = function(type, name, cb)
             result[1] = resolved;
             resolve(true);
         });
-    }, function() {
+    }, function(found) {
+        stop();
+        if (!found)
+            misses.set(qualifiedName, result[0]);
 
         cb(result[0], result[1]);
     })
@@ -259,11 +370,14 @@ ComposedClassLoader.prototype.suggestImport = function(name, callback) {
     async.parallel(loaders, function(err, results) {
         if (err) return callback(err);
 
+        var seen = {};
         var result = results.reduce(function(last, items) {
             for (var i = 0, len = items.length; i < len; i++) {
                 var item = items[i];
-                if (!~last.indexOf(item))
+                if (!seen[item]) {
+                    seen[item] = true;
                     last.push(item);
+                }
             }
             return last;
         }, []);
@@ -272,14 +386,82 @@ ComposedClassLoader.prototype.suggestImport = function(name, callback) {
     });
 };
 
+/**
+ * @return A stamp that changes whenever the type might
+ *  have (IE: its file was putCache'd), so clients can
+ *  tell if what they know about it is still good, or
+ *  null if it just changed and has no stamp yet. Stamps
+ *  from different servers never match
+ */
+ComposedClassLoader.prototype.typeVersion = function(type) {
+    return typeVersion(type);
+};
+
+/**
+ * Keep the Ast for the path (IE: a file open in the
+ *  editor) from being evicted from any of our caches
+ */
+ComposedClassLoader.prototype.pin = function(path) {
+    this._loaders.forEach(function(loader) {
+        if (loader.pin)
+            loader.pin(path);
+    });
+};
+
+ComposedClassLoader.prototype.unpin = function(path) {
+    this._loaders.forEach(function(loader) {
+        if (loader.unpin)
+            loader.unpin(path);
+    });
+};
+
+/**
+ * Index the types in any of our loaders that need
+ *  indexing (IE: source loaders) in the background
+ */
+ComposedClassLoader.prototype.indexTypes = function(callback) {
+
+    var loaders = this._loaders.filter(function(loader) {
+        return loader.indexTypes;
+    });
+
+    async.each(loaders, function(loader, onIndexed) {
+        loader.indexTypes(onIndexed);
+    }, callback);
+};
+
+/**
+ * @return The combined index progress of our loaders;
+ *  see SourceClassLoader.getIndexProgress
+ */
+ComposedClassLoader.prototype.getIndexProgress = function() {
+
+    return this._loaders.reduce(function(result, loader) {
+        if (!loader.getIndexProgress)
+            return result;
+
+        var progress = loader.getIndexProgress();
+        result.found += progress.found;
+        result.indexed += progress.indexed;
+        result.indexing = result.indexing || progress.indexing;
+        return result;
+    }, {found: 0, indexed: 0, indexing: false});
+};
+
 
 /**
  * Base class for ClassLoaders that read source files
  */
 function SourceClassLoader() {
-    this._astCache = {};
-    this._allCachedTypes = undefined; // not cached, yet
-    this._fileToTypes = undefined; // not cached, yet
+    this._astCache = new LruCache('asts', util._extend({
+        sizeOf: function(ast) {
+            return ast.getSourceLength
+                ? ast.getSourceLength() * AST_BYTES_PER_CHAR
+                : 0;
+        }
+    }, LruCache.budget('asts', AST_BUDGET)));
+    this._inflight = new SingleFlight();
+    this._types = undefined; // TypeRegistry; not cached, yet
 }
 util.inherits(SourceClassLoader, ClassLoader);
 
@@ -294,22 +476,41 @@ SourceClassLoader.prototype.openAst = function(path, buf, options, cb) {
     if (!matches)
         return cb(new Error("Path not found in classloader at " + this._root));
 
-    var cached = this._astCache[path];
+    if (!buf)
+        return this._readAst(path, options, cb);
+
+    var cached = this._astCache.get(path);
     if (cached) return cb(null, cached);
 
     var self = this;
-    var cachingCallback = function(err, ast) {
+    parseFile(path, buf, options, function(err, ast) {
         if (!err)
-            self._astCache[path] = ast;
+            self._astCache.set(path, ast);
 
         cb(err, ast);
-    };
+    });
+};
 
-    if (buf) {
-        parseFile(path, buf, options, cachingCallback);
-    } else {
-        readFile(path, options, cachingCallback);
-    }
+/**
+ * Read and parse the file at the path (if we haven't
+ *  already), sharing the work with anyone else who
+ *  asks for it in the meantime
+ */
+SourceClassLoader.prototype._readAst = function(path, options, cb) {
+    var cached = this._astCache.get(path);
+    if (cached) return cb(null, cached);
+
+    var self = this;
+    this._inflight.run('ast:' + path, function(done) {
+        var stop = Stats.time('source.readAst');
+        readFile(path, options, function(err, ast) {
+            stop();
+            if (!err)
+                self._astCache.set(path, ast);
+
+            done(err, ast);
+        });
+    }, cb);
 };
 
 
@@ -318,16 +519,9 @@ SourceClassLoader.prototype.resolveMethodReturnType = function(type, name, cb) {
     this._getPathForType(type, function(err, path) {
         if (err) return cb(err);
 
-        var cached = self._astCache[path];
-        if (cached)
-            return cached.resolveMethodReturnType(self, type, name, cb);
-        
-        readFile(path, {
-            strict: false
-        }, function(err, ast) {
+        self._readAst(path, DEPENDENCY_PARSE_OPTIONS, function(err, ast) {
             if (err) return cb(err);
 
-            self._astCache[path] = cached;
             ast.resolveMethodReturnType(self, type, name, cb);
         });
     });
@@ -345,101 +539,97 @@ SourceClassLoader.prototype.openClass = function(qualifiedName,
     this._getPathForType(qualifiedName, function(err, path) {
         if (err) return callback(err);
 
-        fs.readFile(path, function(err, buf) {
-            if (err) return callback(err);
-
-            if (!projection) return callback(null); // we just care that it worked
+        if (!projection) {
+            // we just care that it worked
+            return fs.stat(path, function(err) {
+                callback(err);
+            });
+        }
 
-            // we want a projection
-            parseFile(path, buf, {
-                strict: false
-            }, function(err, ast) {
-                if (err) return callback(err);
+        var key = 'class:' + qualifiedName + ':' + JSON.stringify(projection);
+        self._inflight.run(key, function(done) {
+            self._readAst(path, DEPENDENCY_PARSE_OPTIONS, function(err, ast) {
+                if (err) return done(err);
 
-                ast.projectType(self, qualifiedName, projection, callback);
+                ast.projectType(self, qualifiedName, projection, done);
             });
-        });
+        }, callback);
     });
 };
 
 SourceClassLoader.prototype.putCache = function(path, ast) {
     if (~path.indexOf(this._root)) {
-        this._astCache[path] = ast;
+        this._astCache.set(path, ast);
 
-        // invalidate types cache for this obj.
-        if (!this._fileToTypes)
+        // update the types cache for this file
+        if (!this._types)
             return;
 
-        var existing = this._fileToTypes[path];
-        if (!existing) {
-            existing = [];
-            this._fileToTypes[path] = existing;
-        }
-
-        var newtypes = Object.keys(ast.qualifieds);
-        var self = this;
-
-        // first, check for deleted types
-        var gone = existing.filter(function(type) {
-            return !~newtypes.indexOf(type);
-        });
-        gone.forEach(function(type) {
-            var idx = existing.indexOf(type);
-            existing.splice(idx, 1);
+        this._types.setFileTypes(path, Object.keys(ast.qualifieds).filter(isType));
+    }
 
-            idx = self._allCachedTypes.indexOf(type);
-            if (idx >= 0) // should be
-                self._allCachedTypes.splice(idx, 1);
-        });
+};
 
-        // now, check for new types
-        newtypes.forEach(function(qualified) {
-            if (!isType(qualified))
-                return;
+SourceClassLoader.prototype.invalidate = function(path, types) {
+    if (~path.indexOf(this._root)) {
+        this._astCache.remove(path);
 
-            if (!~existing.indexOf(qualified)) {
-                // new type
-                existing.push(qualified);
-                self._allCachedTypes.push(qualified);
-            }
-        });
+        if (this._types)
+            this._types.setFileTypes(path, types);
     }
+};
 
+SourceClassLoader.prototype.pin = function(path) {
+    this._astCache.pin(path);
 };
 
-SourceClassLoader.prototype.suggestImport = function(name, callback) {
+SourceClassLoader.prototype.unpin = function(path) {
+    this._astCache.unpin(path);
+};
 
-    var suggestions = [];
+SourceClassLoader.prototype.suggestImport = function(name, callback) {
 
-    var timeout = setTimeout(function() {
-        var found = suggestions;
+    // walk the types once to build the index, and
+    //  let putCache keep it up to date after that
+    if (this._types)
+        return callback(null, this._types.suggest(name));
 
-        // clear this so we know to stop
-        suggestions = null;
+    var self = this;
+    this.indexTypes(function(err) {
+        if (err) return callback(err);
 
-        callback(null, found);
-    }, SUGGEST_LIMIT);
+        callback(null, self._types.suggest(name));
+    });
+};
 
-    // basically, we have to scan each file looking for "name."
-    // var self = this;
-    var len = name.length;
-    // console.log(self._root, "Walk types", name);
-    this.walkTypes(function(type) {
-        if (suggestions === null)
-            return;
+/**
+ * Make sure we've walked all the types in this loader,
+ *  sharing a single walk with anyone else who asks
+ *  while it's in progress
+ */
+SourceClassLoader.prototype.indexTypes = function(callback) {
+    if (this._types)
+        return callback();
 
-        // console.log(type.indexOf(name), type.length - len);
-        if (type.indexOf(name) == type.length - len)
-            suggestions.push(type);
-    }, function(err) {
+    var self = this;
+    this._inflight.run('index', function(done) {
+        self.walkTypes(function() {}, done);
+    }, callback);
+};
 
-        clearTimeout(timeout);
-        if (suggestions === null)
-            return;
+/**
+ * @return A dict describing the progress of the most
+ *  recent walk over the source files:
+ *  - found: Number of files found so far
+ *  - indexed: Number of those that have been parsed
+ *  - indexing: True if the walk is still in progress
+ */
+SourceClassLoader.prototype.getIndexProgress = function() {
+    if (this._progress)
+        return this._progress;
 
-        // console.log(self._root, "Walked types", name);
-        callback(err, suggestions);
-    });
+    var size = this._types ? this._types.size : 0;
+    return {found: size, indexed: size, indexing: false};
 };
 
 /**
@@ -454,6 +644,13 @@ SourceClassLoader.prototype.suggestImport = function(name, callback) {
  *
  * The iterator can optionally not accept a callback, in which
  *  case every single type will be walked
+ *
+ * If we haven't walked before, files are handed to a pool
+ *  of workers for parsing as soon as they're found, and the
+ *  iterator is called for the types in each as it's parsed.
+ *  Files that can't be parsed are skipped. See getIndexProgress.
+ *  With an indexer (see indexWith), that walk happens there,
+ *  and the iterator is called once it's done
  */
 SourceClassLoader.prototype.walkTypes = function(iterator, onComplete) {
     
@@ -468,76 +665,40 @@ SourceClassLoader.prototype.walkTypes = function(iterator, onComplete) {
     }
 
     // use cached types
-    if (this._allCachedTypes) {
-        async.eachLimit(this._allCachedTypes, MAX_PARALLEL, iterate, onComplete);
+    if (this._types) {
+        async.eachLimit(this._types.types(), MAX_PARALLEL, iterate, onComplete);
         return;
     }
 
-    var allTypes = [];
-    var fileTypes = {};
     var self = this;
-    async.eachLimit(this._getSearchPaths(), MAX_PARALLEL, function(dir, onEachPath) {
-        var search = path.join(dir, '**', '*.java');
-        // console.log('walk', self._root, search);
-
-        // FIXME use version that emits files, instead of waiting
-        //  for all to be found
-        glob(search, function(err, files) {
-            if (err) return onEachPath(err);
-
-            var filtered = files.filter(function(file) {
-                return !(file in fileTypes);
-            });
-
-            if (!filtered.length) 
-                return onEachPath();
-
-            // console.log(self._root, search, filtered);
-            async.eachLimit(filtered, MAX_PARALLEL, function(file, onEach) {
-
-                // load the AST and iterate
-                //  over the qualifieds array
-                // console.log("parse", file);
-                readFile(file, {
-                    strict: false
-                }, function(err, ast) {
-                    // console.log("-----", file);
-                    if (err) return onEach(err);
-
-                    var thisTypes = [];
-                    async.eachLimit(Object.keys(ast.qualifieds), MAX_PARALLEL, function(qualified, cb) {
-                        if (!isType(qualified))
-                            return cb(); // method or field
-
-                        thisTypes.push(qualified);
-                        allTypes.push(qualified);
-                        iterate(qualified, cb);
-                    }, function(err) {
-
-                        fileTypes[file] = thisTypes;
-                        onEach(err);
-                    });
-                });
-            }, function(err) {
-                if (err)
-                    throw err;
-                // console.log("OnPath", search, err);
-                onEachPath(err);
-            });
+    var searches = this._getSearchPaths();
+    var progress = this._progress = {found: 0, indexed: 0, indexing: true};
+
+    if (_indexer) {
+        // someone else walks them for us (IE: util/requestpool,
+        //  for all its workers); we just iterate what they found
+        _indexer(searches, function(err, fileTypes) {
+            progress.indexing = false;
+            if (err) return onComplete(err);
+
+            self._types = registryOf(fileTypes);
+            progress.found = progress.indexed = Object.keys(fileTypes).length;
+            async.eachLimit(self._types.types(), MAX_PARALLEL, iterate, onComplete);
         });
-    }, function(err) {
+        return;
+    }
+
+    indexSources(searches, progress, function(file, types, callback) {
+        async.eachSeries(types, iterate, callback);
+    }, function(err, fileTypes) {
+        if (!err)
+            self._types = registryOf(fileTypes);
 
-        if (!err) {
-            self._allCachedTypes = allTypes;
-            self._fileToTypes = fileTypes;
-        }
-                    
         // console.log("Walked", self._root);
         onComplete(err);
     });
 };
 
-
 SourceClassLoader.prototype._getPathForType = function(/* type, cb */) {
     throw new Error(this.constructor.name + " must implement _getPathForType");
 };
@@ -662,13 +823,17 @@ SourceDirectoryClassLoader.prototype._getSearchPaths = function() {
 
 /**
  * The JarClassLoader loads projections of classes
- *  found in a jar file. For laziness, we simply
- *  use jar/javap and parse the output rather than
- *  try to learn the .class format
+ *  found in a jar file, reading the .class files
+ *  directly out of the jar. The list of types and
+ *  any projections are also kept in an on-disk
+ *  index (see util/diskcache) for the next time
  */
 function JarClassLoader(jarPath) {
     this._jar = jarPath;
-    this._classCache = {};
+    this._file = new JarFile(jarPath);
+    this._index = new JarIndex(jarPath);
+    this._classCache = newProjectionCache('classes');
+    this._inflight = new SingleFlight();
     this._classesCached = false;
     this._deferred = Q.defer();
 
@@ -695,110 +860,51 @@ JarClassLoader.prototype.openClass = function(qualifiedName,
     }
 
     // FIXME match projection
-    if (qualifiedName in this._classCache)
-        return callback(null, this._classCache[qualifiedName]);
+    var cached = this._classCache.get(qualifiedName);
+    if (cached)
+        return callback(null, cached);
 
-    // nop for now?
     var self = this;
-    this.getTypes(function(types) { // jshint ignore:line 
-
-        // if (projection) {
-        //     console.time("openClass" + qualifiedName);
-        //     console.time("filter" + qualifiedName);
-        // }
-
-        // find that class, and any nested classes
-        var found = false;
-        var inPackage = types.filter(function(type) {
-            found |= type == qualifiedName;
-            return /* ( */type == qualifiedName
-                // TODO include nested classes
-                // || ~type.indexOf(qualifiedName + '$'))
-                    && !(type in self._classCache)
-                    && !type.match(/\$[0-9]+$/); // omit anonymous classes
-        });
-
-        // if (projection)
-        //     console.timeEnd("filter" + qualifiedName);
+    this.getTypes(function() {
 
-        if (!found) {
+        if (!self._typeSet[qualifiedName]) {
             return callback(new Error(qualifiedName + " not in " + self._jar));
         } else if (!projection) {
             // only care that it exists
             return callback(null, true);
         }
 
-        if (!(inPackage && inPackage.length))
-            callback(new Error(qualifiedName + " not in " + this._jar));
-
-        var foundType = false;
-        var buffer = null;
-
-        // console.time("exec" + qualifiedName);
-
-        // use javap to proactively cache all classes in that package
-        // (faster, I think, than going one-by-one?)
-        var args = ['-public', '-classpath', self._jar].concat(inPackage);
-        var splitter = spawn('javap', args)
-            .stdout.pipe(StreamSplitter('\n'));
-        splitter.on('error', callback);
-        splitter.on('token', function(line) {
-            var utf8 = line.toString("UTF-8");
-            if (~utf8.indexOf("$SWITCH_TABLE$")
-                    || ~utf8.indexOf("access$")) {
-                // skip internal things
-                return;
-            } else if (~utf8.indexOf('{')) {
-                buffer = line;
-            } else if (~utf8.indexOf('}')) {
-                buffer = Buffer.concat([buffer, line]);
-
-                // console.timeEnd("exec" + qualifiedName);
-
-                // TODO include child classes?
-                self._parseBuffer(buffer, function(err, ast) {
-                    if (ast && ast.qualifiedName == qualifiedName) {
-                        self._classCache[qualifiedName] = ast;
-                        foundType = true;
-                        callback(null, ast);
-                    } else if (err) {
-                        // pass the error along (at least for now?)
-                        foundType = true;
-                        callback(err);
-                    }
-                });
-
-                buffer = null;
-
-            } else if (buffer != null) {
-                buffer = Buffer.concat([buffer, line]);
-            }
-        });
-        splitter.on('done', function() {
-            // console.timeEnd("openClass" + qualifiedName);
-            if (!foundType)
-                callback(new Error("Could not find/parse " + qualifiedName));
-        });
-
+        self._inflight.run(qualifiedName, function(done) {
+            self._readClass(qualifiedName, done);
+        }, callback);
     });
 }
 
-/**
- * Parse and cache the buffer output from javap 
- *  and return the projection. 
- * TODO Include nested classes? Normal openClass
- *  doesn't do this yet, either
- */
-JarClassLoader.prototype._parseBuffer = function(buf, callback) {
+JarClassLoader.prototype._readClass = function(qualifiedName, callback) {
+    var indexed = this._index.get(qualifiedName);
+    if (indexed) {
+        this._classCache.set(qualifiedName, indexed);
+        return callback(null, indexed);
+    }
+
     var self = this;
-    Ast.parseFile('', buf, {
-        fromJavap: true
-    }, function(err, ast) {
-        // console.log(err);
-        // if (err) console.log(buf.toString());
+    var entry = qualifiedName.replace(/\./g, '/') + '.class';
+    var stop = Stats.time('jar.readClass');
+    this._file.read(entry, function(err, buf) {
         if (err) return callback(err);
 
-        ast.projectType(self, ast.toplevel[0].qualifiedName, Ast.PROJECT_ALL, callback);
+        var projected;
+        try {
+            projected = new ClassFile(buf).project();
+        } catch (e) {
+            return callback(e);
+        } finally {
+            stop();
+        }
+
+        self._classCache.set(qualifiedName, projected);
+        self._index.put(projected);
+        callback(null, projected);
     });
 };
 
@@ -806,10 +912,7 @@ JarClassLoader.prototype._parseBuffer = function(buf, callback) {
  * Not normally needed, putCache for a Jar will still
  *  be called by the ComposedClassLoader from the
  *  /update server method, providing us an opportunity
- *  to proactively cache imported classes, since it
- *  takes so damn long to run javap. In the future,
- *  perhaps, we could just stop being lazy and learn
- *  how to directly parse java bytecode, but until then....
+ *  to proactively cache imported classes
  */
 JarClassLoader.prototype.putCache = function(path, ast) {
     // find imported types in this loader
@@ -836,16 +939,17 @@ JarClassLoader.prototype.resolveMethodReturnType = function(type, name, cb) {
     cb(new Error("resolveMethodReturnType not implemented")); // TODO
 };
 
+JarClassLoader.prototype.hasPackage = function(pkg) {
+    if (!this._classesCached)
+        return undefined;
+
+    return pkg in this._packages;
+};
+
 JarClassLoader.prototype.suggestImport = function(name, callback) {
-    // TODO cache by name in a map
-    var match = '.' + name;
-    var len = match.length;
-    this.getTypes(function(types) {
-        async.filter(types, function(type, cb) {
-            cb(type.substr(type.length - len) == match);
-        }, function(results) {
-            callback(null, results);
-        });
+    var self = this;
+    this.getTypes(function() {
+        callback(null, self._names.get(name));
     });
 };
 
@@ -862,22 +966,56 @@ JarClassLoader.prototype._getTypesImpl = function(cb) {
         return cb(this._classListCache);
 
     var self = this;
-    var types = [];
-    var jar = spawn('jar', ['tf', this._jar]);
-    var spawned = jar.stdout.pipe(StreamSplitter('\n'));
-    spawned.on('token', function(entry) {
-        entry = entry.toString("UTF-8");
-        if (entry.substr(-5) != 'class')
-            return;
-
-        var qualifiedName = entry.substr(0, entry.length - 6) // strip .class
-                                 .replace(/\//g, '.');
-        types.push(qualifiedName);
-    });
-    spawned.on('done', function() {
+    var onTypes = function(types) {
+        // only top-level classes can be imported by their binary
+        //  names; nested, anonymous, etc. are `$`-separated
+        self._names = new NameIndex(types.filter(isTopLevel));
+        self._typeSet = Object.create(null);
+        self._packages = Object.create(null);
+        types.forEach(function(type) {
+            self._typeSet[type] = true;
+            self._packages[type.substr(0, Math.max(0, type.lastIndexOf('.')))] = true;
+        });
         self._classListCache = types;
         self._classesCached = true;
         cb(types);
+    };
+
+    fs.stat(this._jar, function(err, stat) {
+        if (err) {
+            console.error("Unable to read", self._jar, err);
+            return onTypes([]);
+        }
+
+        self._index.load(stat, function(types) {
+            if (types)
+                return onTypes(types);
+
+            self._readTypes(function(err, types) {
+                if (err) {
+                    console.error("Unable to read", self._jar, err);
+                    return onTypes([]);
+                }
+
+                self._index.create(stat, types, function(err) {
+                    if (err) console.error("Unable to index", self._jar, err);
+                });
+                onTypes(types);
+            });
+        });
+    });
+};
+
+JarClassLoader.prototype._readTypes = function(cb) {
+    this._file.entries(function(err, entries) {
+        if (err) return cb(err);
+
+        cb(null, Object.keys(entries).filter(function(entry) {
+            return entry.substr(-6) == '.class';
+        }).map(function(entry) {
+            return entry.substr(0, entry.length - 6) // strip .class
+                        .replace(/\//g, '.');
+        }));
     });
 };
 
@@ -977,10 +1115,15 @@ util.inherits(ProxyClassLoader, ComposedClassLoader);
 
 /**
  * methods that should not be proxied; basically any
- *  that don't take a callback (so far just one)
+ *  that don't take a callback
  */
 ProxyClassLoader.UNPROXIED_METHODS = [
     'putCache'
+  , 'invalidate'
+  , 'getIndexProgress'
+  , 'typeVersion'
+  , 'pin'
+  , 'unpin'
 ];
 
 
@@ -1217,9 +1360,242 @@ module.exports = {
         return module.exports.fromSource(sourceFilePath, true);
     },
 
+    /**
+     * The file at path (declaring the types) was changed
+     *  in another process; see ComposedClassLoader.invalidate.
+     *  Any project could have it as a dependency, so they
+     *  all get to forget it
+     */
+    invalidate: function(path, types) {
+        Object.keys(CLASS_LOADER_CACHE).forEach(function(projectDir) {
+            CLASS_LOADER_CACHE[projectDir].invalidate(path, types);
+        });
+    },
+
+    /**
+     * Instead of versioning the types changed by putCache,
+     *  hand them to the listener, as `(path, types)`; they
+     *  have no version (see typeVersion) until it's given
+     *  with setVersions. This lets one process version the
+     *  changes made in several
+     */
+    onTypesChanged: function(listener) {
+        _onTypesChanged = listener;
+    },
+
+    /**
+     * Instead of walking the source files to index a project's
+     *  types, SourceClassLoaders hand their search paths to
+     *  the indexer, as `(searches, callback)`, and use the
+     *  `fileTypes` it calls back with (see indexSources). This
+     *  lets one process index for several
+     */
+    indexWith: function(indexer) {
+        _indexer = indexer;
+    },
+
+    indexSources: indexSources,
+
+    /**
+     * Version the types as changed just now
+     * @return The new versions, for setVersions
+     */
+    versionTypes: function(types) {
+        var versions = {types: {}};
+        var generation = ++_generation;
+        types.forEach(function(type) {
+            versions.types[type] = _versions[type] = generation;
+        });
+        return versions;
+    },
+
+    /** @return Every version we know, for setVersions */
+    versions: function() {
+        return {epoch: _epoch, types: util._extend({}, _versions)};
+    },
+
+    /**
+     * Adopt versions from versions() or versionTypes()
+     *  (IE: from another process)
+     */
+    setVersions: function(versions) {
+        if (versions.epoch)
+            _epoch = versions.epoch;
+        util._extend(_versions, versions.types);
+    },
+
     extractPackage: extractPackage
 }
 
+/** see ComposedClassLoader.typeVersion */
+function typeVersion(type) {
+    var generation = _versions[type];
+    if (generation === null)
+        return null;
+
+    return _epoch + '.' + (generation || 0);
+}
+
+/** Version the types changed by putCache; see onTypesChanged */
+function typesChanged(path, types) {
+    if (!types.length)
+        return;
+
+    if (!_onTypesChanged)
+        return module.exports.versionTypes(types);
+
+    types.forEach(function(type) {
+        _versions[type] = null;
+    });
+    _onTypesChanged(path, types);
+}
+
+/**
+ * Walk the .java files in the search paths, handing each to
+ *  a pool of workers to parse its declarations as soon as
+ *  it's found. Files that can't be parsed are skipped.
+ *
+ * @param progress A dict like getIndexProgress() returns,
+ *  which we keep up to date
+ * @param onTypes Optional fn(file, types, callback), called
+ *  with the types declared in each file as it's parsed. If
+ *  its callback gets an error, the walk stops
+ * @param callback fn(err, fileTypes), where fileTypes maps
+ *  each file found to the types it declares
+ */
+function indexSources(searches, progress, onTypes, callback) {
+    var fileTypes = {};
+    var globs = [];
+    var pool = new WorkerPool(INDEX_WORKER, INDEX_WORKERS);
+    var searching = searches.length;
+    var finished = false;
+
+    function finish(err) {
+        if (finished) return;
+        finished = true;
+
+        pool.close();
+        globs.forEach(function(g) {
+            g.abort();
+        });
+        progress.indexing = false;
+
+        callback(err, err ? undefined : fileTypes);
+    }
+
+    function checkDone() {
+        if (!searching && progress.indexed == progress.found)
+            finish();
+    }
+
+    function onFile(file) {
+        if (finished || file in fileTypes)
+            return; // dup from an overlapping search path
+
+        fileTypes[file] = [];
+        progress.found++;
+
+        pool.run({path: file}, function(err, qualifieds) {
+            if (finished) return;
+            if (err) {
+                // just skip it
+                console.error("indexSources: couldn't parse", file, err.message);
+                qualifieds = [];
+            }
+
+            var types = fileTypes[file] = qualifieds.filter(isType);
+            if (!onTypes)
+                return parsed();
+
+            onTypes(file, types, parsed);
+        });
+    }
+
+    function parsed(err) {
+        progress.indexed++;
+        if (err) return finish(err);
+
+        checkDone();
+    }
+
+    searches.forEach(function(dir) {
+        var search = path.join(dir, '**', '*.java');
+
+        var g = new glob.Glob(search);
+        globs.push(g);
+        g.on('match', onFile);
+        g.on('error', finish);
+        g.on('end', function() {
+            searching--;
+            checkDone();
+        });
+    });
+
+    // nothing to search?
+    checkDone();
+}
+
+/** @return A TypeRegistry of the fileTypes from indexSources */
+function registryOf(fileTypes) {
+    var types = new TypeRegistry();
+    Object.keys(fileTypes).forEach(function(file) {
+        types.setFileTypes(file, fileTypes[file]);
+    });
+    return types;
+}
+
+/**
+ * Drop the ComposedClassLoader's projections of the
+ *  types, and its misses (since any new type could
+ *  satisfy one)
+ */
+function forget(composed, types) {
+    composed._misses.clear();
+    types.forEach(function(type) {
+        composed._cached.remove(type);
+    });
+}
+
+/**
+ * @return The loaders that could have the type, in order;
+ *  that is, all but those that know they don't have its package
+ */
+function routeLoaders(loaders, qualifiedName) {
+    var pkg = extractPackage(qualifiedName);
+    if (pkg === undefined)
+        return loaders;
+
+    return loaders.filter(function(loader) {
+        return !loader.hasPackage || loader.hasPackage(pkg) !== false;
+    });
+}
+
+/**
+ * @return The ComposedClassLoader's cache of misses,
+ *  cleared first if its loaders have changed
+ */
+function getMisses(composed) {
+    var misses = composed._misses;
+    if (composed._missesLoaders !== composed._loaders.length) {
+        misses.clear();
+        composed._missesLoaders = composed._loaders.length;
+    }
+    return misses;
+}
+
+/** Cache for projections (or resolved types) by qualified name */
+function newProjectionCache(name) {
+    return new LruCache(name, util._extend({
+        sizeOf: function(projection) {
+            return JSON.stringify(projection).length;
+        }
+    }, LruCache.budget(name, PROJECTION_BUDGET)));
+}
+
+function isTopLevel(type) {
+    return !~type.indexOf('$');
+}
+
 function isType(qualified) {
     // if '#,' this is a field or method
     return !~qualified.indexOf('#');
@@ -21,8 +21,15 @@ module.exports = function(req, res) {
 
         console.log("init: cached", path);
         loader.putCache(path, ast);
+        loader.pin(path); // until the client closes it
 
-        // TODO begin pre-caching/indexing
+        // index the project's types in the background;
+        //  see the "progress" controller
+        loader.indexTypes(function(err) {
+            if (err) return console.error("init: index", err);
+
+            console.log("init: indexed", path);
+        });
     });
 }
 
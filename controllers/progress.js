@@ -0,0 +1,15 @@
+/**
+ * "progress" controller, for checking on
+ *  the background indexing started by "init"
+ */
+
+var ClassLoader = require('../classloader');
+
+module.exports = function(req, res) {
+
+    var loader = ClassLoader.cachedFromSource(req.body.path);
+    res.json(loader.getIndexProgress());
+}
+
+// don't attach the middleware
+module.exports.usesBuffers = false;
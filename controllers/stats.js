@@ -0,0 +1,49 @@
+/**
+ * "stats" controller, for seeing where requests
+ *  are spending their time (see util/stats), and
+ *  how our caches are doing
+ *
+ * With request workers (see util/requestpool), the
+ *  class loaders and their caches are in them, so
+ *  their stats are merged into the server's. A
+ *  request with `snapshot` set gets just our own,
+ *  raw, for merging
+ */
+
+var Stats = require('../util/stats')
+  , LruCache = require('../util/cache');
+
+module.exports = function(req, res) {
+
+    if (req.body && req.body.snapshot) {
+        return res.json({
+            histograms: Stats.snapshot()
+          , caches: LruCache.report()
+        });
+    }
+
+    if (!req.pool)
+        return res.json(report([]));
+
+    req.pool.stats(function(err, snapshots) {
+        if (err) return res.send(500, err.message);
+
+        res.json(report(snapshots));
+    });
+}
+
+function report(snapshots) {
+    var report = Stats.report(snapshots.map(function(snapshot) {
+        return snapshot.histograms;
+    }));
+    report.caches = LruCache.report(snapshots.map(function(snapshot) {
+        return snapshot.caches;
+    }));
+    return report;
+}
+
+// don't attach the middleware
+module.exports.usesBuffers = false;
+
+// handled by the server process, which asks the workers
+module.exports.local = true;
@@ -2,8 +2,28 @@
  * Suggestions HTTP handler
  */
 
-var Suggestor = require('../suggest');
+var Suggestor = require('../suggest')
 
+  // suggestions per page, unless the client says otherwise
+  , DEFAULT_LIMIT = 50;
+
+/**
+ * Optional request params, besides the usual:
+ *  - prefix: Match member names against this instead of
+ *      what's typed between the `.` and the cursor
+ *  - offset, limit: Which page of the ranked matches to return
+ *  - type: Suggest members of this type (IE: the `type` of an
+ *      earlier response) instead of resolving the one at
+ *      the cursor; cheaper, for fetching more
+ *  - known: Dict of type -> version for types the client
+ *      already has every member of; if we suggest from one,
+ *      members only have their `id` and `rank`
+ *
+ * Besides the results, the response has the `type` they're
+ *  members of and its `version` (see Suggestor.page), the
+ *  `total` number that matched, and the offset of the
+ *  `next` page (or null if there's no more)
+ */
 module.exports = function(req, res) {
     
     console.log('Suggest request @', req.body.path, ':', req.line, req.ch);
@@ -12,6 +32,12 @@ module.exports = function(req, res) {
 
     Suggestor.of(req.body.path, req.buf)
     .at(req.line, req.ch)
+    .parseWith(req.ast)
+    .timeWith(req.timer)
+    .ofType(req.body.type)
+    .knowing(req.body.known)
+    .matching(req.body.prefix)
+    .page(req.body.offset || 0, req.body.limit || DEFAULT_LIMIT)
     .find(function(err, resolved)  {
         console.log("err?", err);
 
@@ -19,11 +45,16 @@ module.exports = function(req, res) {
         //  return empty set, but log?
         if (err) return res.send(500, err);
 
-        // if (formatter)
-        //     resolved = formatter(resolved);
-
-        resolved.qualifiedName = undefined; // strip this field... unneeded
-        res.results(resolved);
-        // console.log('Suggested', require('util').inspect(resolved, {depth:5}));
+        res.results({
+            methods: resolved.methods
+          , fields: resolved.fields
+        }, {
+            // the typed name gets replaced
+            start: {ch: req.ch - resolved.prefix.length}
+          , type: resolved.qualifiedName
+          , version: resolved.version
+          , total: resolved.total
+          , next: resolved.next
+        });
     });
 }
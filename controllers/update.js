@@ -11,8 +11,15 @@ var async = require('async')
   , MAX_PARALLEL = 20;
 
 function handleMissing(loader, ast, onComplete) {
-    ast.on('missing', function(missing) {
-        if (!missing) return onComplete({});
+    // with nothing to check, it's emitted during the parse,
+    //  before we get the ast to listen to
+    if (ast.missing)
+        return onMissing(ast.missing);
+
+    ast.on('missing', onMissing);
+
+    function onMissing(missing) {
+        if (!missing) return onComplete(null, {});
 
         async.eachLimit(missing, MAX_PARALLEL, function(data, callback) {
             loader.suggestImport(data.name, function(err, imports) {
@@ -39,7 +46,7 @@ function handleMissing(loader, ast, onComplete) {
 
             onComplete(null, json);
         });
-    });
+    }
 }
 
 module.exports = function(req, res) {
@@ -66,6 +73,11 @@ module.exports = function(req, res) {
             console.log("suggest", err, json);
             if (err) return res.send(400, err.message);
 
+            // so clients can forget what they knew about them
+            json.types = Object.keys(ast.qualifieds).filter(function(name) {
+                return !~name.indexOf('#');
+            });
+
             res.json(json);
         });
     });
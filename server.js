@@ -1,8 +1,11 @@
 #!/usr/bin/env node
 
 var express = require('express')
-  , parseFile = require('./ast').parseFile
-  , ClassLoader = require('./classloader');
+  , os = require('os')
+  , Daemon = require('./util/daemon')
+  , Requests = require('./util/requests')
+  , RequestPool = require('./util/requestpool')
+  , Stats = require('./util/stats');
 
 // --------------------------------------------------------------------------------
 // configs
@@ -12,6 +15,20 @@ var express = require('express')
 var HTTP_PORT; // undefined picks a random port
 HTTP_PORT = 3000; // for testing convenience
 
+// processes to handle requests in; see util/requestpool.
+//  Set NJAST_WORKERS to override; 0 handles everything in
+//  this process
+var WORKERS = process.env.NJAST_WORKERS !== undefined
+    ? parseInt(process.env.NJAST_WORKERS, 10)
+    : Math.max(1, Math.min(4, os.cpus().length - 1));
+
+// `--daemon <dir>` runs us as a daemon shared by every vim,
+//  advertised by a lockfile in the dir; see util/daemon.
+//  `--idle <seconds>` is how long it lasts without requests
+var argv = process.argv.slice(2);
+var DAEMON_DIR = argValue('--daemon');
+var IDLE_TIMEOUT = argValue('--idle');
+
 
 // --------------------------------------------------------------------------------
 // re-route logging (actually, we can just run this externally)
@@ -46,100 +63,43 @@ if (DEBUG) {
 var app = express();
 app.use(require('body-parser')());
 
+var pool = WORKERS > 0
+    ? new RequestPool(WORKERS)
+    : null;
+
+var daemon = DAEMON_DIR
+    ? new Daemon(DAEMON_DIR, {idleTimeout: IDLE_TIMEOUT * 1000})
+    : null;
+
 // --------------------------------------------------------------------------------
 // middleware
 // --------------------------------------------------------------------------------
 
-// middleware that handles request body
-var bufferParser = function(req, res, next) {
-
-    if (!req.body)
-        return res.send(400, "Empty body");
-    else if (!req.body.pos)
-        return res.send(400, "No pos");
-
-    var path = req.body.path;
-    var line = req.body.pos[0];
-    var ch   = req.body.pos[1];
-    var file = req.body.buffer;
-
-    if (!(path && line && file !== undefined && ch !== undefined)) {
-        console.log("400!", path, line, ch, file);
-        return res.send(400);
-    }
-
-    if (typeof(file) == 'string')
-        file = {type: 'full', text: file};
-
-    req.path = path;
-    req.line = line;
-    req.ch = ch;
-    req.start = 0;
-    req.buf = file
-    req.buf.text = new Buffer(file.text); // FIXME encoding?
-
-    /** 
-     * Convenience function to get an ast.
-     *  Unlike parseFile, strict defaults to false!
-     */
-    req.ast = function(options, callback) {
-        if (!callback) {
-            callback = options;
-            options = {strict: false};
-        }
-        
-        parseFile(path, req.buf, options, callback);
-    };
-
-    req.classLoader = function() {
-        return ClassLoader.cachedFromSource(path);
-    };
+// a daemon stays up as long as someone's using it
+if (daemon) {
+    app.use(function(req, res, next) {
+        daemon.touch();
+        next();
+    });
+}
 
-    /** same stuff for document and define, so... */
-    req.resolveDeclaringNode = function(cb) {
-
-        var loader = req.classLoader();
-        req.ast(function(err, ast) {
-            if (err) return res.send(400, err.message);
-
-            var node = ast.locate(req.line, req.ch);
-            node.resolveDeclaringType(loader, function(err, type) {
-                if (err) return res.send(400, err.message);
-
-                var declaring = ast.qualifieds[type];
-                if (declaring) {
-                    // yes, it's local... is it a type?
-                    if (declaring.name == node.name)
-                        // class, enum, etc.
-                        return cb(declaring.constructor.name.toLowerCase(), declaring);
-
-                    // search by scope
-                    var varDef = node.searchScope(node.name)
-                    if (varDef)
-                        return cb('var', varDef);
-
-                    var method = node.searchMethodScope(node.name);
-                    if (method)
-                        return cb('method', method);
-                }
-
-                // TODO parent types?
-                res.json({error:"Not implemented; found: " + node.constructor.name + " in " + type});
-            });
-        });
-    };
+// time every request, and the phases of handling it; see util/stats
+app.use(function(req, res, next) {
+    var timer = req.timer = new Stats.RequestTimer(req.path);
+    res.on('finish', function() {
+        timer.finish();
+    });
 
-    res.results = function(json) {
-        res.json({
-            // TODO proper start/end locations?
-            start: {ch: ch}
-          , end: {ch: ch} 
-          , results: json
-        });
+    var json = res.json;
+    res.json = function() {
+        var stop = timer.start('serialize');
+        var result = json.apply(this, arguments);
+        stop();
+        return result;
     };
 
     next();
-};
+});
 
 // --------------------------------------------------------------------------------
 // prepare routing
@@ -152,19 +112,16 @@ app.post('/log', function(req, res) {
 });
 
 // connect all controllers
-require('fs').readdir('./controllers', function(err, files) {
-    if (err) throw err;
-
-    files.forEach(function(file) {
-        var path = '/' + file.substr(0, file.indexOf('.'));
-        if (path == '/')
-            return;
-
-        var controller = require('./controllers' + path);
-        var middleware = controller.usesBuffers === false
-            ? []
-            : bufferParser;
-        app.post(path, middleware, controller); 
+Requests.endpoints().forEach(function(endpoint) {
+    if (!pool || Requests.isLocal(endpoint)) {
+        return app.post(endpoint, function(req, res) {
+            req.pool = pool; // IE: for /stats to ask the workers
+            Requests.handle(endpoint, req, res);
+        });
+    }
+
+    app.post(endpoint, function(req, res) {
+        pool.handle(endpoint, req, res);
     });
 });
 
@@ -173,8 +130,39 @@ require('fs').readdir('./controllers', function(err, files) {
 // --------------------------------------------------------------------------------
 
 var server = require('http').createServer(app);
-server.listen(HTTP_PORT)
+server.listen(daemon ? 0 : HTTP_PORT, daemon ? '127.0.0.1' : undefined)
 .on('listening', function() {
-    console.log("Listening on port " + server.address().port);
+    var port = server.address().port;
+    if (daemon) {
+        var owner = daemon.lock(port);
+        if (owner) {
+            // someone beat us to it; point them there
+            console.log("Daemon", owner.pid, "is already running");
+            console.log("Listening on port " + owner.port);
+            return shutdown();
+        }
+
+        process.on('exit', function() {
+            daemon.unlock();
+        });
+        process.on('SIGINT', shutdown);
+        process.on('SIGTERM', shutdown);
+        daemon.onIdle(function() {
+            console.log("Idle for", daemon.idleTimeout, "ms; exiting");
+            shutdown();
+        });
+    }
+
+    console.log("Listening on port " + port);
 });
 
+function shutdown() {
+    if (pool)
+        pool.close();
+    process.exit(0);
+}
+
+function argValue(name) {
+    var index = argv.indexOf(name);
+    return ~index ? argv[index + 1] : undefined;
+}
@@ -1,10 +1,12 @@
 
 var Ast = require('./ast')
   , parseFile = Ast.parseFile
-  , ClassLoader = require('./classloader');
+  , ClassLoader = require('./classloader')
+  , LineIndex = require('./util/lines')
+  , Matcher = require('./util/matcher');
 
-var CR = '\r'.charCodeAt(0);
-var NL = '\n'.charCodeAt(0);
+// what's been typed of the member name, before the cursor
+var TYPED_NAME = /[\w$]*$/;
 
 function Suggestor(path, buffer) {
     // NB the buffer may be a dict with a "type"
@@ -22,11 +24,89 @@ Suggestor.prototype.at = function(line, col) {
     return this;
 }
 
+/**
+ * Use the given function to get our Ast instead of
+ *  parsing the buffer ourselves; it is called like
+ *  `parse(options, callback)` (see req.ast in server.js)
+ */
+Suggestor.prototype.parseWith = function(parse) {
+    this._parse = parse;
+
+    return this;
+}
+
+/**
+ * Record how long we spend in each phase
+ *  with the given RequestTimer (see util/stats)
+ */
+Suggestor.prototype.timeWith = function(timer) {
+    this._timer = timer;
+
+    return this;
+}
+
+/**
+ * Only suggest members whose names match what's been typed
+ *  after the `.` (see util/matcher), best matches first, and
+ *  only `limit` of them, starting from `offset`. The result
+ *  also has:
+ *
+ *  - qualifiedName: the type we suggested members of
+ *  - version: its typeVersion (see ClassLoader), or null if
+ *      it's declared in the buffer (and may change any time)
+ *  - prefix: what we matched against
+ *  - total: how many members matched
+ *  - next: the offset of the next page, or null if that's all
+ *
+ * and each member in it has its `rank` among all that matched,
+ *  and an `id` that's unique within the type's version
+ */
+Suggestor.prototype.page = function(offset, limit) {
+    this._offset = offset;
+    this._limit = limit;
+
+    return this;
+}
+
+/**
+ * Match against the given text (see page()) instead of
+ *  what's typed before the cursor
+ */
+Suggestor.prototype.matching = function(prefix) {
+    this._prefix = prefix;
+
+    return this;
+}
+
+/**
+ * Note that the client already has all the members of the
+ *  given types (type -> version). If we suggest from one of
+ *  those (and the version matches), the members in the page
+ *  will only have their `id` and `rank`
+ */
+Suggestor.prototype.knowing = function(versions) {
+    this._known = versions;
+
+    return this;
+}
+
+/**
+ * Suggest members of the given type instead of resolving
+ *  the type at the cursor; IE: for fetching another page.
+ *  The buffer is still parsed, since the type may be
+ *  declared in it
+ */
+Suggestor.prototype.ofType = function(type) {
+    this._type = type;
+
+    return this;
+}
+
 Suggestor.prototype.find = function(cb) {
 
     // extract the current line of text
     var line = this._extractLine();
-    if (!line) {
+    if (line === null) {
         return cb(new Error('Could not find line ' 
             + this._line 
             + ' (start:' + this._start + ')'));
@@ -35,85 +115,63 @@ Suggestor.prototype.find = function(cb) {
     // console.log("Found line!", line);
 
     // locate the last . before the cursor
-    var dot = line.substr(0, this._col).lastIndexOf('.');
+    var beforeCursor = line.substr(0, this._col);
+    var dot = beforeCursor.lastIndexOf('.');
 
     var lineNo = this._line;
     var colNo = this._col;
     var self = this;
+    var prefix = this._prefix;
     if (~dot) {
         colNo = dot - 1;
+        if (prefix === undefined)
+            prefix = TYPED_NAME.exec(beforeCursor)[0];
     }
 
     // parseFile does the right thing 
     //  if our buffer is partial
     var loader = this._loader;
-    parseFile(this._path, this._buffer, {
+    var parse = this._parse || parseFile.bind(null, this._path, this._buffer);
+    parse({
         strict: false
+      , lazyBodies: true
       // , debug: true
     }, function(err, ast) {
         if (err) return cb(err);
 
+        if (self._type) {
+            // no need to locate anything; but if it's declared
+            //  here, the saved file may be stale (or not exist)
+            return self._onTypeResolved(ast, {type: self._type}, prefix || '', cb);
+        }
+
         // console.log("Locating...");
+        var stopLocate = self._time('locate');
         var node = ast.locate(lineNo, colNo)
+        stopLocate();
         if (!node) {
             console.log("... nothing :(");
             return cb(new Error("Unable to locate node at " + lineNo + "," + colNo));
         }
         // console.log("Found", require('util').inspect(node.toJSON(), {depth:5}));
+        var stopEvaluate = self._time('evaluateType');
         node.evaluateType(loader, function(err, result) {
+            stopEvaluate();
             if (err) return cb(err);
 
-            self._onTypeResolved(ast, result, cb);
+            self._onTypeResolved(ast, result, prefix || '', cb);
         });
     });
 };
 
+/** @return The text of the cursor's line, or null */
 Suggestor.prototype._extractLine = function() {
-    var line = this._start;
-    var lineStart = -1;
-    var off = 0;
-    while (true) {
-
-        if (off > this._raw.length)
-            return null;
-
-        var oldLine = line;
-
-        var token = this._raw[off];
-        var nextToken = off + 1 < this._raw.length
-            ? this._raw[off+1]
-            : undefined;
-
-        if (token == NL) {
-            line++;
-
-        } else if (token == CR ) {
-            if (nextToken != NL) { // \r\n to end a line
-                line++;            // just \r 
-            } else {
-                off++; // \r\n... skip next
-            }
-        }
-
-        // advance
-        off++;
-
-        // check if we're done
-        if (oldLine != line) {
-            if (line == this._line)
-                // found our line!
-                lineStart = off;
-
-            else if (line > this._line)
-                // our line has ended!
-                return this._raw.toString("utf-8", lineStart, off);
-        }
-    }
-
-
+    return LineIndex.of(this._raw)
+        .getLine(this._line - this._start + 1);
 };
 
-Suggestor.prototype._onTypeResolved = function(ast, resolved, cb) {
+Suggestor.prototype._onTypeResolved = function(ast, resolved, prefix, cb) {
+    var self = this;
     var className = resolved.type;
     var projection = ['methods', 'fields'];
     // FIXME check if this type is the return value
@@ -121,18 +179,79 @@ Suggestor.prototype._onTypeResolved = function(ast, resolved, cb) {
     // FIXME else, only STATIC methods, fields, subclasses
 
     // console.log("Resolved type:", className);
-    if (ast.qualifieds[className]) {
+    var stopProject = this._time('project');
+    var version = null;
+    var onProjected = function(err, result) {
+        stopProject();
+        if (!err && result && self._limit !== undefined)
+            result = self._paginate(className, version, result, prefix);
+        cb(err, result);
+    };
+
+    if (ast && ast.qualifieds[className]) {
         // shortcut the classloader
-        ast.projectType(this._loader, className, projection, cb);
+        ast.projectType(this._loader, className, projection, onProjected);
         return;
     }
 
     // let the class loader handle it
-    // console.time('openClass');
-    this._loader.openClass(className, projection, function(err, result) {
-        // console.timeEnd('openClass');
-        cb(err, result);
+    version = this._loader.typeVersion(className);
+    this._loader.openClass(className, projection, onProjected);
+};
+
+/** Rank and slice the projected members; see page() */
+Suggestor.prototype._paginate = function(className, version, projected, prefix) {
+    var candidates = [];
+    ['methods', 'fields'].forEach(function(kind) {
+        (projected[kind] || []).forEach(function(member, index) {
+            candidates.push({
+                kind: kind
+              , member: member
+              , id: kind.charAt(0) + index
+            });
+        });
+    });
+
+    var ranked = Matcher.rank(candidates, prefix, function(candidate) {
+        return candidate.member.name;
+    });
+
+    var offset = this._offset;
+    var end = offset + this._limit;
+    var known = version !== null && this._known
+        && this._known[className] === version;
+    var page = {
+        qualifiedName: projected.qualifiedName || className
+      , version: version
+      , methods: []
+      , fields: []
+      , prefix: prefix
+      , total: ranked.length
+      , next: end < ranked.length ? end : null
+    };
+
+    ranked.slice(offset, end).forEach(function(candidate, i) {
+        var member = {id: candidate.id, rank: offset + i};
+        if (!known) {
+            // copy it; the projection may be cached
+            Object.keys(candidate.member).forEach(function(key) {
+                member[key] = candidate.member[key];
+            });
+        }
+        page[candidate.kind].push(member);
     });
+    return page;
+};
+
+/**
+ * Start timing a phase, if we have a timer
+ * @return A function to call when it's done
+ */
+Suggestor.prototype._time = function(phase) {
+    if (!this._timer)
+        return function() {};
+
+    return this._timer.start(phase);
 };
 
 
@@ -99,7 +99,8 @@ chai.use(function(_chai, utils) {
  * Trim the size of the stacktrace for easier viewing as we debug */
 /* jshint ignore:start 
  */
-console.oldError = console.error;
+if (!console.oldError) // another test file may have wrapped it already
+    console.oldError = console.error;
 console.error = function () {
     if (typeof arguments.stack !== 'undefined') {
         console.oldError.call(console, arguments.stack);
@@ -1668,6 +1669,177 @@ describe("Ast of Foo.java", function() {
     });
 });
 
+describe("Reparse of FullAst.java", function() {
+
+    var lines;
+    before(function() {
+        lines = fs.readFileSync(PATH).toString().split('\n');
+    });
+
+    function edit(start, end, replacement) {
+        var edited = lines.slice();
+        edited.splice.apply(edited, [start - 1, end - start + 1]
+            .concat(replacement));
+        return new Buffer(edited.join('\n'));
+    }
+
+    function parse(buffer, cb) {
+        parseFile(PATH, buffer, {strict: false}, function(err, _ast) {
+            if (err) throw err;
+            cb(_ast);
+        });
+    }
+
+    it("updates a method body in place", function(done) {
+        parse(fs.readFileSync(PATH), function(ast) {
+            var edited = edit(203, 203, [
+                '        int added = 42;'
+              , '        added++;'
+            ]);
+            ast.reparse(edited, {start: 203, end: 203, delta: 1})
+                .should.be.true;
+
+            // newly declared
+            ast.locate(203, 18).should.have.property('name')
+                .that.equals('added');
+
+            // shifted
+            var method = ast.qualifieds['net.dhleong.njast.FullAst#getImported'];
+            method.start.line.should.equal(210);
+            ast.locate(211, 20).should.have.property('name')
+                .that.equals('Imported');
+            done();
+        });
+    });
+
+    it("refuses to unbalance braces", function(done) {
+        parse(fs.readFileSync(PATH), function(ast) {
+            var edited = edit(203, 203, ['        if (true) {']);
+            ast.reparse(edited, {start: 203, end: 203, delta: 0})
+                .should.be.false;
+            done();
+        });
+    });
+
+    it("refuses edits outside a method", function(done) {
+        parse(fs.readFileSync(PATH), function(ast) {
+            var edited = edit(208, 208, ['    int field;']);
+            ast.reparse(edited, {start: 208, end: 208, delta: 0})
+                .should.be.false;
+            done();
+        });
+    });
+});
+
+describe("Nodes between lines of FullAst.java", function() {
+
+    var ast;
+    before(function(done) {
+        parseFile(PATH, fs.readFileSync(PATH), {strict: false}, function(err, _ast) {
+            if (err) throw err;
+            ast = _ast;
+            done();
+        });
+    });
+
+    it("finds everything on a line, parents first", function() {
+        var nodes = ast.nodesBetween(210);
+        nodes[0].should.equal(ast._root);
+        nodes.should.contain(ast.qualifieds['net.dhleong.njast.FullAst#getImported']);
+        nodes.some(function(node) {
+            return node.name == 'Imported';
+        }).should.be.true;
+    });
+
+    it("finds everything in a range", function() {
+        var nodes = ast.nodesBetween(209, 215);
+        nodes.should.contain(ast.qualifieds['net.dhleong.njast.FullAst#getImported']);
+        nodes.should.contain(ast.qualifieds['net.dhleong.njast.FullAst#localClassFactory']);
+        nodes.should.not.contain(ast.qualifieds['net.dhleong.njast.FullAst#fluidMethod']);
+    });
+});
+
+describe("Declarations-only Ast of FullAst.java", function() {
+
+    var full, decl;
+    before(function(done) {
+        var buf = fs.readFileSync(PATH);
+        parseFile(PATH, buf, {strict: false}, function(err, _full) {
+            if (err) throw err;
+            full = _full;
+            parseFile(PATH, buf, {
+                strict: false
+              , declarationsOnly: true
+            }, function(err, _decl) {
+                if (err) throw err;
+                decl = _decl;
+                done();
+            });
+        });
+    });
+
+    it("declares the same members", function() {
+        Object.keys(decl.qualifieds).forEach(function(qualified) {
+            full.qualifieds.should.have.property(qualified);
+            decl.qualifieds[qualified].end.should.deep
+                .equal(full.qualifieds[qualified].end);
+        });
+
+        // but not local classes
+        Object.keys(full.qualifieds).filter(function(qualified) {
+            return !(qualified in decl.qualifieds);
+        }).should.deep.equal([
+            'net.dhleong.njast.FullAst$1LocalClass'
+          , 'net.dhleong.njast.FullAst$2LocalClass'
+        ]);
+    });
+
+    it("skips method bodies", function() {
+        var method = decl.qualifieds['net.dhleong.njast.FullAst#getImported'];
+        method.body.kids.should.be.empty;
+    });
+});
+
+describe("Lazy Ast of FullAst.java", function() {
+
+    var lazy;
+    beforeEach(function(done) {
+        parseFile(PATH, fs.readFileSync(PATH), {
+            strict: false
+          , lazyBodies: true
+        }, function(err, _lazy) {
+            if (err) throw err;
+            lazy = _lazy;
+            done();
+        });
+    });
+
+    it("defers method bodies", function() {
+        var method = lazy.qualifieds['net.dhleong.njast.FullAst#getImported'];
+        should.exist(method.body._lazy);
+        method.end.line.should.equal(211);
+    });
+
+    it("parses a body when located in", function() {
+        lazy.locate(210, 20).should.have.property('name')
+            .that.equals('Imported');
+
+        var method = lazy.qualifieds['net.dhleong.njast.FullAst#getImported'];
+        should.not.exist(method.body._lazy);
+        method.body.kids.should.have.length(1);
+    });
+
+    it("shifts deferred bodies on reparse", function() {
+        var lines = fs.readFileSync(PATH).toString().split('\n');
+        lines.splice(202, 1, '        int added = 42;', '        added++;');
+        lazy.reparse(new Buffer(lines.join('\n')), {start: 203, end: 203, delta: 1})
+            .should.be.true;
+
+        lazy.locate(211, 20).should.have.property('name')
+            .that.equals('Imported');
+    });
+});
+
 // describe("MinusUser.java", function() {
 //     it.only("test", function(done) {
 //         // var path = '/Users/dhleong/git/ape-minus/src/main/java/com/minus/ape/MinusUser.java';
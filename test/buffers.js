@@ -0,0 +1,95 @@
+#!/usr/bin/env mocha
+
+var BufferStore = require('../util/buffers')
+  , should = require('chai').should()
+
+  , PATH = 'Foo.java';
+
+describe("BufferStore", function() {
+
+    var store;
+    beforeEach(function() {
+        store = new BufferStore();
+        store.resolve(PATH, {
+            type: 'full'
+          , version: 1
+          , text: 'class Foo {\n    int bar;\n}\n'
+        });
+    });
+
+    it("resolves an unchanged version", function() {
+        var buf = store.resolve(PATH, {type: 'same', version: 1});
+        buf.type.should.equal('full');
+        buf.text.toString().should.equal('class Foo {\n    int bar;\n}\n');
+    });
+
+    it("applies line changes", function() {
+        var buf = store.resolve(PATH, {
+            type: 'delta'
+          , base: 1
+          , version: 2
+          , changes: [{start: 1, end: 2, text: '    int baz;\n    int biz;\n'}]
+        });
+        buf.version.should.equal(2);
+        buf.text.toString()
+            .should.equal('class Foo {\n    int baz;\n    int biz;\n}\n');
+
+        store.resolve(PATH, {type: 'same', version: 2})
+            .text.should.equal(buf.text);
+    });
+
+    it("reuses the Ast of an unchanged version", function(done) {
+        var buf = store.resolve(PATH, {type: 'same', version: 1});
+        store.parse(PATH, buf, {strict: false}, function(err, ast) {
+            should.not.exist(err);
+
+            buf = store.resolve(PATH, {type: 'same', version: 1});
+            store.parse(PATH, buf, {strict: false}, function(err, again) {
+                should.not.exist(err);
+                again.should.equal(ast);
+                done();
+            });
+        });
+    });
+
+    it("rejects stale versions", function() {
+        should.not.exist(store.resolve(PATH, {type: 'same', version: 2}));
+        should.not.exist(store.resolve('Bar.java', {type: 'same', version: 1}));
+        should.not.exist(store.resolve(PATH, {
+            type: 'delta'
+          , base: 3
+          , version: 4
+          , changes: []
+        }));
+    });
+
+    it("keeps each client's buffers apart", function() {
+        store.resolve(PATH, {
+            type: 'full'
+          , version: 1
+          , text: 'class Foo {}\n'
+          , client: 'other'
+        });
+
+        // same version, different text
+        store.resolve(PATH, {type: 'same', version: 1})
+            .text.toString().should.equal('class Foo {\n    int bar;\n}\n');
+        store.resolve(PATH, {type: 'same', version: 1, client: 'other'})
+            .text.toString().should.equal('class Foo {}\n');
+
+        // and one's version means nothing to another
+        should.not.exist(store.resolve(PATH, {
+            type: 'same'
+          , version: 1
+          , client: 'third'
+        }));
+
+        store.remove(PATH, 'other');
+        should.not.exist(store.resolve(PATH, {
+            type: 'same'
+          , version: 1
+          , client: 'other'
+        }));
+        should.exist(store.resolve(PATH, {type: 'same', version: 1}));
+    });
+});
@@ -0,0 +1,81 @@
+#!/usr/bin/env mocha
+
+var should = require('chai').should()
+  , LruCache = require('../util/cache');
+
+describe("LruCache", function() {
+
+    var cache;
+    beforeEach(function() {
+        cache = new LruCache('test', {
+            maxEntries: 3
+          , maxBytes: 10
+          , sizeOf: function(value) { return value.length; }
+        });
+    });
+
+    it("evicts the least recently used", function() {
+        cache.set('a', '1');
+        cache.set('b', '2');
+        cache.set('c', '3');
+        cache.get('a').should.equal('1');
+        cache.set('d', '4');
+
+        should.not.exist(cache.get('b'));
+        cache.get('a').should.equal('1');
+        cache.stats().should.deep.equal({
+            entries: 3
+          , bytes: 3
+          , pinned: 0
+          , hits: 2
+          , misses: 1
+          , evictions: 1
+        });
+    });
+
+    it("evicts to stay under its byte budget", function() {
+        cache.set('a', '12345');
+        cache.set('b', '12345');
+        cache.set('c', '1');
+
+        should.not.exist(cache.peek('a'));
+        cache.bytes.should.equal(6);
+    });
+
+    it("never evicts pinned keys", function() {
+        cache.pin('a');
+        cache.set('a', '1234567890');
+        cache.set('b', '1234567890');
+        cache.set('c', '1');
+        cache.set('d', '2');
+
+        cache.peek('a').should.equal('1234567890');
+        should.not.exist(cache.peek('b'));
+
+        // unpinned, it's fair game
+        cache.unpin('a');
+        should.not.exist(cache.peek('a'));
+        cache.size.should.equal(2);
+    });
+
+    it("reports by name", function() {
+        var other = new LruCache('test');
+        cache.set('a', '1');
+        other.set('b', '2');
+
+        LruCache.report().should.have.property('test')
+            .with.property('entries').that.is.at.least(2);
+    });
+
+    it("reports with other processes'", function() {
+        cache.set('a', '1');
+        var entries = LruCache.report().test.entries;
+
+        var report = LruCache.report([{
+            test: {entries: 3, bytes: 0, pinned: 0, hits: 0, misses: 0, evictions: 0}
+          , other: {entries: 1, bytes: 0, pinned: 0, hits: 0, misses: 0, evictions: 0}
+        }]);
+        report.test.entries.should.equal(entries + 3);
+        report.other.entries.should.equal(1);
+    });
+});
@@ -0,0 +1,268 @@
+#!/usr/bin/env mocha
+
+var fs = require('fs')
+  , os = require('os')
+  , path = require('path')
+  , zlib = require('zlib')
+  , chai = require('chai')
+  , should = chai.should()
+  , ClassFile = require('../util/classfile')
+  , JarFile = require('../util/jar');
+
+/**
+ * Builds just enough of a .class file for
+ *  ClassFile to read
+ */
+function ClassBuilder(name, access) {
+    this._pool = [];
+    this._utf8 = {};
+    this._fields = [];
+    this._methods = [];
+
+    this._access = access || 0x0001;
+    this._name = this._class(name);
+    this._super = this._class('java/lang/Object');
+}
+
+ClassBuilder.prototype.field = function(access, name, descriptor, signature) {
+    this._fields.push(this._member(access, name, descriptor, signature));
+    return this;
+};
+
+ClassBuilder.prototype.method = function(access, name, descriptor, signature) {
+    this._methods.push(this._member(access, name, descriptor, signature));
+    return this;
+};
+
+ClassBuilder.prototype.build = function() {
+    var parts = [u4(0xcafebabe), u2(0), u2(51), u2(this._pool.length + 1)]
+        .concat(this._pool)
+        .concat([u2(this._access), u2(this._name), u2(this._super), u2(0)]);
+
+    [this._fields, this._methods].forEach(function(members) {
+        parts.push(u2(members.length));
+        parts.push.apply(parts, members);
+    });
+
+    parts.push(u2(0)); // class attributes
+    return Buffer.concat(parts);
+};
+
+ClassBuilder.prototype._member = function(access, name, descriptor, signature) {
+    var parts = [u2(access), u2(this._string(name)), u2(this._string(descriptor))];
+    if (signature) {
+        parts.push(u2(1), u2(this._string('Signature')), u4(2),
+            u2(this._string(signature)));
+    } else {
+        parts.push(u2(0));
+    }
+    return Buffer.concat(parts);
+};
+
+ClassBuilder.prototype._string = function(value) {
+    if (value in this._utf8)
+        return this._utf8[value];
+
+    var bytes = new Buffer(value);
+    this._pool.push(Buffer.concat([new Buffer([1]), u2(bytes.length), bytes]));
+    this._utf8[value] = this._pool.length;
+
+    // and a Long, to make sure we skip its extra slot
+    this._pool.push(Buffer.concat([new Buffer([5]), u4(0), u4(42)]));
+    this._pool.push(new Buffer(0));
+    return this._utf8[value];
+};
+
+ClassBuilder.prototype._class = function(name) {
+    var index = this._string(name);
+    this._pool.push(Buffer.concat([new Buffer([7]), u2(index)]));
+    return this._pool.length;
+};
+
+function u2(val) {
+    var buf = new Buffer(2);
+    buf.writeUInt16BE(val, 0);
+    return buf;
+}
+
+function u4(val) {
+    var buf = new Buffer(4);
+    buf.writeUInt32BE(val, 0);
+    return buf;
+}
+
+/** Write a zip with one stored and one deflated entry */
+function writeJar(jarPath, entries, callback) {
+    var names = Object.keys(entries);
+    var locals = [];
+    var centrals = [];
+    var offset = 0;
+
+    (function next(i) {
+        if (i >= names.length) {
+            var dir = Buffer.concat(centrals);
+            var eocd = new Buffer(22);
+            eocd.fill(0);
+            eocd.writeUInt32LE(0x06054b50, 0);
+            eocd.writeUInt16LE(names.length, 8);
+            eocd.writeUInt16LE(names.length, 10);
+            eocd.writeUInt32LE(dir.length, 12);
+            eocd.writeUInt32LE(offset, 16);
+            return fs.writeFile(jarPath,
+                Buffer.concat(locals.concat([dir, eocd])), callback);
+        }
+
+        var name = new Buffer(names[i]);
+        var data = entries[names[i]];
+        var method = i % 2 ? 8 : 0;
+        var compress = method
+            ? zlib.deflateRaw.bind(zlib, data)
+            : function(cb) { cb(null, data); };
+
+        compress(function(err, compressed) {
+            if (err) return callback(err);
+
+            var local = new Buffer(30);
+            local.fill(0);
+            local.writeUInt32LE(0x04034b50, 0);
+            local.writeUInt16LE(method, 8);
+            local.writeUInt32LE(compressed.length, 18);
+            local.writeUInt32LE(data.length, 22);
+            local.writeUInt16LE(name.length, 26);
+
+            var central = new Buffer(46);
+            central.fill(0);
+            central.writeUInt32LE(0x02014b50, 0);
+            central.writeUInt16LE(method, 10);
+            central.writeUInt32LE(compressed.length, 20);
+            central.writeUInt32LE(data.length, 24);
+            central.writeUInt16LE(name.length, 28);
+            central.writeUInt32LE(offset, 42);
+
+            locals.push(local, name, compressed);
+            centrals.push(central, name);
+            offset += local.length + name.length + compressed.length;
+            next(i + 1);
+        });
+    })(0);
+}
+
+describe("ClassFile", function() {
+
+    var projected;
+    before(function() {
+        var buf = new ClassBuilder('net/dhleong/njast/Built')
+            .field(0x0001, 'count', 'I')
+            .field(0x0019, 'NAMES', '[Ljava/lang/String;')
+            .field(0x0001, 'items', 'Ljava/util/List;',
+                'Ljava/util/List<Ljava/lang/String;>;')
+            .field(0x0002, 'secret', 'I')
+            .method(0x0001, '<init>', '()V')
+            .method(0x0009, 'of', '(Ljava/lang/Object;)Lnet/dhleong/njast/Built;',
+                '<T:Ljava/lang/Object;>(TT;)Lnet/dhleong/njast/Built;')
+            .method(0x0081, 'format', '(Ljava/lang/String;[Ljava/lang/Object;)[C')
+            .method(0x0001, 'entry', '()Ljava/util/Map$Entry;',
+                '()Ljava/util/Map$Entry<Ljava/lang/String;+Ljava/lang/Number;>;')
+            .method(0x1041, 'bridged', '()Ljava/lang/Object;')
+            .method(0x0004, 'hidden', '()V')
+            .build();
+
+        projected = new ClassFile(buf).project();
+    });
+
+    it("reads the class name", function() {
+        projected.qualifiedName.should.equal('net.dhleong.njast.Built');
+    });
+
+    it("projects public fields", function() {
+        projected.fields.map(function(field) {
+            return field.type + ' ' + field.name;
+        }).should.deep.equal([
+            'int count'
+          , 'java.lang.String[] NAMES'
+          , 'java.util.List items'
+        ]);
+
+        projected.fields[1].mods.should.equal('public static final');
+    });
+
+    it("projects public methods", function() {
+        projected.methods.map(function(method) {
+            return method.name;
+        }).should.deep.equal(['of', 'format', 'entry']);
+
+        var of = projected.methods[0];
+        of.qualified.should.equal('net.dhleong.njast.Built#of');
+        of.mods.should.equal('public static');
+        of.returns.should.equal('net.dhleong.njast.Built');
+        of.params.should.deep.equal([{name: 'arg0', type: 'T'}]);
+    });
+
+    it("handles varargs and arrays like javap", function() {
+        var format = projected.methods[1];
+        format.returns.should.equal('char');
+        format.params.map(function(param) {
+            return param.type;
+        }).should.deep.equal(['java.lang.String', 'java.lang.Object']);
+    });
+
+    it("erases type arguments", function() {
+        projected.methods[2].returns.should.equal('java.util.Map$Entry');
+    });
+
+    it("rejects other files", function() {
+        (function() {
+            new ClassFile(new Buffer('PK\u0003\u0004'));
+        }).should.throw(/Not a class file/);
+    });
+});
+
+describe("JarFile", function() {
+
+    var jarPath = path.join(os.tmpdir(), 'njast-test-' + process.pid + '.jar');
+    var classBuf = new ClassBuilder('net/dhleong/Zipped').build();
+    var jar;
+
+    before(function(done) {
+        writeJar(jarPath, {
+            'META-INF/MANIFEST.MF': new Buffer('Manifest-Version: 1.0\n')
+          , 'net/dhleong/Zipped.class': classBuf
+        }, function(err) {
+            if (err) return done(err);
+
+            jar = new JarFile(jarPath);
+            done();
+        });
+    });
+
+    after(function(done) {
+        fs.unlink(jarPath, done);
+    });
+
+    it("lists entries", function(done) {
+        jar.entries(function(err, entries) {
+            should.not.exist(err);
+            Object.keys(entries).should.deep.equal([
+                'META-INF/MANIFEST.MF'
+              , 'net/dhleong/Zipped.class'
+            ]);
+            done();
+        });
+    });
+
+    it("reads stored entries", function(done) {
+        jar.read('META-INF/MANIFEST.MF', function(err, buf) {
+            should.not.exist(err);
+            buf.toString().should.equal('Manifest-Version: 1.0\n');
+            done();
+        });
+    });
+
+    it("inflates deflated entries", function(done) {
+        jar.read('net/dhleong/Zipped.class', function(err, buf) {
+            should.not.exist(err);
+            new ClassFile(buf).name.should.equal('net.dhleong.Zipped');
+            done();
+        });
+    });
+});
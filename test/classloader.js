@@ -10,7 +10,8 @@ var ClassLoader = require('../classloader')
  * Trim the size of the stacktrace for easier viewing as we debug */
 /* jshint ignore:start 
  */
-console.oldError = console.error;
+if (!console.oldError) // another test file may have wrapped it already
+    console.oldError = console.error;
 console.aerror = function () {
     if (typeof arguments.stack !== 'undefined') {
         console.oldError.call(console, arguments.stack);
@@ -114,6 +115,38 @@ describe("ClassLoader", function() {
 
         });
     });
+
+    it("remembers misses until putCache", function(done) {
+        var missing = 'net.dhleong.njast.DoesNotExist';
+        loader.openClass(missing, function(err) {
+            should.exist(err);
+            loader._misses.has(missing).should.be.true;
+
+            loader.openAst('Foo.java', function(err, ast) {
+                should.not.exist(err);
+
+                loader.putCache('Foo.java', ast);
+                loader._misses.has(missing).should.be.false;
+                done();
+            });
+        });
+    });
+
+    it("versions types by putCache", function(done) {
+        var foo = 'net.dhleong.njast.Foo';
+        var boring = 'net.dhleong.njast.Boring';
+        var fooVersion = loader.typeVersion(foo);
+        var boringVersion = loader.typeVersion(boring);
+
+        loader.openAst('Foo.java', function(err, ast) {
+            should.not.exist(err);
+
+            loader.putCache('Foo.java', ast);
+            loader.typeVersion(foo).should.not.equal(fooVersion);
+            loader.typeVersion(boring).should.equal(boringVersion);
+            done();
+        });
+    });
 });
 
 describe("SourceClassLoader", function() {
@@ -123,13 +156,16 @@ describe("SourceClassLoader", function() {
         sourceLoader.walkTypes(function() {}, function(err) {
             should.not.exist(err);
 
-            should.exist(sourceLoader._fileToTypes);
+            should.exist(sourceLoader._types);
 
-            var foo = sourceLoader._fileToTypes['Foo.java'];
-            should.exist(foo);
+            var foo = sourceLoader._types.fileTypes('Foo.java');
             foo.should.contain('net.dhleong.njast.Foo$Fancy$Fancier');
-            sourceLoader._allCachedTypes
-                .should.contain('net.dhleong.njast.Foo$Fancy$Fancier');
+            sourceLoader._types.has('net.dhleong.njast.Foo$Fancy$Fancier')
+                .should.be.true;
+
+            var progress = sourceLoader.getIndexProgress();
+            progress.indexing.should.be.false;
+            progress.indexed.should.equal(progress.found);
 
             done();
         });
@@ -137,7 +173,7 @@ describe("SourceClassLoader", function() {
 
     it("updates cached types on put", function() {
         var sourceLoader = loader._loaders[0];
-        should.exist(sourceLoader._fileToTypes);
+        should.exist(sourceLoader._types);
 
         // delete all but main class, and and something new
         sourceLoader.putCache('Foo.java', {
@@ -147,19 +183,18 @@ describe("SourceClassLoader", function() {
             }
         });
 
-        var foo = sourceLoader._fileToTypes['Foo.java'];
-        should.exist(foo)
+        var foo = sourceLoader._types.fileTypes('Foo.java');
         foo.should.not.contain('net.dhleong.njast.Foo$Fancy');
         foo.should.not.contain('net.dhleong.njast.Foo$Fancy$Fancier');
         foo.should.contain('net.dhleong.njast.Foo');
         foo.should.contain('net.dhleong.njast.Foo$Unexpected');
 
-        sourceLoader._allCachedTypes
-            .should.not.contain('net.dhleong.njast.Foo$Fancy');
-        sourceLoader._allCachedTypes
-            .should.not.contain('net.dhleong.njast.Foo$Fancy$Fancier');
-        sourceLoader._allCachedTypes
-            .should.contain('net.dhleong.njast.Foo$Unexpected');
+        var types = sourceLoader._types;
+        types.has('net.dhleong.njast.Foo$Fancy').should.be.false;
+        types.has('net.dhleong.njast.Foo$Fancy$Fancier').should.be.false;
+        types.has('net.dhleong.njast.Foo$Unexpected').should.be.true;
+        types.suggest('Unexpected')
+            .should.deep.equal(['net.dhleong.njast.Foo$Unexpected']);
 
     });
 });
@@ -206,6 +241,27 @@ describe("JarClassLoader", function() {
             .that.equals('JarClassLoader');
     });
 
+    it("knows its packages", function(done) {
+        jloader.getTypes(function() {
+            jloader.hasPackage('java.util').should.be.true;
+            jloader.hasPackage('net.dhleong.njast').should.be.false;
+            done();
+        });
+    });
+
+    it("suggests only top-level imports", function(done) {
+        jloader.suggestImport('HashMap', function(err, types) {
+            should.not.exist(err);
+            types.should.contain('java.util.HashMap');
+
+            jloader.suggestImport('Entry', function(err, types) {
+                should.not.exist(err);
+                types.should.not.contain('java.util.Map$Entry');
+                done();
+            });
+        });
+    });
+
     it("finds HashMap", function(done) {
         jloader.openClass("java.util.HashMap", function(err) {
             should.not.exist(err);
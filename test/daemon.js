@@ -0,0 +1,65 @@
+#!/usr/bin/env mocha
+
+var fs = require('fs')
+  , os = require('os')
+  , path = require('path')
+  , should = require('chai').should()
+  , Daemon = require('../util/daemon');
+
+describe("Daemon", function() {
+
+    var dir = path.join(os.tmpdir(), 'njast-test-' + process.pid);
+    var lockfile = path.join(dir, 'daemon.json');
+
+    before(function() {
+        if (!fs.existsSync(dir))
+            fs.mkdirSync(dir);
+    });
+
+    afterEach(function() {
+        if (fs.existsSync(lockfile))
+            fs.unlinkSync(lockfile);
+    });
+
+    after(function() {
+        if (fs.existsSync(lockfile))
+            fs.unlinkSync(lockfile);
+        fs.rmdirSync(dir);
+    });
+
+    it("locks once", function() {
+        var daemon = new Daemon(dir);
+        should.not.exist(daemon.lock(1234));
+
+        // we're still running, so the next one loses
+        var owner = new Daemon(dir).lock(5678);
+        owner.port.should.equal(1234);
+        owner.pid.should.equal(process.pid);
+
+        daemon.unlock();
+        fs.existsSync(lockfile).should.be.false;
+    });
+
+    it("replaces stale locks", function() {
+        // nobody has this pid
+        fs.writeFileSync(lockfile, JSON.stringify({pid: 4194304 * 2, port: 1}));
+
+        var daemon = new Daemon(dir);
+        should.not.exist(daemon.lock(1234));
+        daemon.owner().port.should.equal(1234);
+    });
+
+    it("goes idle without requests", function(done) {
+        var daemon = new Daemon(dir, {idleTimeout: 20});
+        var touched = Date.now();
+        daemon.onIdle(function() {
+            (Date.now() - touched).should.be.at.least(15);
+            done();
+        });
+
+        setTimeout(function() {
+            touched = Date.now();
+            daemon.touch();
+        }, 10);
+    });
+});
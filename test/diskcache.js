@@ -0,0 +1,61 @@
+#!/usr/bin/env mocha
+
+var fs = require('fs')
+  , os = require('os')
+  , path = require('path')
+  , should = require('chai').should()
+  , JarIndex = require('../util/diskcache')
+
+  , JAR = '/path/to/some.jar';
+
+describe("JarIndex", function() {
+
+    var dir = path.join(os.tmpdir(), 'njast-index-' + process.pid);
+    var stat = {mtime: new Date(1400000000000), size: 1234};
+
+    var index;
+    beforeEach(function(done) {
+        index = new JarIndex(JAR, dir);
+        index.create(stat, ['java.util.List', 'java.util.Map$Entry'], done);
+    });
+
+    after(function(done) {
+        fs.unlink(index.path, function() {
+            fs.rmdir(dir, function() {
+                done();
+            });
+        });
+    });
+
+    it("loads the types and projections", function(done) {
+        index.put({qualifiedName: 'java.util.List', methods: [], fields: []},
+                function(err) {
+            should.not.exist(err);
+
+            var loaded = new JarIndex(JAR, dir);
+            loaded.load(stat, function(types) {
+                types.should.deep.equal(['java.util.List', 'java.util.Map$Entry']);
+                loaded.get('java.util.List')
+                    .should.have.property('methods')
+                    .that.deep.equals([]);
+                should.not.exist(loaded.get('java.util.Map$Entry'));
+                done();
+            });
+        });
+    });
+
+    it("is invalidated when the jar changes", function(done) {
+        var loaded = new JarIndex(JAR, dir);
+        loaded.load({mtime: stat.mtime, size: 4321}, function(types) {
+            should.not.exist(types);
+
+            // and won't be appended to
+            loaded.put({qualifiedName: 'java.util.List'}, function() {
+                fs.readFile(index.path, 'utf8', function(err, contents) {
+                    contents.split('\n').length.should.equal(3);
+                    done();
+                });
+            });
+        });
+    });
+});
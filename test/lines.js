@@ -0,0 +1,41 @@
+#!/usr/bin/env mocha
+
+var should = require('chai').should()
+  , LineIndex = require('../util/lines');
+
+describe("LineIndex", function() {
+
+    var buf = new Buffer('first\nsecond\r\nthird\rfourth');
+    var lines;
+    beforeEach(function() {
+        lines = new LineIndex(buf);
+    });
+
+    it("handles every line ending", function() {
+        lines.length.should.equal(4);
+        lines.getLine(1).should.equal('first');
+        lines.getLine(2).should.equal('second');
+        lines.getLine(3).should.equal('third');
+        lines.getLine(4).should.equal('fourth');
+        should.not.exist(lines.getLine(5));
+    });
+
+    it("maps offsets to lines", function() {
+        lines.lineAt(0).should.equal(1);
+        lines.lineAt(5).should.equal(1); // the \n
+        lines.lineAt(6).should.equal(2);
+        lines.lineAt(13).should.equal(2); // the \n of \r\n
+        lines.lineAt(14).should.equal(3);
+        lines.lineAt(buf.length).should.equal(4);
+    });
+
+    it("maps lines to offsets", function() {
+        lines.offsetOf(2, 1).should.equal(6);
+        lines.offsetOf(3, 3).should.equal(16);
+        lines.offsetOf(5, 1).should.equal(-1);
+    });
+
+    it("is shared per buffer", function() {
+        LineIndex.of(buf).should.equal(LineIndex.of(buf));
+    });
+});
@@ -0,0 +1,50 @@
+#!/usr/bin/env mocha
+
+var should = require('chai').should()
+  , Matcher = require('../util/matcher');
+
+describe("Matcher", function() {
+
+    it("matches prefixes", function() {
+        Matcher.match('getF', 'getFoo').should.equal(Matcher.PREFIX);
+        Matcher.match('', 'getFoo').should.equal(Matcher.PREFIX);
+        Matcher.match('getf', 'getFoo').should.equal(Matcher.PREFIX_IGNORE_CASE);
+    });
+
+    it("matches camel case humps", function() {
+        Matcher.match('gFB', 'getFooBar').should.equal(Matcher.CAMEL_CASE);
+        Matcher.match('getFB', 'getFooBar').should.equal(Matcher.CAMEL_CASE);
+        Matcher.match('gfoob', 'getFooBar').should.equal(Matcher.CAMEL_CASE);
+        Matcher.match('MV', 'MAX_VALUE').should.equal(Matcher.CAMEL_CASE);
+    });
+
+    it("matches fuzzily", function() {
+        Matcher.match('gtbar', 'getFooBar').should.equal(Matcher.FUZZY);
+        Matcher.match('xyz', 'getFooBar').should.equal(-1);
+        Matcher.match('bg', 'getFooBar').should.equal(-1);
+    });
+
+    it("ranks", function() {
+        var names = ['getFooBar', 'toString', 'getFoo', 'GET',
+            'setFooBar', 'get', 'gotFb'];
+
+        Matcher.rank(names, 'get').should.deep.equal(
+            ['get', 'getFoo', 'getFooBar', 'GET']);
+
+        // shorter first, within a kind
+        Matcher.rank(names, 'gFB').should.deep.equal(
+            ['gotFb', 'getFooBar']);
+
+        // nothing typed is alphabetical
+        Matcher.rank(names, '').should.deep.equal(
+            ['GET', 'get', 'getFoo', 'getFooBar', 'gotFb',
+             'setFooBar', 'toString']);
+    });
+
+    it("ranks items by name", function() {
+        var items = [{name: 'foo', i: 0}, {name: 'bar'}, {name: 'foo', i: 1}];
+        Matcher.rank(items, 'f', function(item) {
+            return item.name;
+        }).should.deep.equal([items[0], items[2]]);
+    });
+});
@@ -0,0 +1,32 @@
+#!/usr/bin/env mocha
+
+var should = require('chai').should()
+  , NameIndex = require('../util/nameindex');
+
+describe("NameIndex", function() {
+
+    var index;
+    beforeEach(function() {
+        index = new NameIndex([
+            'java.util.List'
+          , 'java.awt.List'
+          , 'net.dhleong.njast.Foo$Fancy'
+          , 'net.dhleong.njast.BarList'
+        ]);
+    });
+
+    it("finds by simple name", function() {
+        index.get('List').should.deep.equal(['java.util.List', 'java.awt.List']);
+        index.get('Fancy').should.deep.equal(['net.dhleong.njast.Foo$Fancy']);
+        index.get('constructor').should.be.empty;
+    });
+
+    it("updates", function() {
+        index.remove('java.awt.List');
+        index.add('java.util.List'); // no dups
+        index.get('List').should.deep.equal(['java.util.List']);
+
+        index.remove('net.dhleong.njast.Foo$Fancy');
+        index.get('Fancy').should.be.empty;
+    });
+});
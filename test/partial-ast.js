@@ -11,7 +11,8 @@ var Ast = require('../ast')
  * Trim the size of the stacktrace for easier viewing as we debug */
 /* jshint ignore:start 
  */
-console.oldError = console.error;
+if (!console.oldError) // another test file may have wrapped it already
+    console.oldError = console.error;
 console.aerror = function () {
     if (typeof arguments.stack !== 'undefined') {
         console.oldError.call(console, arguments.stack);
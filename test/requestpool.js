@@ -0,0 +1,174 @@
+#!/usr/bin/env mocha
+
+var fs = require('fs')
+  , os = require('os')
+  , path = require('path')
+  , should = require('chai').should()
+  , ClassLoader = require('../classloader')
+  , RequestPool = require('../util/requestpool')
+  , Stats = require('../util/stats')
+  , stats = require('../controllers/stats');
+
+describe("RequestPool", function() {
+
+    // a little project of our own, so we can change it
+    var dir = path.join(os.tmpdir(), 'njast-pool-' + process.pid);
+    var pkg = path.join(dir, 'src', 'pool');
+    var a = path.join(pkg, 'A.java');
+    var b = path.join(pkg, 'B.java');
+
+    // for /update to suggest an import of
+    var things = path.join(pkg, 'things');
+    var thing = path.join(things, 'Thing.java');
+    var c = path.join(pkg, 'C.java');
+    var d = path.join(pkg, 'D.java');
+
+    var A_SOURCE = [
+        'package pool;'
+      , 'class A {'
+      , '    B other;'
+      , '    void a() {'
+      , '        other.'
+      , '    }'
+      , '}'
+    ].join('\n');
+
+    function writeB(methods) {
+        fs.writeFileSync(b, 'package pool;\nclass B {\n'
+            + methods.map(function(name) {
+                return '    void ' + name + '() {}\n';
+            }).join('')
+            + '}\n');
+    }
+
+    var pool;
+    before(function() {
+        [dir, path.dirname(pkg), pkg, things].forEach(function(dir) {
+            if (!fs.existsSync(dir))
+                fs.mkdirSync(dir);
+        });
+        fs.writeFileSync(a, A_SOURCE);
+        fs.writeFileSync(thing, 'package pool.things;\npublic class Thing {}\n');
+        [c, d].forEach(function(file) {
+            var name = path.basename(file, '.java');
+            fs.writeFileSync(file, 'package pool;\nclass ' + name
+                + ' {\n    Thing thing;\n}\n');
+        });
+    });
+
+    beforeEach(function() {
+        writeB(['one']);
+        pool = new RequestPool(2);
+    });
+
+    afterEach(function() {
+        pool.close();
+    });
+
+    after(function() {
+        [a, b, c, d, thing].forEach(function(file) {
+            fs.unlinkSync(file);
+        });
+        [things, pkg, path.dirname(pkg), dir].forEach(function(dir) {
+            fs.rmdirSync(dir);
+        });
+    });
+
+    function request(endpoint, body, callback) {
+        var reply = function(status, body) {
+            callback(status, body);
+        };
+        pool.handle(endpoint, {
+            body: body
+          , timer: new Stats.RequestTimer(endpoint)
+        }, {send: reply, json: reply});
+    }
+
+    function suggest(callback) {
+        request('/suggest', {
+            path: a
+          , pos: [5, 15]
+          , buffer: A_SOURCE
+        }, function(status, body) {
+            status.should.equal(200);
+            callback(body);
+        });
+    }
+
+    function names(suggestion) {
+        return suggestion.results.methods.map(function(method) {
+            return method.name;
+        });
+    }
+
+    it("merges the workers' stats", function(done) {
+        this.timeout(10000);
+        Stats.reset();
+
+        suggest(function() {
+            stats({body: {}, pool: pool}, {
+                json: function(report) {
+                    report.histograms.should.have.property('classloader.openClass');
+                    report.caches.should.have.property('projections')
+                        .with.property('entries').that.is.above(0);
+
+                    // we'd record the request itself, not the worker
+                    report.histograms.should.not.have.property('/suggest');
+                    done();
+                }
+            });
+        });
+    });
+
+    it("indexes each project once for every worker", function(done) {
+        this.timeout(10000);
+
+        var indexSources = ClassLoader.indexSources;
+        var walks = 0;
+        ClassLoader.indexSources = function() {
+            walks++;
+            return indexSources.apply(this, arguments);
+        };
+
+        // C and D get a worker each, and both need the index
+        //  to suggest importing Thing
+        var pending = 2;
+        [c, d].forEach(function(file) {
+            request('/update', {path: file}, function(status, update) {
+                status.should.equal(200);
+                update.missing.should.have.length(1);
+                update.missing[0].imports.should.deep.equal(['pool.things.Thing']);
+                if (--pending)
+                    return;
+
+                ClassLoader.indexSources = indexSources;
+                pool._pool._workers.length.should.equal(2);
+                walks.should.equal(1);
+                done();
+            });
+        });
+    });
+
+    it("keeps every worker's types current", function(done) {
+        this.timeout(10000);
+
+        suggest(function(before) {
+            names(before).should.deep.equal(['one']);
+
+            // B gets the other worker, which sees it change
+            writeB(['one', 'two']);
+            request('/update', {path: b}, function(status, update) {
+                status.should.equal(200);
+                update.types.should.contain('pool.B');
+                pool._pool._workers.length.should.equal(2);
+
+                // and A's worker should know it
+                suggest(function(after) {
+                    names(after).should.deep.equal(['one', 'two']);
+                    after.version.should.not.equal(before.version);
+                    done();
+                });
+            });
+        });
+    });
+});
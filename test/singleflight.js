@@ -0,0 +1,55 @@
+#!/usr/bin/env mocha
+
+var should = require('chai').should()
+  , SingleFlight = require('../util/singleflight');
+
+describe("SingleFlight", function() {
+
+    var flights;
+    beforeEach(function() {
+        flights = new SingleFlight();
+    });
+
+    it("shares concurrent work for a key", function(done) {
+        var calls = 0;
+        var results = [];
+        function work(cb) {
+            calls++;
+            setTimeout(function() {
+                cb(null, 42);
+            }, 1);
+        }
+
+        function onResult(err, result) {
+            should.not.exist(err);
+            results.push(result);
+            if (results.length < 2)
+                return;
+
+            calls.should.equal(1);
+            results.should.deep.equal([42, 42]);
+            flights.has('key').should.be.false;
+            done();
+        }
+
+        flights.run('key', work, onResult);
+        flights.run('key', work, onResult);
+        flights.has('key').should.be.true;
+    });
+
+    it("runs again once done", function(done) {
+        var calls = 0;
+        function work(cb) {
+            calls++;
+            cb(new Error("Oops"));
+        }
+
+        flights.run('key', work, function(err) {
+            should.exist(err);
+            flights.run('key', work, function() {
+                calls.should.equal(2);
+                done();
+            });
+        });
+    });
+});
@@ -0,0 +1,102 @@
+#!/usr/bin/env mocha
+
+var should = require('chai').should()
+  , Stats = require('../util/stats');
+
+describe("Histogram", function() {
+
+    it("summarizes", function() {
+        var histogram = new Stats.Histogram();
+        [1, 3, 4, 8, 40, 9000].forEach(histogram.add, histogram);
+
+        var summary = histogram.toJSON();
+        summary.count.should.equal(6);
+        summary.max.should.equal(9000);
+        summary.p50.should.equal(5);
+        summary.p99.should.equal(9000);
+        summary.buckets.should.deep.equal({
+            '<=1': 1
+          , '<=5': 2
+          , '<=10': 1
+          , '<=50': 1
+          , '>5000': 1
+        });
+    });
+
+    it("handles empty", function() {
+        var summary = new Stats.Histogram().toJSON();
+        summary.count.should.equal(0);
+        summary.mean.should.equal(0);
+    });
+
+    it("merges", function() {
+        var histogram = new Stats.Histogram();
+        var other = new Stats.Histogram();
+        [1, 4].forEach(histogram.add, histogram);
+        [3, 9000].forEach(other.add, other);
+        histogram.merge(other);
+
+        var summary = histogram.toJSON();
+        summary.count.should.equal(4);
+        summary.max.should.equal(9000);
+        summary.buckets.should.deep.equal({
+            '<=1': 1
+          , '<=5': 2
+          , '>5000': 1
+        });
+    });
+});
+
+describe("RequestTimer", function() {
+
+    beforeEach(function() {
+        Stats.reset();
+    });
+
+    it("records phases under the endpoint", function(done) {
+        var timer = new Stats.RequestTimer('/suggest');
+        var stop = timer.start('parse');
+        stop();
+
+        setTimeout(timer.wrap('locate', function(arg) {
+            arg.should.equal(42);
+
+            timer.finish();
+            timer.finish(); // only once
+
+            var report = Stats.report();
+            Object.keys(report.histograms).should.deep.equal(
+                ['/suggest', '/suggest locate', '/suggest parse']);
+            report.histograms['/suggest'].count.should.equal(1);
+            report.histograms['/suggest locate'].max.should.be.above(0);
+
+            report.recent.should.have.length(1);
+            report.recent[0].endpoint.should.equal('/suggest');
+            Object.keys(report.recent[0].phases)
+                .should.deep.equal(['parse', 'locate']);
+            done();
+        }), 2, 42);
+    });
+
+    it("times things outside requests", function() {
+        Stats.time('jar.readClass')();
+        Stats.report().histograms['jar.readClass'].count.should.equal(1);
+    });
+
+    it("merges snapshots from other processes", function() {
+        Stats.record('jar.readClass', 1);
+        var snapshot = JSON.parse(JSON.stringify(Stats.snapshot()));
+
+        Stats.reset();
+        Stats.record('jar.readClass', 3);
+        Stats.record('/suggest', 10);
+
+        var histograms = Stats.report([snapshot]).histograms;
+        histograms['jar.readClass'].count.should.equal(2);
+        histograms['jar.readClass'].max.should.equal(3);
+        histograms['/suggest'].count.should.equal(1);
+
+        // without them, just ours
+        Stats.report().histograms['jar.readClass'].count.should.equal(1);
+    });
+});
@@ -197,3 +197,67 @@ describe("Suggestions in Foo.java at", function() {
     });
 });
 
+
+describe("Paged suggestions in Foo.java at", function() {
+    it("14, 23: field1.", function(done) {
+        Suggestor.of(PATH, buf)
+        .at(14, 23)
+        .page(0, 2)
+        .find(function(err, page) {
+            should.not.exist(err);
+
+            // doFancier, buz, bla, breaks, failMethod, method
+            page.total.should.equal(6);
+            page.next.should.equal(2);
+            page.prefix.should.equal('');
+            page.methods.map(function(method) {
+                return method.name + ':' + method.rank;
+            }).should.deep.equal(['bla:0', 'breaks:1']);
+            page.methods.map(function(method) {
+                return method.id;
+            }).should.deep.equal(['m2', 'm3']);
+
+            // declared in the buffer; no caching it
+            should.not.exist(page.version);
+
+            done();
+        });
+    });
+
+    it("of a type declared in the buffer", function(done) {
+        // unsaved, so only the buffer has it
+        var edited = new Buffer(buf.toString().replace('void bla()', 'void blah()'));
+        Suggestor.of(PATH, edited)
+        .at(14, 23)
+        .ofType('net.dhleong.njast.Foo$Fancy$Fancier')
+        .matching('bla')
+        .page(0, 2)
+        .find(function(err, page) {
+            should.not.exist(err);
+
+            page.methods.map(function(method) {
+                return method.name;
+            }).should.deep.equal(['blah']);
+            should.not.exist(page.version);
+
+            done();
+        });
+    });
+
+    it("14, 23: field1.bz", function(done) {
+        Suggestor.of(PATH, buf)
+        .at(14, 23)
+        .matching('bz')
+        .page(0, 2)
+        .find(function(err, page) {
+            should.not.exist(err);
+
+            page.total.should.equal(1);
+            should.not.exist(page.next);
+            page.methods.should.have.length(1);
+            page.methods[0].name.should.equal('buz');
+
+            done();
+        });
+    });
+});
@@ -174,3 +174,35 @@ describe("readPostfixOp", function() {
         should.not.exist(tokify('+=').readPostfixOp());
     });
 });
+
+describe("skipBlock", function() {
+
+    function skipped(string) {
+        var tok = tokify(string);
+        tok.expectBlockOpen();
+        tok.skipBlock().should.be.true;
+        return tok;
+    }
+
+    it("matches nested braces", function() {
+        skipped('{ if (a) { b(); } }; next').readSemicolon().should.be.true;
+    });
+
+    it("ignores braces in strings and comments", function() {
+        skipped('{ a("}\\"}", \'}\'); // }\n /* } */ }x')
+            .readIdentifier().should.equal('x');
+    });
+
+    it("counts lines", function() {
+        var tok = skipped('{\n  "a";\n  /*\n */\n}  x');
+        tok.getPos().should.deep.equal({line: 5, ch: 2});
+        tok.readIdentifier().should.equal('x');
+        tok.getPos().line.should.equal(5);
+    });
+
+    it("reports running out of input", function() {
+        var tok = tokify('{ {}');
+        tok.expectBlockOpen();
+        tok.skipBlock().should.be.false;
+    });
+});
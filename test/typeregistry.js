@@ -0,0 +1,40 @@
+#!/usr/bin/env mocha
+
+var should = require('chai').should()
+  , TypeRegistry = require('../util/typeregistry');
+
+describe("TypeRegistry", function() {
+
+    var types;
+    beforeEach(function() {
+        types = new TypeRegistry();
+        types.setFileTypes('Foo.java', ['pkg.Foo', 'pkg.Foo$Inner']);
+        types.setFileTypes('Bar.java', ['pkg.Bar']);
+    });
+
+    it("registers types by file", function() {
+        types.size.should.equal(3);
+        types.has('pkg.Foo$Inner').should.be.true;
+        types.fileOf('pkg.Bar').should.equal('Bar.java');
+        types.fileTypes('Foo.java').should.deep.equal(['pkg.Foo', 'pkg.Foo$Inner']);
+        types.suggest('Inner').should.deep.equal(['pkg.Foo$Inner']);
+    });
+
+    it("updates a file's types", function() {
+        types.setFileTypes('Foo.java', ['pkg.Foo', 'pkg.Foo$Other']);
+
+        types.size.should.equal(3);
+        types.has('pkg.Foo$Inner').should.be.false;
+        types.suggest('Inner').should.be.empty;
+        types.suggest('Other').should.deep.equal(['pkg.Foo$Other']);
+        types.types().should.deep.equal(['pkg.Foo', 'pkg.Bar', 'pkg.Foo$Other']);
+    });
+
+    it("handles types moving between files", function() {
+        types.setFileTypes('Baz.java', ['pkg.Bar']);
+        types.setFileTypes('Bar.java', []);
+
+        types.size.should.equal(3);
+        types.fileOf('pkg.Bar').should.equal('Baz.java');
+    });
+});
@@ -0,0 +1,25 @@
+/**
+ * WorkerPool module for tests. Replies with its pid
+ *  and the job, after `job.delay` ms (if any)
+ *
+ * Job: {delay: 10, env: 'NAME', ...}
+ * Result: {pid: 1234, job: {...}, env: <$NAME>}
+ *
+ * Messages that aren't jobs are sent back the same way
+ */
+
+process.on('message', function(message) {
+    if (message.id === undefined)
+        return process.send({job: {pid: process.pid, told: message.job}});
+
+    setTimeout(function() {
+        process.send({
+            id: message.id
+          , result: {
+                pid: process.pid
+              , job: message.job
+              , env: process.env[message.job.env]
+            }
+        });
+    }, message.job.delay || 0);
+});
@@ -0,0 +1,411 @@
+#!/usr/bin/env node
+/**
+ * Parser throughput benchmark. Measures files/sec, MB/sec,
+ *  peak heap and the worst files for each way we parse:
+ *
+ *  - tokenize: just the Tokenizer, reading every token
+ *  - full: Ast.parseFile of the whole file
+ *  - declarations: parseFile with declarationsOnly
+ *  - lazy: parseFile with lazyBodies
+ *  - partial: parseFile of a `type: 'part'` buffer holding the
+ *      methods of the file's main type, on top of its cached Ast
+ *  - classfile: decoding .class files from a jar (what replaced
+ *      javap); only run if there's a jar to read
+ *
+ * The corpus is read into memory before anything is timed.
+ *  By default it's synthetic, generated from the sources in
+ *  test/ so it works offline; otherwise, use:
+ *
+ *      --android       $ANDROID_HOME/sources/android-19
+ *      --dir <path>    Every .java file under the path
+ *      --jar <path>    Jar for the classfile mode (default:
+ *                      $JAVA_HOME/jre/lib/rt.jar, if it exists)
+ *      --copies <n>    Copies of each synthetic source (default: 100)
+ *      --classes <n>   Max classes to decode (default: 2000)
+ *      --only <mode>   Run just that mode (may be repeated)
+ *      --out <file>    Write the results there instead of stdout
+ *      --baseline <file>  Compare to earlier results (on stderr)
+ *
+ * Results are JSON, so they can be kept and compared across
+ *  commits. Run node with --expose-gc for steadier heap numbers.
+ */
+
+var fs = require('fs')
+  , path = require('path')
+  , glob = require('glob')
+  , async = require('async')
+  , exec = require('child_process').exec
+
+  , Ast = require('../../ast')
+  , Tokenizer = require('../../tokenizer')
+  , ClassFile = require('../../util/classfile')
+  , JarFile = require('../../util/jar');
+
+var MODES = ['tokenize', 'full', 'declarations', 'lazy', 'partial', 'classfile']
+
+  // sources the synthetic corpus is generated from
+  , SYNTHETIC_SOURCES = ['FullAst.java', 'Foo.java', 'Boring.java']
+
+  // how many of the slowest files we report per mode
+  , WORST_COUNT = 5;
+
+/*
+ * Benchmarks
+ */
+
+var BENCHMARKS = {
+    tokenize: function(corpus, callback) {
+        measure(corpus.files, function(file, cb) {
+            var tok = new Tokenizer(file.path, file.buf);
+            while (!tok.isEof()) {
+                if (!tok.readIdentifier()) {
+                    tok.prepare();
+                    tok.read();
+                }
+            }
+            tok.getJavadoc(); // don't let them pile up
+            cb();
+        }, callback);
+    },
+
+    full: parseWith({strict: false}),
+    declarations: parseWith({strict: false, declarationsOnly: true}),
+    lazy: parseWith({strict: false, lazyBodies: true}),
+
+    partial: function(corpus, callback) {
+
+        // parse the full Ast of each file (untimed),
+        //  since that's what partial buffers parse onto
+        var parts = [];
+        async.eachSeries(corpus.files, function(file, cb) {
+            Ast.parseFile(file.path, file.buf, {strict: false}, function(err, ast) {
+                if (err) return cb();
+
+                var part = extractPart(file, ast);
+                if (part)
+                    parts.push(part);
+                cb();
+            });
+        }, function() {
+            measure(parts, function(part, cb) {
+                Ast.parseFile(part.path, part.buf, {
+                    strict: false
+                  , base: part.base
+                }, cb);
+            }, callback);
+        });
+    },
+
+    classfile: function(corpus, callback) {
+        if (!corpus.classes.length)
+            return callback(null, {skipped: 'no jar'});
+
+        measure(corpus.classes, function(entry, cb) {
+            new ClassFile(entry.buf).project();
+            cb();
+        }, callback);
+    }
+};
+
+function parseWith(parseOptions) {
+    return function(corpus, callback) {
+        measure(corpus.files, function(file, cb) {
+            Ast.parseFile(file.path, file.buf, parseOptions, cb);
+        }, callback);
+    };
+}
+
+/**
+ * Run the work on each item ({path, buf}) in turn,
+ *  timing each one. Errors are counted, not fatal
+ */
+function measure(items, work, callback) {
+    if (global.gc)
+        global.gc();
+
+    var baseHeap = process.memoryUsage().heapUsed;
+    var peakHeap = baseHeap;
+    var times = [];
+    var failures = 0;
+    var started = process.hrtime();
+
+    async.eachSeries(items, function(item, cb) {
+        var itemStarted = process.hrtime();
+        var done = function(err) {
+            if (err) failures++;
+
+            times.push({path: item.path, ms: elapsed(itemStarted), bytes: sizeOf(item)});
+            peakHeap = Math.max(peakHeap, process.memoryUsage().heapUsed);
+
+            // don't let eachSeries recurse forever on sync work
+            setImmediate(cb);
+        };
+
+        try {
+            work(item, done);
+        } catch (e) {
+            done(e);
+        }
+    }, function() {
+        var total = times.reduce(function(sum, time) {
+            return sum + time.ms;
+        }, 0);
+        var bytes = totalBytes(items);
+
+        times.sort(function(a, b) {
+            return b.ms - a.ms;
+        });
+
+        callback(null, {
+            files: items.length
+          , failures: failures
+          , ms: round(total)
+          , wallMs: round(elapsed(started))
+          , filesPerSec: round(items.length / (total / 1000))
+          , mbPerSec: round(bytes / (1024 * 1024) / (total / 1000))
+          , peakHeapMb: round(peakHeap / (1024 * 1024))
+          , heapGrowthMb: round((peakHeap - baseHeap) / (1024 * 1024))
+          , worst: times.slice(0, WORST_COUNT).map(function(time) {
+                return {path: time.path, ms: round(time.ms), bytes: time.bytes};
+            })
+        });
+    });
+}
+
+
+/*
+ * Corpus
+ */
+
+function loadCorpus(options, callback) {
+    var corpus = {files: [], classes: []};
+
+    var loadSources = function(cb) {
+        if (options.android) {
+            corpus.name = 'android-19';
+            return readSources(path.join(process.env.ANDROID_HOME,
+                'sources', 'android-19', '**', '*.java'), corpus, cb);
+        } else if (options.dir) {
+            corpus.name = options.dir;
+            return readSources(path.join(options.dir, '**', '*.java'), corpus, cb);
+        }
+
+        corpus.name = 'synthetic';
+        corpus.files = synthesize(options.copies);
+        cb();
+    };
+
+    loadSources(function(err) {
+        if (err) return callback(err);
+
+        readClasses(options, corpus, function(err) {
+            callback(err, corpus);
+        });
+    });
+}
+
+function readSources(pattern, corpus, callback) {
+    glob(pattern, function(err, paths) {
+        if (err) return callback(err);
+
+        async.eachLimit(paths, 20, function(file, cb) {
+            fs.readFile(file, function(err, buf) {
+                if (!err)
+                    corpus.files.push({path: file, buf: buf});
+                cb();
+            });
+        }, callback);
+    });
+}
+
+/**
+ * Generate a corpus from our test sources, renaming the
+ *  types in each copy so they're all distinct
+ */
+function synthesize(copies) {
+    var dir = path.join(__dirname, '..');
+    var files = [];
+    SYNTHETIC_SOURCES.forEach(function(source) {
+        var text = fs.readFileSync(path.join(dir, source)).toString();
+        var name = source.substr(0, source.length - '.java'.length);
+        var regex = new RegExp('\\b' + name + '\\b', 'g');
+
+        for (var i=0; i < copies; i++) {
+            var copy = name + i;
+            files.push({
+                path: path.join(dir, 'synthetic', copy + '.java')
+              , buf: new Buffer(text.replace(regex, copy))
+            });
+        }
+    });
+    return files;
+}
+
+function readClasses(options, corpus, callback) {
+    var jarPath = options.jar;
+    if (!jarPath && process.env.JAVA_HOME)
+        jarPath = path.join(process.env.JAVA_HOME, 'jre', 'lib', 'rt.jar');
+    if (!jarPath || !fs.existsSync(jarPath))
+        return callback();
+
+    var jar = new JarFile(jarPath);
+    jar.entries(function(err, entries) {
+        if (err) return callback(err);
+
+        var names = Object.keys(entries).filter(function(entry) {
+            return entry.substr(-6) == '.class';
+        }).slice(0, options.classes);
+
+        async.eachSeries(names, function(name, cb) {
+            jar.read(name, function(err, buf) {
+                if (!err)
+                    corpus.classes.push({path: name, buf: buf});
+                cb();
+            });
+        }, callback);
+    });
+}
+
+/**
+ * Build a partial buffer (like the client sends) holding
+ *  the lines of the file's main type's methods
+ */
+function extractPart(file, ast) {
+    var first = Infinity, last = -1;
+    Object.keys(ast.qualifieds).forEach(function(name) {
+        var node = ast.qualifieds[name];
+        var hash = name.indexOf('#');
+        if (!~hash || ~name.indexOf('$') || node.constructor.name != 'Method')
+            return;
+
+        first = Math.min(first, node.start.line);
+        last = Math.max(last, node.end.line);
+    });
+
+    if (last < 0)
+        return null;
+
+    var lines = file.buf.toString().split('\n').slice(first - 1, last);
+    return {
+        path: file.path
+      , base: ast
+      , buf: {
+            type: 'part'
+          , start: first
+          , text: new Buffer(lines.join('\n') + '\n')
+        }
+    };
+}
+
+
+/*
+ * Util
+ */
+
+function parseArgs(args) {
+    var options = {copies: 100, classes: 2000, only: []};
+    for (var i=0; i < args.length; i++) {
+        switch (args[i]) {
+        case '--android': options.android = true; break;
+        case '--dir': options.dir = args[++i]; break;
+        case '--jar': options.jar = args[++i]; break;
+        case '--copies': options.copies = parseInt(args[++i], 10); break;
+        case '--classes': options.classes = parseInt(args[++i], 10); break;
+        case '--only': options.only.push(args[++i]); break;
+        case '--out': options.out = args[++i]; break;
+        case '--baseline': options.baseline = args[++i]; break;
+        default:
+            console.error("Unknown option", args[i]);
+            process.exit(1);
+        }
+    }
+    return options;
+}
+
+/** Print the change in throughput since the baseline results */
+function compare(baseline, results) {
+    console.error("vs", baseline.commit || baseline.date);
+    Object.keys(results.modes).forEach(function(mode) {
+        var before = baseline.modes[mode];
+        var after = results.modes[mode];
+        if (!before || !before.filesPerSec || !after.filesPerSec)
+            return;
+
+        var change = (after.filesPerSec / before.filesPerSec - 1) * 100;
+        console.error('  ' + mode + ':', before.filesPerSec, '->',
+            after.filesPerSec, 'files/sec',
+            '(' + (change >= 0 ? '+' : '') + round(change) + '%)');
+    });
+}
+
+function totalBytes(items) {
+    return items.reduce(function(sum, item) {
+        return sum + sizeOf(item);
+    }, 0);
+}
+
+function sizeOf(item) {
+    return (item.buf.text || item.buf).length;
+}
+
+/** @return ms since the process.hrtime() */
+function elapsed(started) {
+    var diff = process.hrtime(started);
+    return diff[0] * 1e3 + diff[1] / 1e6;
+}
+
+function round(value) {
+    return Math.round(value * 100) / 100;
+}
+
+
+/*
+ * Main
+ */
+
+var options = parseArgs(process.argv.slice(2));
+
+loadCorpus(options, function(err, corpus) {
+    if (err) throw err;
+
+    var modes = MODES.filter(function(mode) {
+        return !options.only.length || ~options.only.indexOf(mode);
+    });
+
+    var results = {
+        date: new Date().toISOString()
+      , node: process.version
+      , corpus: {
+            name: corpus.name
+          , files: corpus.files.length
+          , bytes: totalBytes(corpus.files)
+          , classes: corpus.classes.length
+        }
+      , modes: {}
+    };
+
+    async.eachSeries(modes, function(mode, cb) {
+        console.error("Running", mode, "...");
+        BENCHMARKS[mode](corpus, function(err, result) {
+            if (err) return cb(err);
+
+            results.modes[mode] = result;
+            cb();
+        });
+    }, function(err) {
+        if (err) throw err;
+
+        exec('git rev-parse HEAD', {cwd: __dirname}, function(err, stdout) {
+            results.commit = err ? null : stdout.trim();
+
+            var json = JSON.stringify(results, null, 2);
+            if (options.out)
+                fs.writeFileSync(options.out, json + '\n');
+            else
+                console.log(json);
+
+            if (options.baseline)
+                compare(JSON.parse(fs.readFileSync(options.baseline)), results);
+        });
+    });
+});
@@ -0,0 +1,222 @@
+#!/usr/bin/env mocha
+
+var path = require('path')
+  , should = require('chai').should()
+  , WorkerPool = require('../util/workerpool')
+
+  , INDEX_WORKER = path.join(__dirname, '..', 'util', 'indexworker.js');
+
+describe("WorkerPool", function() {
+
+    var pool;
+    beforeEach(function() {
+        pool = new WorkerPool(INDEX_WORKER, 2);
+    });
+
+    afterEach(function() {
+        pool.close();
+    });
+
+    it("runs jobs in the workers", function(done) {
+        var files = ['Boring.java', 'Foo.java', 'FullAst.java'];
+        var results = {};
+        files.forEach(function(file) {
+            pool.run({path: path.join(__dirname, file)}, function(err, qualifieds) {
+                should.not.exist(err);
+                results[file] = qualifieds;
+
+                if (Object.keys(results).length < files.length)
+                    return;
+
+                pool._workers.length.should.equal(2);
+                results['Foo.java'].should.contain('net.dhleong.njast.Foo');
+                results['FullAst.java'].should.contain(
+                    'net.dhleong.njast.FullAst#getImported');
+                done();
+            });
+        });
+    });
+
+    it("reports errors", function(done) {
+        pool.run({path: path.join(__dirname, 'Missing.java')}, function(err) {
+            should.exist(err);
+            err.message.should.contain('ENOENT');
+
+            // and keeps going
+            pool.run({path: path.join(__dirname, 'Boring.java')}, function(err) {
+                should.not.exist(err);
+                done();
+            });
+        });
+    });
+
+    it("fails jobs after closing", function(done) {
+        pool.close();
+        pool.run({path: 'Boring.java'}, function(err) {
+            should.exist(err);
+            done();
+        });
+    });
+});
+
+describe("WorkerPool scheduling", function() {
+
+    var ECHO_WORKER = path.join(__dirname, 'util', 'echo-worker.js');
+
+    var pool;
+    afterEach(function() {
+        pool.close();
+    });
+
+    it("runs jobs with the same key on the same worker", function(done) {
+        pool = new WorkerPool(ECHO_WORKER, 2);
+
+        var keys = ['Foo.java', 'Bar.java', 'Foo.java', 'Bar.java', 'Foo.java'];
+        var pids = {};
+        var pending = keys.length;
+        keys.forEach(function(key) {
+            pool.run({delay: 5}, {key: key}, function(err, result) {
+                should.not.exist(err);
+
+                if (pids[key])
+                    result.pid.should.equal(pids[key]);
+                pids[key] = result.pid;
+
+                if (--pending)
+                    return;
+
+                pids['Foo.java'].should.not.equal(pids['Bar.java']);
+                done();
+            });
+        });
+    });
+
+    it("releases keys", function(done) {
+        pool = new WorkerPool(ECHO_WORKER, 2);
+
+        pool.run({}, {key: 'Foo.java'}, function(err, first) {
+            should.not.exist(err);
+
+            pool.release('Foo.java');
+            pool._affinity.should.not.have.property('Foo.java');
+            pool._workers[0]._keys.should.be.empty;
+
+            // with its worker busy, Foo.java goes to a new one
+            pool.run({delay: 50}, function() {});
+            pool.run({}, {key: 'Foo.java'}, function(err, second) {
+                should.not.exist(err);
+                second.pid.should.not.equal(first.pid);
+                done();
+            });
+        });
+    });
+
+    it("gives workers the env", function(done) {
+        pool = new WorkerPool(ECHO_WORKER, 1, {ECHO: 'hi'});
+
+        pool.run({env: 'ECHO'}, function(err, result) {
+            should.not.exist(err);
+            result.env.should.equal('hi');
+            done();
+        });
+    });
+
+    it("broadcasts to every worker", function(done) {
+        pool = new WorkerPool(ECHO_WORKER, 2);
+
+        var spawned = [];
+        pool.on('spawn', function(worker) {
+            spawned.push(worker.pid);
+        });
+
+        var told = [];
+        pool.on('message', function(message, worker) {
+            message.pid.should.equal(worker.pid);
+            message.told.should.deep.equal({hi: true});
+            told.push(message.pid);
+            if (told.length < 2)
+                return;
+
+            told.sort().should.deep.equal(spawned.sort());
+            done();
+        });
+
+        // busy both workers, so there are two to tell
+        pool.run({delay: 20}, function() {});
+        pool.run({delay: 20}, function() {});
+        spawned.should.have.length(2);
+        pool.broadcast({hi: true});
+    });
+
+    it("runs jobs on each worker", function(done) {
+        pool = new WorkerPool(ECHO_WORKER, 2);
+
+        // busy both workers, so there are two to run it
+        pool.run({delay: 20}, function() {});
+        pool.run({delay: 20}, function() {});
+        pool.runEach({each: true}, function(err, results) {
+            should.not.exist(err);
+            results.should.have.length(2);
+            results[0].pid.should.not.equal(results[1].pid);
+            results[0].job.should.deep.equal({each: true});
+            done();
+        });
+    });
+
+    it("doesn't hold interactive jobs behind a busy worker", function(done) {
+        pool = new WorkerPool(ECHO_WORKER, 2);
+
+        var Priority = WorkerPool.Priority;
+        var order = [];
+        var pids = {};
+        var record = function(name) {
+            return function(err, result) {
+                should.not.exist(err);
+                order.push(name);
+                pids[result.pid] = true;
+                if (order.length < 3)
+                    return;
+
+                order.should.deep.equal(['suggest', 'update', 'progress']);
+                Object.keys(pids).should.have.length(1);
+                done();
+            };
+        };
+
+        // IE: the first /update, which indexes the project
+        pool.run({delay: 100}, {priority: Priority.BACKGROUND, key: 'Foo.java'},
+            record('update'));
+        pool.run({}, {priority: Priority.NORMAL, key: 'Foo.java'},
+            record('progress'));
+        pool.run({}, {priority: Priority.INTERACTIVE, key: 'Foo.java'},
+            record('suggest'));
+    });
+
+    it("runs the most urgent jobs first", function(done) {
+        pool = new WorkerPool(ECHO_WORKER, 1);
+
+        var order = [];
+        var record = function(name) {
+            return function(err) {
+                should.not.exist(err);
+                order.push(name);
+                if (order.length < 5)
+                    return;
+
+                // the interactive ones don't wait for 'busy'
+                order.should.deep.equal(['suggest', 'define',
+                    'busy', 'progress', 'update']);
+                done();
+            };
+        };
+
+        var Priority = WorkerPool.Priority;
+        pool.run({delay: 20}, record('busy'));
+        pool.run({}, {priority: Priority.BACKGROUND, key: 'Foo.java'},
+            record('update'));
+        pool.run({}, {priority: Priority.NORMAL}, record('progress'));
+        pool.run({}, {priority: Priority.INTERACTIVE, key: 'Foo.java'},
+            record('suggest'));
+        pool.run({}, {priority: Priority.INTERACTIVE}, record('define'));
+    });
+});
@@ -3,6 +3,8 @@
  * New Tokenizer for the proper ast
  */
 
+var LineIndex = require('./util/lines');
+
 var NAME_RANGES = [];
 var VALS = {
     _val: "\r\n/*09azAZ_$.,_{}<>()[]=+-|&!~^%;:@\"'?\\ ",
@@ -53,7 +55,7 @@ var QUOTE = VALS.next();
 var APOSTROPHE = VALS.next();
 var QUESTION = VALS.next();
 
-// var ESCAPE = VALS.next();
+var ESCAPE = VALS.next();
 
 var OTHER_TOKENS = [
     DOT,
@@ -300,6 +302,7 @@ Tokenizer.prototype.prepare = function() {
 Tokenizer.prototype._skipBlank = function() {
     this._preSkip = this.save();
     var off = this._pos;
+    var newline = false;
     while (off < this._fp.length) {
         var token = this._fp[off];
         var nextToken = off < this._fp.length + 1
@@ -309,37 +312,101 @@ Tokenizer.prototype._skipBlank = function() {
         // comments
         var skip = Commentor.read(this, off, token, nextToken);
         off += skip;
-        this._col += skip; // I guess?
 
         // if we had a skip from Commentor, don't process this
-        if (!skip && !Commentor.inComment() && isToken(token)) {
-            this._pos = off;
-            return;
-        }
+        if (!skip && !Commentor.inComment() && isToken(token))
+            break;
 
-        if (token == NL) {
+        if (token == NL || token == CR)
+            newline = true;
 
-            this._line++;
-            this._col = 0; // ++ below fixes
+        off++;
+    }
 
-        } else if (token == CR ) {
-            if (nextToken != NL) { // \r\n to end a line
-                this._recordLine(off);
-                this._line++;      // just \r 
-                this._col = 0; // ++ below fixes
-            } else {
-                off++; // \r\n... skip next
-                this._col++;
+    if (newline) {
+        this._updatePos(off);
+    } else {
+        this._col += off - this._pos; // quick path
+    }
+
+    // NB: at EOF we leave _pos alone
+    if (off < this._fp.length)
+        this._pos = off;
+};
+
+/**
+ * @return The LineIndex for our buffer. Its lines are
+ *  relative to the start of the buffer, not the file
+ */
+Tokenizer.prototype.getLines = function() {
+    return LineIndex.of(this._fp);
+};
+
+/**
+ * Update our line and col for moving from _pos to
+ *  the given offset. It's relative to where we are,
+ *  since we may not have started at line 1 (see reparse)
+ */
+Tokenizer.prototype._updatePos = function(off) {
+    var lines = this.getLines();
+    var from = lines.lineAt(this._pos);
+    var to = lines.lineAt(off);
+    if (from == to) {
+        this._col += off - this._pos;
+    } else {
+        this._line += to - from;
+        this._col = off - lines.lineStart(to) + 1;
+    }
+};
+
+/**
+ * Skip the rest of the block whose open brace was just read,
+ *  through its matching close brace, without tokenizing any
+ *  of it. Braces inside strings, chars, and comments are
+ *  ignored, and line numbers are kept up to date.
+ *
+ * @return True if we found the close brace, else false
+ *  if we ran out of input first
+ */
+Tokenizer.prototype.skipBlock = function() {
+    var fp = this._fp;
+    var len = fp.length;
+    var off = this._pos;
+    var depth = 1;
+
+    while (off < len && depth) {
+        var token = fp[off];
+
+        if (token == BLOCK_OPEN) {
+            depth++;
+        } else if (token == BLOCK_CLOSE) {
+            depth--;
+        } else if (token == QUOTE || token == APOSTROPHE) {
+            // unterminated literals end with the line
+            while (++off < len && fp[off] != token
+                    && fp[off] != NL && fp[off] != CR) {
+                if (fp[off] == ESCAPE)
+                    off++;
             }
+        } else if (token == SLASH && fp[off + 1] == SLASH) {
+            while (off + 1 < len && fp[off + 1] != NL && fp[off + 1] != CR)
+                off++;
+        } else if (token == SLASH && fp[off + 1] == STAR) {
+            off += 2;
+            while (off < len && !(fp[off] == STAR && fp[off + 1] == SLASH))
+                off++;
+            off++; // the slash
         }
 
-        this._col++;
         off++;
     }
 
+    off = Math.min(off, len);
+    this._updatePos(off);
+    this._pos = off;
+    return !depth;
 };
 
-
 /** Restore to position state */
 Tokenizer.prototype.restore = function(state) {
     this._preSkip = undefined;
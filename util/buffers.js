@@ -0,0 +1,166 @@
+var Ast = require('../ast');
+
+/**
+ * Keeps the last-synced text of each buffer the client
+ *  is editing, so requests can send just a version id
+ *  (if nothing changed) or only the lines that changed,
+ *  instead of the whole file every time.
+ *
+ * Buffer dicts understood by resolve():
+ *  - {type: 'full', text: String, version: Number}
+ *      Replaces whatever we had for the path
+ *  - {type: 'same', version: Number}
+ *      Nothing changed since `version` was synced
+ *  - {type: 'delta', base: Number, version: Number, changes: []}
+ *      Apply `changes` to the text synced at `base`. Each change
+ *      is a dict {start, end, text} replacing the zero-indexed
+ *      lines [start, end) with the lines in `text`
+ *
+ * Each may also have the `client` that sent it. Clients
+ *  version buffers on their own (vim uses changedtick), so
+ *  when several share a server we keep each one's copy of
+ *  a path separately
+ */
+function BufferStore() {
+    this._buffers = {};
+}
+
+/**
+ * @return True if the buffer dict is one of our
+ *  sync types (and so should go through resolve())
+ */
+BufferStore.isSynced = function(buffer) {
+    return buffer.version !== undefined
+        && (buffer.type == 'full'
+            || buffer.type == 'same'
+            || buffer.type == 'delta');
+};
+
+/**
+ * Resolve a synced buffer dict from a request into a
+ *  regular full buffer ({type: 'full', text: Buffer}),
+ *  updating our copy as necessary.
+ *
+ * @return The full buffer, or null if the client's base
+ *  version doesn't match ours (IE: we restarted, or missed
+ *  an update); the client should re-send the full text
+ */
+BufferStore.prototype.resolve = function(path, buffer) {
+    var key = bufferKey(path, buffer.client);
+    var existing = this._buffers[key];
+
+    switch (buffer.type) {
+    case 'full':
+        existing = this._buffers[key] = {
+            version: buffer.version
+          , lines: splitLines(buffer.text)
+          , changes: []
+        };
+        break;
+
+    case 'same':
+        if (!existing || existing.version != buffer.version)
+            return null;
+        break;
+
+    case 'delta':
+        if (!existing || existing.version != buffer.base)
+            return null;
+
+        buffer.changes.forEach(function(change) {
+            var lines = splitLines(change.text);
+            var args = [change.start, change.end - change.start]
+                .concat(lines);
+            existing.lines.splice.apply(existing.lines, args);
+
+            // in Ast.reparse terms
+            existing.changes.push({
+                start: change.start + 1
+              , end: change.end
+              , delta: lines.length - (change.end - change.start)
+            });
+        });
+        existing.version = buffer.version;
+        existing.text = undefined;
+        break;
+    }
+
+    if (!existing.text) {
+        existing.text = new Buffer(existing.lines.length
+            ? existing.lines.join('\n') + '\n'
+            : '');
+    }
+
+    return {
+        type: 'full'
+      , text: existing.text
+      , version: existing.version
+      , client: buffer.client
+    };
+};
+
+/**
+ * Parse a buffer returned from resolve(), reusing the Ast
+ *  from the last call if the version hasn't changed, or
+ *  re-parsing just the edited part of it if there was a
+ *  single change since then. Buffers we aren't tracking
+ *  are simply parsed in full.
+ */
+BufferStore.prototype.parse = function(path, buffer, options, callback) {
+    var key = bufferKey(path, buffer.client);
+    var existing = this._buffers[key];
+    if (!existing || existing.version !== buffer.version)
+        return Ast.parseFile(path, buffer, options, callback);
+
+    var self = this;
+    var version = existing.version;
+    var onParsed = function(err, ast) {
+        if (!err && self._buffers[key] === existing
+                && existing.version === version) {
+            existing.ast = ast;
+            existing.changes = [];
+        }
+
+        callback(err, ast);
+    };
+
+    var previous = existing.ast;
+    if (previous && !existing.changes.length)
+        return callback(null, previous);
+
+    // the previous Ast may get updated in place, so
+    //  nobody else should see it until we're done
+    existing.ast = undefined;
+    if (previous && existing.changes.length == 1) {
+        Ast.reparse(previous, buffer, existing.changes[0],
+            options, onParsed);
+    } else {
+        Ast.parseFile(path, buffer, options, onParsed);
+    }
+};
+
+/** Forget about the client's buffer at the given path */
+BufferStore.prototype.remove = function(path, client) {
+    delete this._buffers[bufferKey(path, client)];
+};
+
+function bufferKey(path, client) {
+    return client ? client + ':' + path : path;
+}
+
+/**
+ * Split text as sent by the client (every line,
+ *  including the last, terminated by a newline)
+ *  into an array of lines
+ */
+function splitLines(text) {
+    if (!text)
+        return [];
+
+    var lines = text.split('\n');
+    if (lines[lines.length - 1] === '')
+        lines.pop();
+    return lines;
+}
+
+module.exports = BufferStore;
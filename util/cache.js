@@ -0,0 +1,227 @@
+/**
+ * In-memory LRU cache with entry and (approximate) byte
+ *  budgets, so long-lived servers don't just grow forever.
+ *  Pinned keys (IE: files open in the editor) are never
+ *  evicted, and don't count against the budgets.
+ *
+ * Every cache is registered by name for LruCache.report()
+ */
+
+var _caches = [];
+
+/**
+ * @param name Name to report our stats under; caches
+ *  with the same name are reported together
+ * @param options (optional) A dict with:
+ *  - maxEntries: (default: Infinity) Max number of entries
+ *  - maxBytes: (default: Infinity) Max total size of entries
+ *  - sizeOf: fn(value, key) that estimates the size of
+ *      an entry in bytes; required to use maxBytes
+ */
+function LruCache(name, options) {
+    options = options || {};
+
+    this.name = name;
+    this.maxEntries = options.maxEntries || Infinity;
+    this.maxBytes = options.maxBytes || Infinity;
+    this._sizeOf = options.sizeOf || function() { return 0; };
+
+    this.clear();
+
+    this.hits = 0;
+    this.misses = 0;
+    this.evictions = 0;
+
+    _caches.push(this);
+}
+
+/**
+ * Budgets for the named cache, from the environment if
+ *  set, else the defaults:
+ *  - $NJAST_CACHE_<NAME>_ENTRIES: maxEntries
+ *  - $NJAST_CACHE_<NAME>_MB: maxBytes, in megabytes
+ */
+LruCache.budget = function(name, defaults) {
+    var prefix = 'NJAST_CACHE_' + name.toUpperCase() + '_';
+    var entries = parseInt(process.env[prefix + 'ENTRIES'], 10);
+    var mb = parseFloat(process.env[prefix + 'MB']);
+
+    return {
+        maxEntries: entries > 0 ? entries : defaults.maxEntries
+      , maxBytes: mb > 0 ? mb * 1024 * 1024 : defaults.maxBytes
+    };
+};
+
+/**
+ * @param others (optional) Reports from other processes
+ *  (IE: request workers) to combine with ours
+ * @return A dict of name -> combined stats of
+ *  every cache with that name
+ */
+LruCache.report = function(others) {
+    var report = {};
+    function add(name, stats) {
+        var existing = report[name];
+        if (!existing) {
+            report[name] = stats;
+        } else {
+            Object.keys(stats).forEach(function(key) {
+                existing[key] += stats[key];
+            });
+        }
+    }
+
+    _caches.forEach(function(cache) {
+        add(cache.name, cache.stats());
+    });
+    (others || []).forEach(function(other) {
+        Object.keys(other).forEach(function(name) {
+            add(name, other[name]);
+        });
+    });
+    return report;
+};
+
+/** @return The value for the key, if any */
+LruCache.prototype.get = function(key) {
+    var entry = this._entries[key];
+    if (!entry) {
+        this.misses++;
+        return;
+    }
+
+    this.hits++;
+    this._unlink(entry);
+    this._pushFront(entry);
+    return entry.value;
+};
+
+/** Like get(), but doesn't count or affect eviction order */
+LruCache.prototype.peek = function(key) {
+    var entry = this._entries[key];
+    return entry ? entry.value : undefined;
+};
+
+LruCache.prototype.has = function(key) {
+    return key in this._entries;
+};
+
+LruCache.prototype.set = function(key, value) {
+    var entry = this._entries[key];
+    if (entry) {
+        this._unlink(entry);
+        this._release(entry);
+    } else {
+        entry = this._entries[key] = {key: key};
+        this.size++;
+    }
+
+    entry.value = value;
+    entry.bytes = this._sizeOf(value, key) || 0;
+    this._pushFront(entry);
+    if (!this._pinned[key])
+        this.bytes += entry.bytes;
+
+    this._evict();
+};
+
+LruCache.prototype.remove = function(key) {
+    var entry = this._entries[key];
+    if (!entry)
+        return;
+
+    this._unlink(entry);
+    this._release(entry);
+    delete this._entries[key];
+    this.size--;
+};
+
+LruCache.prototype.clear = function() {
+    this._entries = Object.create(null);
+    this._pinned = this._pinned || Object.create(null);
+    this._head = null; // most recently used
+    this._tail = null; // least recently used
+    this.size = 0;
+    this.bytes = 0;
+};
+
+/**
+ * Keep the key (whether or not it's cached yet)
+ *  from being evicted until unpinned
+ */
+LruCache.prototype.pin = function(key) {
+    if (this._pinned[key])
+        return;
+
+    this._pinned[key] = true;
+    var entry = this._entries[key];
+    if (entry)
+        this.bytes -= entry.bytes;
+};
+
+LruCache.prototype.unpin = function(key) {
+    if (!this._pinned[key])
+        return;
+
+    delete this._pinned[key];
+    var entry = this._entries[key];
+    if (entry)
+        this.bytes += entry.bytes;
+
+    this._evict();
+};
+
+LruCache.prototype.stats = function() {
+    return {
+        entries: this.size
+      , bytes: this.bytes
+      , pinned: Object.keys(this._pinned).length
+      , hits: this.hits
+      , misses: this.misses
+      , evictions: this.evictions
+    };
+};
+
+LruCache.prototype._evict = function() {
+    var entry = this._tail;
+    while (entry && (this.size > this.maxEntries || this.bytes > this.maxBytes)) {
+        var prev = entry.prev;
+        if (!this._pinned[entry.key]) {
+            this.remove(entry.key);
+            this.evictions++;
+        }
+        entry = prev;
+    }
+};
+
+/** Stop counting the entry's bytes */
+LruCache.prototype._release = function(entry) {
+    if (!this._pinned[entry.key])
+        this.bytes -= entry.bytes;
+};
+
+LruCache.prototype._pushFront = function(entry) {
+    entry.prev = null;
+    entry.next = this._head;
+    if (this._head)
+        this._head.prev = entry;
+    this._head = entry;
+    if (!this._tail)
+        this._tail = entry;
+};
+
+LruCache.prototype._unlink = function(entry) {
+    if (entry.prev)
+        entry.prev.next = entry.next;
+    else
+        this._head = entry.next;
+
+    if (entry.next)
+        entry.next.prev = entry.prev;
+    else
+        this._tail = entry.prev;
+
+    entry.prev = entry.next = null;
+};
+
+module.exports = LruCache;
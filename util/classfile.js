@@ -0,0 +1,433 @@
+/**
+ * Reads just enough of a .class file to project its
+ *  public members: the constant pool, the class name,
+ *  and the fields and methods with their descriptors
+ *  and (generic) Signature attributes. Code and the
+ *  rest of the attributes are skipped.
+ */
+
+var MAGIC = 0xcafebabe
+
+  , CONSTANT_Utf8 = 1
+  , CONSTANT_Integer = 3
+  , CONSTANT_Float = 4
+  , CONSTANT_Long = 5
+  , CONSTANT_Double = 6
+  , CONSTANT_Class = 7
+  , CONSTANT_String = 8
+  , CONSTANT_Fieldref = 9
+  , CONSTANT_Methodref = 10
+  , CONSTANT_InterfaceMethodref = 11
+  , CONSTANT_NameAndType = 12
+  , CONSTANT_MethodHandle = 15
+  , CONSTANT_MethodType = 16
+  , CONSTANT_Dynamic = 17
+  , CONSTANT_InvokeDynamic = 18
+  , CONSTANT_Module = 19
+  , CONSTANT_Package = 20
+
+  , ACC_PUBLIC = 0x0001
+  , ACC_PRIVATE = 0x0002
+  , ACC_PROTECTED = 0x0004
+  , ACC_STATIC = 0x0008
+  , ACC_FINAL = 0x0010
+  , ACC_SYNCHRONIZED = 0x0020
+  , ACC_VOLATILE = 0x0040
+  , ACC_BRIDGE = 0x0040
+  , ACC_TRANSIENT = 0x0080
+  , ACC_VARARGS = 0x0080
+  , ACC_NATIVE = 0x0100
+  , ACC_INTERFACE = 0x0200
+  , ACC_ABSTRACT = 0x0400
+  , ACC_STRICT = 0x0800
+  , ACC_SYNTHETIC = 0x1000
+
+  , PRIMITIVES = {
+        B: 'byte'
+      , C: 'char'
+      , D: 'double'
+      , F: 'float'
+      , I: 'int'
+      , J: 'long'
+      , S: 'short'
+      , Z: 'boolean'
+      , V: 'void'
+    }
+
+    // in the same order as java.lang.reflect.Modifier.toString
+  , FIELD_MODIFIERS = [
+        [ACC_PUBLIC, 'public']
+      , [ACC_PROTECTED, 'protected']
+      , [ACC_PRIVATE, 'private']
+      , [ACC_STATIC, 'static']
+      , [ACC_FINAL, 'final']
+      , [ACC_TRANSIENT, 'transient']
+      , [ACC_VOLATILE, 'volatile']
+    ]
+  , METHOD_MODIFIERS = [
+        [ACC_PUBLIC, 'public']
+      , [ACC_PROTECTED, 'protected']
+      , [ACC_PRIVATE, 'private']
+      , [ACC_ABSTRACT, 'abstract']
+      , [ACC_STATIC, 'static']
+      , [ACC_FINAL, 'final']
+      , [ACC_SYNCHRONIZED, 'synchronized']
+      , [ACC_NATIVE, 'native']
+      , [ACC_STRICT, 'strictfp']
+    ];
+
+/**
+ * Parse the contents of a .class file
+ *
+ * @throws Error if it isn't one
+ */
+function ClassFile(buf) {
+    this._buf = buf;
+    this._off = 0;
+
+    if (this._u4() != MAGIC)
+        throw new Error("Not a class file");
+
+    this._u2(); // minor
+    this._u2(); // major
+    this._readConstants();
+
+    this.access = this._u2();
+    this.name = this._className(this._u2());
+    var superIndex = this._u2();
+    this.superName = superIndex ? this._className(superIndex) : null;
+
+    this.interfaces = [];
+    for (var i=0, len=this._u2(); i < len; i++)
+        this.interfaces.push(this._className(this._u2()));
+
+    this.fields = this._readMembers();
+    this.methods = this._readMembers();
+    this.signature = this._readAttributes().Signature;
+
+    // don't hang onto it
+    this._buf = undefined;
+    this._pool = undefined;
+}
+
+/**
+ * Project this class the same way that ClassBody does
+ *  with Ast.PROJECT_ALL from javap output: public fields
+ *  and methods (not constructors), with types in their
+ *  binary form (EX: java.util.Map$Entry) minus type args.
+ *  Method return types don't include array dimensions.
+ */
+ClassFile.prototype.project = function() {
+    var qualifiedName = this.name;
+    var isInterface = this.access & ACC_INTERFACE;
+
+    return {
+        qualifiedName: qualifiedName
+
+      , fields: this.fields.filter(isProjected).map(function(field) {
+            var type = field.signature
+                ? new Signature(field.signature).readType()
+                : new Signature(field.descriptor).readType();
+
+            return {
+                name: field.name
+              , javadoc: ''
+              , mods: modifiers(field.access, FIELD_MODIFIERS)
+              , type: formatType(type)
+            };
+        })
+
+      , methods: this.methods.filter(function(method) {
+            return isProjected(method)
+                && !(method.access & ACC_BRIDGE)
+                && method.name.charAt(0) != '<'; // <init>, <clinit>
+        }).map(function(method) {
+            var sig = new Signature(method.signature || method.descriptor);
+            var parsed = sig.readMethod();
+
+            var params = parsed.params;
+            if (method.access & ACC_VARARGS && params.length)
+                params[params.length - 1].array--;
+
+            var mods = modifiers(method.access, METHOD_MODIFIERS);
+            if (isInterface && !(method.access & (ACC_ABSTRACT | ACC_STATIC)))
+                mods += ' default';
+
+            return {
+                name: method.name
+              , qualified: qualifiedName + '#' + method.name
+              , javadoc: ''
+              , mods: mods
+              , returns: parsed.returns.name
+              , params: params.map(function(type, index) {
+                    return {
+                        name: 'arg' + index
+                      , type: formatType(type)
+                    };
+                })
+            };
+        })
+    };
+};
+
+ClassFile.prototype._readConstants = function() {
+    var count = this._u2();
+    var pool = this._pool = new Array(count);
+    for (var i=1; i < count; i++) {
+        var tag = this._u1();
+        switch (tag) {
+        case CONSTANT_Utf8:
+            // NB: technically "modified" utf8, but that only
+            //  differs for \0 and supplementary characters
+            var len = this._u2();
+            pool[i] = this._buf.toString('utf8', this._off, this._off + len);
+            this._off += len;
+            break;
+
+        case CONSTANT_Class:
+            pool[i] = {nameIndex: this._u2()};
+            break;
+
+        case CONSTANT_Long:
+        case CONSTANT_Double:
+            // these take up two slots. Yes, really.
+            this._off += 8;
+            i++;
+            break;
+
+        case CONSTANT_MethodHandle:
+            this._off += 3;
+            break;
+
+        case CONSTANT_String:
+        case CONSTANT_MethodType:
+        case CONSTANT_Module:
+        case CONSTANT_Package:
+            this._off += 2;
+            break;
+
+        case CONSTANT_Integer:
+        case CONSTANT_Float:
+        case CONSTANT_Fieldref:
+        case CONSTANT_Methodref:
+        case CONSTANT_InterfaceMethodref:
+        case CONSTANT_NameAndType:
+        case CONSTANT_Dynamic:
+        case CONSTANT_InvokeDynamic:
+            this._off += 4;
+            break;
+
+        default:
+            throw new Error("Unknown constant tag " + tag + " at " + i);
+        }
+    }
+};
+
+ClassFile.prototype._readMembers = function() {
+    var members = [];
+    for (var i=0, len=this._u2(); i < len; i++) {
+        var access = this._u2();
+        var name = this._pool[this._u2()];
+        var descriptor = this._pool[this._u2()];
+        var attrs = this._readAttributes();
+        members.push({
+            access: access
+          , name: name
+          , descriptor: descriptor
+          , signature: attrs.Signature
+          , synthetic: !!(access & ACC_SYNTHETIC) || 'Synthetic' in attrs
+        });
+    }
+    return members;
+};
+
+/** @return a dict of the attributes we care about */
+ClassFile.prototype._readAttributes = function() {
+    var attrs = {};
+    for (var i=0, len=this._u2(); i < len; i++) {
+        var name = this._pool[this._u2()];
+        var length = this._u4();
+        var end = this._off + length;
+
+        if (name == 'Signature')
+            attrs.Signature = this._pool[this._u2()];
+        else if (name == 'Synthetic')
+            attrs.Synthetic = true;
+
+        this._off = end;
+    }
+    return attrs;
+};
+
+ClassFile.prototype._className = function(index) {
+    return this._pool[this._pool[index].nameIndex].replace(/\//g, '.');
+};
+
+ClassFile.prototype._u1 = function() {
+    return this._buf[this._off++];
+};
+
+ClassFile.prototype._u2 = function() {
+    var val = this._buf.readUInt16BE(this._off);
+    this._off += 2;
+    return val;
+};
+
+ClassFile.prototype._u4 = function() {
+    var val = this._buf.readUInt32BE(this._off);
+    this._off += 4;
+    return val;
+};
+
+
+/**
+ * Reads descriptors and generic signatures. Types are
+ *  returned as {name, array}, where name is the binary
+ *  name of the (erased) class, the primitive, or the
+ *  name of the type variable
+ */
+function Signature(text) {
+    this._text = text;
+    this._off = 0;
+}
+
+Signature.prototype.readMethod = function() {
+    this._skipTypeParams();
+
+    var params = [];
+    this._expect('(');
+    while (this._peek() != ')')
+        params.push(this.readType());
+    this._expect(')');
+
+    // we don't care about any ^throws
+    return {
+        params: params
+      , returns: this.readType()
+    };
+};
+
+Signature.prototype.readType = function() {
+    var array = 0;
+    while (this._peek() == '[') {
+        array++;
+        this._off++;
+    }
+
+    var type;
+    var next = this._text.charAt(this._off++);
+    if (next == 'L') {
+        type = this._readClass();
+    } else if (next == 'T') {
+        type = this._readUntil(';');
+    } else if (next in PRIMITIVES) {
+        type = PRIMITIVES[next];
+    } else {
+        throw new Error("Unexpected `" + next + "` in " + this._text);
+    }
+
+    return {
+        name: type
+      , array: array
+    };
+};
+
+Signature.prototype._readClass = function() {
+    var name = '';
+    for (;;) {
+        var ch = this._text.charAt(this._off++);
+        switch (ch) {
+        case ';':
+            return name;
+        case '/':
+            name += '.';
+            break;
+        case '.':
+            // inner class of a parameterized type
+            name += '$';
+            break;
+        case '<':
+            this._skipTypeArgs();
+            break;
+        case '':
+            throw new Error("Unterminated class in " + this._text);
+        default:
+            name += ch;
+        }
+    }
+};
+
+Signature.prototype._skipTypeArgs = function() {
+    // just after the <
+    while (this._peek() != '>') {
+        var next = this._peek();
+        if (next == '*') {
+            this._off++;
+        } else {
+            if (next == '+' || next == '-')
+                this._off++;
+            this.readType();
+        }
+    }
+    this._off++;
+};
+
+Signature.prototype._skipTypeParams = function() {
+    if (this._peek() != '<')
+        return;
+
+    this._off++;
+    while (this._peek() != '>') {
+        this._readUntil(':');
+
+        // class bound (may be empty), then interface bounds
+        if (this._peek() != ':')
+            this.readType();
+        while (this._peek() == ':') {
+            this._off++;
+            this.readType();
+        }
+    }
+    this._off++;
+};
+
+Signature.prototype._readUntil = function(end) {
+    var index = this._text.indexOf(end, this._off);
+    if (index < 0)
+        throw new Error("Expected `" + end + "` in " + this._text);
+
+    var read = this._text.substring(this._off, index);
+    this._off = index + 1;
+    return read;
+};
+
+Signature.prototype._peek = function() {
+    return this._text.charAt(this._off);
+};
+
+Signature.prototype._expect = function(ch) {
+    if (this._text.charAt(this._off++) != ch)
+        throw new Error("Expected `" + ch + "` in " + this._text);
+};
+
+
+function isProjected(member) {
+    return (member.access & ACC_PUBLIC) && !member.synthetic;
+}
+
+function modifiers(access, known) {
+    return known.filter(function(mod) {
+        return access & mod[0];
+    }).map(function(mod) {
+        return mod[1];
+    }).join(' ');
+}
+
+function formatType(type) {
+    var name = type.name;
+    for (var i=0; i < type.array; i++)
+        name += '[]';
+    return name;
+}
+
+module.exports = ClassFile;
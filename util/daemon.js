@@ -0,0 +1,128 @@
+/**
+ * Support for running the server as a daemon shared by
+ *  every vim the user has open. The daemon advertises its
+ *  port in a lockfile (`daemon.json`) in a runtime dir the
+ *  client picks, and exits once it's been idle a while
+ *  so it doesn't hang around forever
+ */
+
+var fs = require('fs')
+  , path = require('path');
+
+var LOCKFILE = 'daemon.json';
+
+/**
+ * @param dir The runtime dir for our lockfile; created
+ *  if it doesn't exist
+ * @param options (optional) A dict with:
+ *  - idleTimeout: ms without a request before we're
+ *      idle (see onIdle). Default: 30 minutes
+ */
+function Daemon(dir, options) {
+    this.dir = dir;
+    this.lockfile = path.join(dir, LOCKFILE);
+    this.idleTimeout = (options && options.idleTimeout) || 30 * 60 * 1000;
+
+    this._idleTimer = null;
+    this._onIdle = null;
+}
+
+/**
+ * Advertise the port we're listening on, unless another
+ *  daemon already is
+ *
+ * @return null if we now hold the lock, else the lock
+ *  info ({pid, port}) of the daemon that does
+ */
+Daemon.prototype.lock = function(port) {
+    if (!fs.existsSync(this.dir))
+        fs.mkdirSync(this.dir, 0700);
+
+    // write it aside and link it into place, so nobody
+    //  ever reads a half-written lockfile
+    var temp = this.lockfile + '.' + process.pid;
+    fs.writeFileSync(temp, JSON.stringify({pid: process.pid, port: port}));
+
+    try {
+        return this._link(temp);
+    } finally {
+        fs.unlinkSync(temp);
+    }
+};
+
+Daemon.prototype._link = function(temp) {
+    for (var attempt = 0; attempt < 2; attempt++) {
+        try {
+            fs.linkSync(temp, this.lockfile);
+            return null;
+        } catch (e) {
+            if (e.code != 'EEXIST')
+                throw e;
+        }
+
+        var owner = this.owner();
+        if (owner)
+            return owner;
+
+        // stale; whoever had it is gone
+        try {
+            fs.unlinkSync(this.lockfile);
+        } catch (e) {
+            // someone beat us to it
+        }
+    }
+
+    return this.owner();
+};
+
+/** Remove the lockfile, if it's ours */
+Daemon.prototype.unlock = function() {
+    var owner = this.owner();
+    if (owner && owner.pid == process.pid)
+        fs.unlinkSync(this.lockfile);
+};
+
+/**
+ * @return The lock info ({pid, port}) of the running
+ *  daemon that holds the lock, if any
+ */
+Daemon.prototype.owner = function() {
+    var info;
+    try {
+        info = JSON.parse(fs.readFileSync(this.lockfile).toString());
+    } catch (e) {
+        return null; // missing, or half-written
+    }
+
+    return isRunning(info.pid) ? info : null;
+};
+
+/**
+ * Call the callback once we've gone idleTimeout
+ *  without a call to touch()
+ */
+Daemon.prototype.onIdle = function(callback) {
+    this._onIdle = callback;
+    this.touch();
+};
+
+/** Note that we're in use */
+Daemon.prototype.touch = function() {
+    if (!this._onIdle)
+        return;
+
+    clearTimeout(this._idleTimer);
+    this._idleTimer = setTimeout(this._onIdle, this.idleTimeout);
+};
+
+function isRunning(pid) {
+    try {
+        process.kill(pid, 0);
+        return true;
+    } catch (e) {
+        // EPERM means it exists, it's just not ours
+        return e.code == 'EPERM';
+    }
+}
+
+module.exports = Daemon;
@@ -0,0 +1,179 @@
+/**
+ * Persistent, per-jar index of the types in a jar and
+ *  the projections we've read out of it, so a new server
+ *  doesn't have to re-read everything it read last time.
+ *
+ * Each jar gets a line-delimited file in the cache dir:
+ *  - A json header: {version, jar, mtime, size}; if the jar's
+ *      mtime or size no longer match, the index is discarded
+ *  - A json array of every type in the jar
+ *  - Any number of `qualifiedName\t{projection json}` lines,
+ *      appended as classes are projected. The json is only
+ *      parsed when that class is requested.
+ */
+
+var fs = require('fs')
+  , path = require('path')
+  , crypto = require('crypto')
+
+  , FORMAT_VERSION = 1;
+
+/**
+ * @param jarPath Path to the jar to index
+ * @param dir (optional) Directory in which to store
+ *  the index; defaults to JarIndex.defaultDir()
+ */
+function JarIndex(jarPath, dir) {
+    this.jar = jarPath;
+    this.path = path.join(dir || JarIndex.defaultDir(),
+        crypto.createHash('sha1').update(jarPath).digest('hex') + '.idx');
+
+    this._classes = {}; // qualifiedName -> raw json
+    this._writable = false;
+}
+
+/**
+ * $NJAST_CACHE_DIR if set, else an njast dir
+ *  in the user's cache directory
+ */
+JarIndex.defaultDir = function() {
+    if (process.env.NJAST_CACHE_DIR)
+        return process.env.NJAST_CACHE_DIR;
+
+    var base = process.env.XDG_CACHE_HOME
+        || path.join(process.env.HOME || process.env.USERPROFILE || '.', '.cache');
+    return path.join(base, 'njast');
+};
+
+/**
+ * Load the index, if it's still valid for the jar
+ *
+ * @param stat fs.Stats for the jar
+ * @param callback fn(types) with the list of types
+ *  in the jar, or null if we don't have a valid index
+ */
+JarIndex.prototype.load = function(stat, callback) {
+    var self = this;
+    fs.readFile(this.path, 'utf8', function(err, contents) {
+        if (err) return callback(null);
+
+        var lines = contents.split('\n');
+        var header, types;
+        try {
+            header = JSON.parse(lines[0]);
+            types = JSON.parse(lines[1]);
+        } catch (e) {
+            return callback(null);
+        }
+
+        if (!self._matches(header, stat))
+            return callback(null);
+
+        for (var i=2; i < lines.length; i++) {
+            var line = lines[i];
+            var tab = line.indexOf('\t');
+            if (~tab)
+                self._classes[line.substr(0, tab)] = line.substr(tab + 1);
+        }
+
+        self._writable = true;
+        callback(types);
+    });
+};
+
+/**
+ * Start a new index for the jar, replacing any old one
+ *
+ * @param stat fs.Stats for the jar
+ * @param types Every type in the jar
+ */
+JarIndex.prototype.create = function(stat, types, callback) {
+    var header = {
+        version: FORMAT_VERSION
+      , jar: this.jar
+      , mtime: stat.mtime.getTime()
+      , size: stat.size
+    };
+    var contents = JSON.stringify(header) + '\n'
+                 + JSON.stringify(types) + '\n';
+
+    var self = this;
+    this._classes = {};
+    mkdirs(path.dirname(this.path), function(err) {
+        if (err) return done(err);
+
+        fs.writeFile(self.path, contents, function(err) {
+            self._writable = !err;
+            done(err);
+        });
+    });
+
+    function done(err) {
+        if (callback) callback(err);
+    }
+};
+
+/**
+ * @return The indexed projection of the class, if any
+ */
+JarIndex.prototype.get = function(qualifiedName) {
+    var raw = this._classes[qualifiedName];
+    if (raw === undefined)
+        return;
+
+    if (typeof(raw) == 'string') {
+        try {
+            raw = this._classes[qualifiedName] = JSON.parse(raw);
+        } catch (e) {
+            delete this._classes[qualifiedName];
+            return;
+        }
+    }
+
+    return raw;
+};
+
+/**
+ * Add a projected class to the index
+ */
+JarIndex.prototype.put = function(projection, callback) {
+    var name = projection.qualifiedName;
+    if (!this._writable || name in this._classes) {
+        if (callback) callback();
+        return;
+    }
+
+    this._classes[name] = projection;
+    fs.appendFile(this.path, name + '\t' + JSON.stringify(projection) + '\n',
+        function(err) {
+            if (callback) callback(err);
+        });
+};
+
+JarIndex.prototype._matches = function(header, stat) {
+    return header
+        && header.version == FORMAT_VERSION
+        && header.jar == this.jar
+        && header.mtime == stat.mtime.getTime()
+        && header.size == stat.size;
+};
+
+/** mkdir -p */
+function mkdirs(dir, callback) {
+    fs.mkdir(dir, function(err) {
+        if (!err || err.code == 'EEXIST')
+            return callback();
+        if (err.code != 'ENOENT')
+            return callback(err);
+
+        mkdirs(path.dirname(dir), function(err) {
+            if (err) return callback(err);
+
+            fs.mkdir(dir, function(err) {
+                callback(err && err.code != 'EEXIST' ? err : null);
+            });
+        });
+    });
+}
+
+module.exports = JarIndex;
@@ -0,0 +1,34 @@
+/**
+ * WorkerPool module that parses the declarations in a
+ *  source file and replies with everything it qualified.
+ *  See SourceClassLoader.walkTypes
+ *
+ * Job: {path: "/path/to/File.java"}
+ * Result: An array of qualified names
+ */
+
+var os = require('os')
+  , readFile = require('../ast').readFile;
+
+// indexing is background work; let the request
+//  workers have the cpu when they need it
+if (os.setPriority) {
+    try {
+        os.setPriority(os.constants.priority.PRIORITY_BELOW_NORMAL);
+    } catch (e) {
+        // not allowed? fine
+    }
+}
+
+process.on('message', function(message) {
+    readFile(message.job.path, {
+        strict: false
+      , declarationsOnly: true
+    }, function(err, ast) {
+        process.send({
+            id: message.id
+          , err: err ? (err.message || String(err)) : undefined
+          , result: err ? undefined : Object.keys(ast.qualifieds)
+        });
+    });
+});
@@ -0,0 +1,258 @@
+/**
+ * Minimal, read-only access to the entries of a jar
+ *  (IE: zip) file, without spawning `jar` or `unzip`.
+ *  Only the central directory is read up front; entries
+ *  are read (and inflated, if necessary) on demand.
+ */
+
+var fs = require('fs')
+  , zlib = require('zlib')
+
+  , EOCD_SIGNATURE = 0x06054b50
+  , EOCD_SIZE = 22
+  , ZIP64_LOCATOR_SIGNATURE = 0x07064b50
+  , ZIP64_LOCATOR_SIZE = 20
+  , ZIP64_EOCD_SIGNATURE = 0x06064b50
+  , CENTRAL_SIGNATURE = 0x02014b50
+  , CENTRAL_SIZE = 46
+  , LOCAL_SIGNATURE = 0x04034b50
+  , LOCAL_SIZE = 30
+  , MAX_COMMENT = 0xffff
+
+  , METHOD_STORED = 0
+  , METHOD_DEFLATED = 8;
+
+function JarFile(path) {
+    this.path = path;
+    this._entries = null;
+    this._pending = null;
+}
+
+/**
+ * Passes a dict of entry name -> entry info to
+ *  the callback: fn(err, entries). The central
+ *  directory is only read once.
+ */
+JarFile.prototype.entries = function(callback) {
+    if (this._entries)
+        return callback(null, this._entries);
+
+    if (this._pending)
+        return this._pending.push(callback);
+
+    var self = this;
+    this._pending = [callback];
+    this._readEntries(function(err, entries) {
+        var pending = self._pending;
+        self._pending = null;
+        if (!err)
+            self._entries = entries;
+
+        pending.forEach(function(cb) {
+            cb(err, entries);
+        });
+    });
+};
+
+/**
+ * Read the (uncompressed) contents of the named entry
+ *  into a Buffer: fn(err, buffer)
+ */
+JarFile.prototype.read = function(name, callback) {
+    var self = this;
+    this.entries(function(err, entries) {
+        if (err) return callback(err);
+
+        var entry = entries[name];
+        if (!entry)
+            return callback(new Error(name + " not in " + self.path));
+
+        self._readEntry(entry, callback);
+    });
+};
+
+JarFile.prototype._readEntries = function(callback) {
+    var self = this;
+    fs.open(this.path, 'r', function(err, fd) {
+        if (err) return callback(err);
+
+        var done = function(err, entries) {
+            fs.close(fd, function() {
+                callback(err, entries);
+            });
+        };
+
+        fs.fstat(fd, function(err, stat) {
+            if (err) return done(err);
+
+            self._readDirectory(fd, stat.size, done);
+        });
+    });
+};
+
+JarFile.prototype._readDirectory = function(fd, size, callback) {
+    // the end of central directory record is at the very
+    //  end, followed only by a (variable-length) comment
+    var tailSize = Math.min(size, EOCD_SIZE + MAX_COMMENT + ZIP64_LOCATOR_SIZE);
+    var tailStart = size - tailSize;
+    var path = this.path;
+    readAt(fd, tailStart, tailSize, function(err, tail) {
+        if (err) return callback(err);
+
+        var eocd = -1;
+        for (var i = tail.length - EOCD_SIZE; i >= 0; i--) {
+            if (tail.readUInt32LE(i) == EOCD_SIGNATURE) {
+                eocd = i;
+                break;
+            }
+        }
+        if (eocd < 0)
+            return callback(new Error("Not a zip file: " + path));
+
+        var count = tail.readUInt16LE(eocd + 10);
+        var dirSize = tail.readUInt32LE(eocd + 12);
+        var dirOffset = tail.readUInt32LE(eocd + 16);
+
+        var locator = eocd - ZIP64_LOCATOR_SIZE;
+        if (locator < 0
+                || tail.readUInt32LE(locator) != ZIP64_LOCATOR_SIGNATURE) {
+            return readCentral(fd, dirOffset, dirSize, count, callback);
+        }
+
+        // zip64; the real numbers are in another record
+        var zip64Offset = readUInt64LE(tail, locator + 8);
+        readAt(fd, zip64Offset, 56, function(err, record) {
+            if (err) return callback(err);
+            if (record.readUInt32LE(0) != ZIP64_EOCD_SIGNATURE)
+                return callback(new Error("Corrupt zip64 directory"));
+
+            readCentral(fd,
+                readUInt64LE(record, 48),
+                readUInt64LE(record, 40),
+                readUInt64LE(record, 32),
+                callback);
+        });
+    });
+};
+
+JarFile.prototype._readEntry = function(entry, callback) {
+    var path = this.path;
+    fs.open(path, 'r', function(err, fd) {
+        if (err) return callback(err);
+
+        var done = function(err, buf) {
+            fs.close(fd, function() {
+                callback(err, buf);
+            });
+        };
+
+        readAt(fd, entry.offset, LOCAL_SIZE, function(err, header) {
+            if (err) return done(err);
+            if (header.readUInt32LE(0) != LOCAL_SIGNATURE)
+                return done(new Error("Corrupt entry " + entry.name));
+
+            // the local header's extra field may differ
+            //  from the one in the central directory
+            var dataStart = entry.offset + LOCAL_SIZE
+                          + header.readUInt16LE(26)
+                          + header.readUInt16LE(28);
+            readAt(fd, dataStart, entry.compressedSize, function(err, data) {
+                if (err) return done(err);
+
+                switch (entry.method) {
+                case METHOD_STORED:
+                    return done(null, data);
+                case METHOD_DEFLATED:
+                    return zlib.inflateRaw(data, done);
+                default:
+                    done(new Error("Unsupported compression "
+                        + entry.method + " for " + entry.name));
+                }
+            });
+        });
+    });
+};
+
+/** Parse `count` central directory headers */
+function readCentral(fd, offset, size, count, callback) {
+    readAt(fd, offset, size, function(err, dir) {
+        if (err) return callback(err);
+
+        var entries = {};
+        var off = 0;
+        for (var i=0; i < count && off + CENTRAL_SIZE <= dir.length; i++) {
+            if (dir.readUInt32LE(off) != CENTRAL_SIGNATURE)
+                return callback(new Error("Corrupt central directory"));
+
+            var nameLen = dir.readUInt16LE(off + 28);
+            var extraLen = dir.readUInt16LE(off + 30);
+            var commentLen = dir.readUInt16LE(off + 32);
+            var entry = {
+                name: dir.toString('utf8', off + CENTRAL_SIZE,
+                                   off + CENTRAL_SIZE + nameLen)
+              , method: dir.readUInt16LE(off + 10)
+              , compressedSize: dir.readUInt32LE(off + 20)
+              , size: dir.readUInt32LE(off + 24)
+              , offset: dir.readUInt32LE(off + 42)
+            };
+
+            if (entry.compressedSize == 0xffffffff
+                    || entry.size == 0xffffffff
+                    || entry.offset == 0xffffffff) {
+                readZip64Extra(dir, off + CENTRAL_SIZE + nameLen, extraLen, entry);
+            }
+
+            entries[entry.name] = entry;
+            off += CENTRAL_SIZE + nameLen + extraLen + commentLen;
+        }
+
+        callback(null, entries);
+    });
+}
+
+/**
+ * Fill in the sizes/offset of an entry that were too
+ *  big for the central directory header. They appear
+ *  (only if needed) in this order
+ */
+function readZip64Extra(buf, start, length, entry) {
+    var end = start + length;
+    while (start + 4 <= end) {
+        var id = buf.readUInt16LE(start);
+        var size = buf.readUInt16LE(start + 2);
+        if (id == 0x0001) {
+            var off = start + 4;
+            ['size', 'compressedSize', 'offset'].forEach(function(key) {
+                if (entry[key] == 0xffffffff) {
+                    entry[key] = readUInt64LE(buf, off);
+                    off += 8;
+                }
+            });
+            return;
+        }
+
+        start += 4 + size;
+    }
+}
+
+function readAt(fd, position, length, callback) {
+    var buf = new Buffer(length);
+    if (!length)
+        return callback(null, buf);
+
+    fs.read(fd, buf, 0, length, position, function(err, read) {
+        if (err) return callback(err);
+        if (read < length)
+            return callback(new Error("Unexpected end of file"));
+
+        callback(null, buf);
+    });
+}
+
+/** Good enough for any offset we could actually read */
+function readUInt64LE(buf, offset) {
+    return buf.readUInt32LE(offset + 4) * 0x100000000
+         + buf.readUInt32LE(offset);
+}
+
+module.exports = JarFile;
@@ -0,0 +1,104 @@
+/**
+ * Table of the offset at which each line of a buffer
+ *  starts, for mapping between lines and offsets without
+ *  rescanning the buffer. Lines end with `\n`, `\r\n`, or
+ *  a lone `\r`, same as the Tokenizer.
+ *
+ * Lines are numbered from 1 at the start of the buffer;
+ *  if the buffer is part of a file (see Ast.parseFile), it's
+ *  up to you to adjust by its `start` line.
+ */
+
+var CR = '\r'.charCodeAt(0)
+  , NL = '\n'.charCodeAt(0);
+
+function LineIndex(buf) {
+    var starts = [0];
+    var len = buf.length;
+    for (var i=0; i < len; i++) {
+        var token = buf[i];
+        if (token == NL || (token == CR && buf[i + 1] != NL))
+            starts.push(i + 1);
+    }
+
+    this._buf = buf;
+    this._starts = starts;
+    this.length = starts.length;
+}
+
+/**
+ * @return The LineIndex for the buffer, building
+ *  it if nobody else has yet
+ */
+LineIndex.of = function(buf) {
+    if (buf._lineIndex)
+        return buf._lineIndex;
+
+    var index = new LineIndex(buf);
+    Object.defineProperty(buf, '_lineIndex', {
+        value: index
+      , configurable: true
+    });
+    return index;
+};
+
+/** @return The (1-indexed) line containing the offset */
+LineIndex.prototype.lineAt = function(offset) {
+    var starts = this._starts;
+    var low = 0;
+    var high = starts.length - 1;
+    while (low < high) {
+        var mid = (low + high + 1) >> 1;
+        if (starts[mid] <= offset)
+            low = mid;
+        else
+            high = mid - 1;
+    }
+
+    return low + 1;
+};
+
+/** @return The offset of the first char on the line, or -1 */
+LineIndex.prototype.lineStart = function(line) {
+    if (line < 1 || line > this.length)
+        return -1;
+    return this._starts[line - 1];
+};
+
+/**
+ * @return The offset just past the last char on the line
+ *  (IE: of its line ending), or -1
+ */
+LineIndex.prototype.lineEnd = function(line) {
+    if (line < 1 || line > this.length)
+        return -1;
+
+    if (line == this.length)
+        return this._buf.length;
+
+    var end = this._starts[line] - 1;
+    if (this._buf[end] == NL && this._buf[end - 1] == CR)
+        end--;
+    return end;
+};
+
+/**
+ * @return The offset of the (1-indexed) line and ch,
+ *  or -1 if there's no such line
+ */
+LineIndex.prototype.offsetOf = function(line, ch) {
+    var start = this.lineStart(line);
+    if (start < 0)
+        return -1;
+    return start + ch - 1;
+};
+
+/** @return The text of the line, without its line ending, or null */
+LineIndex.prototype.getLine = function(line) {
+    var start = this.lineStart(line);
+    if (start < 0)
+        return null;
+    return this._buf.toString('utf-8', start, this.lineEnd(line));
+};
+
+module.exports = LineIndex;
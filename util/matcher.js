@@ -0,0 +1,138 @@
+/**
+ * Matching and ranking of completion candidates by what
+ *  the user has typed so far. In order of preference, a
+ *  name may match the typed text as:
+ *
+ *  - PREFIX: a prefix, same case ("getF" -> "getFoo")
+ *  - PREFIX_IGNORE_CASE: a prefix, any case ("getf" -> "getFoo")
+ *  - CAMEL_CASE: the starts of its humps ("gFB" -> "getFooBar",
+ *      "MV" -> "MAX_VALUE")
+ *  - FUZZY: a subsequence, any case ("gtbar" -> "getFooBar")
+ *
+ * Within a kind of match, shorter names come first (they're
+ *  closer to what was typed), then alphabetical. With nothing
+ *  typed, everything matches and it's just alphabetical
+ */
+
+var PREFIX = 0
+  , PREFIX_IGNORE_CASE = 1
+  , CAMEL_CASE = 2
+  , FUZZY = 3;
+
+/**
+ * @return How the name matches the typed text (IE:
+ *  Matcher.PREFIX), or -1 if it doesn't
+ */
+function match(typed, name) {
+    if (name.substr(0, typed.length) == typed)
+        return PREFIX;
+
+    var lowerTyped = typed.toLowerCase();
+    var lowerName = name.toLowerCase();
+    if (lowerName.substr(0, typed.length) == lowerTyped)
+        return PREFIX_IGNORE_CASE;
+
+    if (lowerTyped.charAt(0) == lowerName.charAt(0)
+            && matchesHumps(lowerTyped, name, lowerName, 1, 1))
+        return CAMEL_CASE;
+
+    if (isSubsequence(lowerTyped, lowerName))
+        return FUZZY;
+
+    return -1;
+}
+
+/**
+ * Filter the items to those whose names match the typed
+ *  text, best matches first
+ *
+ * @param items Array of anything
+ * @param typed What the user's typed
+ * @param nameOf (optional) fn(item) -> its name. By default,
+ *  items are their names
+ * @return A new array
+ */
+function rank(items, typed, nameOf) {
+    typed = typed || '';
+    nameOf = nameOf || function(item) { return item; };
+
+    var matches = [];
+    items.forEach(function(item, index) {
+        var name = nameOf(item);
+        var kind = match(typed, name);
+        if (~kind) {
+            matches.push({
+                item: item
+              , name: name
+              , kind: kind
+              , length: typed.length ? name.length : 0
+              , index: index
+            });
+        }
+    });
+
+    matches.sort(function(a, b) {
+        return (a.kind - b.kind)
+            || (a.length - b.length)
+            || (a.name < b.name ? -1 : (a.name > b.name ? 1 : 0))
+            || (a.index - b.index); // keep overloads in order
+    });
+
+    return matches.map(function(match) {
+        return match.item;
+    });
+}
+
+/**
+ * Match the rest of the (lowercased) typed text, from i,
+ *  against the name from j on: each char continues the
+ *  hump we're in, or starts a later one
+ */
+function matchesHumps(typed, name, lowerName, i, j) {
+    if (i == typed.length)
+        return true;
+
+    for (var k = j; k < name.length; k++) {
+        if (k != j && !isHumpStart(name, k))
+            continue;
+
+        if (typed.charAt(i) == lowerName.charAt(k)
+                && matchesHumps(typed, name, lowerName, i + 1, k + 1))
+            return true;
+    }
+
+    return false;
+}
+
+function isHumpStart(name, index) {
+    var ch = name.charAt(index);
+    var prev = name.charAt(index - 1);
+    if (prev == '_' || prev == '$')
+        return ch != '_' && ch != '$';
+
+    return isUpper(ch) && !isUpper(prev);
+}
+
+function isUpper(ch) {
+    return ch != ch.toLowerCase();
+}
+
+function isSubsequence(typed, name) {
+    var j = 0;
+    for (var i=0; i < typed.length; i++) {
+        j = name.indexOf(typed.charAt(i), j);
+        if (j < 0)
+            return false;
+        j++;
+    }
+    return true;
+}
+
+module.exports = {
+    PREFIX: PREFIX
+  , PREFIX_IGNORE_CASE: PREFIX_IGNORE_CASE
+  , CAMEL_CASE: CAMEL_CASE
+  , FUZZY: FUZZY
+  , match: match
+  , rank: rank
+};
@@ -0,0 +1,49 @@
+/**
+ * Index of fully-qualified type names by their simple
+ *  name (the part after the last `.` or `$`), for quickly
+ *  suggesting imports
+ */
+function NameIndex(types) {
+    this._names = Object.create(null);
+
+    if (types)
+        types.forEach(this.add, this);
+}
+
+NameIndex.simpleName = function(type) {
+    return type.substr(Math.max(type.lastIndexOf('.'), type.lastIndexOf('$')) + 1);
+};
+
+NameIndex.prototype.add = function(type) {
+    var name = NameIndex.simpleName(type);
+    var existing = this._names[name];
+    if (!existing)
+        this._names[name] = [type];
+    else if (!~existing.indexOf(type))
+        existing.push(type);
+};
+
+NameIndex.prototype.remove = function(type) {
+    var name = NameIndex.simpleName(type);
+    var existing = this._names[name];
+    if (!existing)
+        return;
+
+    var index = existing.indexOf(type);
+    if (~index)
+        existing.splice(index, 1);
+    if (!existing.length)
+        delete this._names[name];
+};
+
+/**
+ * @return An array of the qualified names of all
+ *  types with the given simple name; it's yours
+ *  to modify
+ */
+NameIndex.prototype.get = function(name) {
+    var existing = this._names[name];
+    return existing ? existing.slice() : [];
+};
+
+module.exports = NameIndex;
@@ -0,0 +1,171 @@
+/**
+ * Handles requests to the controllers (see util/requests)
+ *  in a pool of util/requestworker processes, so a big
+ *  parse for one buffer doesn't hold up everything else.
+ *
+ * Requests for the same path go to the same worker, where
+ *  its buffer and Ast are, but every worker has its own
+ *  caches. So, types changed in one (IE: on /update) are
+ *  versioned here, and every worker is told to forget
+ *  what it knew about them; see ClassLoader.onTypesChanged
+ *
+ * Likewise, rather than each worker walking a project to
+ *  index its types, we do it once here and hand the result
+ *  to any worker that asks; see ClassLoader.indexWith
+ */
+
+var path = require('path')
+  , ClassLoader = require('../classloader')
+  , SingleFlight = require('./singleflight')
+  , WorkerPool = require('./workerpool');
+
+var REQUEST_WORKER = path.join(__dirname, 'requestworker.js');
+
+// what waits for what, when the workers are busy
+var PRIORITIES = {
+    '/suggest': WorkerPool.Priority.INTERACTIVE
+  , '/define': WorkerPool.Priority.INTERACTIVE
+  , '/document': WorkerPool.Priority.INTERACTIVE
+  , '/implement': WorkerPool.Priority.INTERACTIVE
+  , '/init': WorkerPool.Priority.BACKGROUND
+  , '/update': WorkerPool.Priority.BACKGROUND
+};
+
+/**
+ * @param size How many workers to handle requests in
+ */
+function RequestPool(size) {
+    var pool = this._pool = new WorkerPool(REQUEST_WORKER, size);
+
+    // search paths -> {searches, fileTypes}; see _index
+    this._indexes = {};
+    this._indexing = new SingleFlight();
+
+    // new workers start with the versions we've handed out,
+    //  so theirs match everyone else's
+    pool.on('spawn', function(worker) {
+        pool.tell(worker, {versions: ClassLoader.versions()});
+    });
+
+    var self = this;
+    pool.on('message', function(message, worker) {
+        if (message.index)
+            return self._index(message.index, worker);
+
+        var changed = message.changed;
+        if (!changed) return;
+
+        self._reindex(changed.path, changed.types);
+        pool.broadcast({
+            path: changed.path
+          , types: changed.types
+          , versions: ClassLoader.versionTypes(changed.types)
+          , origin: worker.pid
+        });
+    });
+}
+
+/** Handle the request like Requests.handle, but in a worker */
+RequestPool.prototype.handle = function(endpoint, req, res) {
+    var pool = this._pool;
+    var stopWorker = req.timer.start('worker');
+    pool.run({
+        endpoint: endpoint
+      , body: req.body
+    }, {
+        key: req.body && req.body.path
+      , priority: PRIORITIES[endpoint]
+    }, function(err, result) {
+        stopWorker();
+        if (err) return res.send(500, err.message);
+
+        // count the worker's phases as ours
+        Object.keys(result.phases).forEach(function(phase) {
+            req.timer.phases[phase] = result.phases[phase];
+        });
+
+        // the worker's forgotten the buffer; next time it's
+        //  opened, whoever's least busy can have it
+        if (endpoint == '/close' && result.status < 400)
+            pool.release(req.body.path);
+
+        if (result.json)
+            res.json(result.status, result.body);
+        else
+            res.send(result.status, result.body);
+    });
+};
+
+/**
+ * Ask every worker for its stats (see the /stats controller)
+ * @param callback fn(err, snapshots), with a snapshot from each
+ */
+RequestPool.prototype.stats = function(callback) {
+    this._pool.runEach({
+        endpoint: '/stats'
+      , body: {snapshot: true}
+    }, {
+        priority: WorkerPool.Priority.INTERACTIVE
+    }, function(err, results) {
+        if (err) return callback(err);
+
+        callback(null, results.map(function(result) {
+            return result.body;
+        }));
+    });
+};
+
+/**
+ * Tell the worker the types in the search paths, walking
+ *  them first if nobody's asked for them before
+ */
+RequestPool.prototype._index = function(searches, worker) {
+    var key = searches.join(path.delimiter);
+    var indexes = this._indexes;
+    var pool = this._pool;
+
+    function reply(err, fileTypes) {
+        pool.tell(worker, {
+            indexed: {
+                searches: key
+              , err: err ? (err.message || String(err)) : undefined
+              , fileTypes: fileTypes
+            }
+        });
+    }
+
+    if (indexes[key])
+        return reply(null, indexes[key].fileTypes);
+
+    this._indexing.run(key, function(done) {
+        var progress = {found: 0, indexed: 0, indexing: true};
+        ClassLoader.indexSources(searches, progress, null, function(err, fileTypes) {
+            if (!err)
+                indexes[key] = {searches: searches, fileTypes: fileTypes};
+            done(err, fileTypes);
+        });
+    }, reply);
+};
+
+/**
+ * Keep our indexes current with a file a worker changed,
+ *  as its SourceClassLoader would (see invalidate)
+ */
+RequestPool.prototype._reindex = function(file, types) {
+    var indexes = this._indexes;
+    Object.keys(indexes).forEach(function(key) {
+        var index = indexes[key];
+        var searched = index.searches.some(function(dir) {
+            return file.indexOf(dir + path.sep) === 0;
+        });
+
+        if (searched)
+            index.fileTypes[file] = types;
+    });
+};
+
+RequestPool.prototype.close = function() {
+    this._pool.close();
+};
+
+module.exports = RequestPool;
@@ -0,0 +1,214 @@
+/**
+ * Handles requests to the controllers: syncing buffers,
+ *  parsing, and resolving types. server.js either calls
+ *  this directly or, with workers, forwards each request
+ *  to a util/requestworker process that does.
+ *
+ * Since each process has its own BufferStore and class
+ *  loaders, everything for one path should be handled
+ *  by the same process; util/requestpool tells the rest
+ *  when one changes a type
+ */
+
+var fs = require('fs')
+  , path = require('path')
+  , parseFile = require('../ast').parseFile
+  , ClassLoader = require('../classloader')
+  , BufferStore = require('./buffers');
+
+var CONTROLLERS_DIR = path.join(__dirname, '..', 'controllers');
+
+// last-synced text of each buffer, by path
+var buffers = new BufferStore();
+
+// endpoint -> controller
+var controllers = {};
+
+// --------------------------------------------------------------------------------
+// middleware
+// --------------------------------------------------------------------------------
+
+// middleware that handles request body
+var bufferParser = function(req, res, next) {
+
+    if (!req.body)
+        return res.send(400, "Empty body");
+    else if (!req.body.pos)
+        return res.send(400, "No pos");
+
+    var path = req.body.path;
+    var line = req.body.pos[0];
+    var ch   = req.body.pos[1];
+    var file = req.body.buffer;
+
+    if (!(path && line && file !== undefined && ch !== undefined)) {
+        console.log("400!", path, line, ch, file);
+        return res.send(400);
+    }
+
+    if (typeof(file) == 'string')
+        file = {type: 'full', text: file};
+
+    var stopBuffer = req.timer.start('buffer');
+    if (BufferStore.isSynced(file)) {
+        file = buffers.resolve(path, file);
+        stopBuffer();
+        if (!file)
+            return res.send(409, "Stale buffer version");
+    } else {
+        file.text = new Buffer(file.text); // FIXME encoding?
+        stopBuffer();
+    }
+
+    req.path = path;
+    req.line = line;
+    req.ch = ch;
+    req.start = 0;
+    req.buf = file
+
+    /** 
+     * Convenience function to get an ast.
+     *  Unlike parseFile, strict defaults to false, and
+     *  method bodies are only parsed as needed
+     */
+    req.ast = function(options, callback) {
+        if (!callback) {
+            callback = options;
+            options = {strict: false, lazyBodies: true};
+        }
+
+        callback = req.timer.wrap('parse', callback);
+
+        if (req.buf.version !== undefined)
+            buffers.parse(path, req.buf, options, callback);
+        else
+            parseFile(path, req.buf, options, callback);
+    };
+
+    req.classLoader = function() {
+        return ClassLoader.cachedFromSource(path);
+    };
+
+    /** same stuff for document and define, so... */
+    req.resolveDeclaringNode = function(cb) {
+
+        var loader = req.classLoader();
+        req.ast(function(err, ast) {
+            if (err) return res.send(400, err.message);
+
+            var stopLocate = req.timer.start('locate');
+            var node = ast.locate(req.line, req.ch);
+            stopLocate();
+
+            node.resolveDeclaringType(loader, req.timer.wrap('evaluateType', 
+                    function(err, type) {
+                if (err) return res.send(400, err.message);
+
+                var declaring = ast.qualifieds[type];
+                if (declaring) {
+                    // yes, it's local... is it a type?
+                    if (declaring.name == node.name)
+                        // class, enum, etc.
+                        return cb(declaring.constructor.name.toLowerCase(), declaring);
+
+                    // search by scope
+                    var varDef = node.searchScope(node.name)
+                    if (varDef)
+                        return cb('var', varDef);
+
+                    var method = node.searchMethodScope(node.name);
+                    if (method)
+                        return cb('method', method);
+                }
+
+                // TODO parent types?
+                res.json({error:"Not implemented; found: " + node.constructor.name + " in " + type});
+            }));
+        });
+    };
+
+    /**
+     * Respond with the results; `extra` (optional) has any
+     *  other fields for the response (and may override
+     *  where the results start)
+     */
+    res.results = function(json, extra) {
+        var response = {
+            // TODO proper start/end locations?
+            start: {ch: ch}
+          , end: {ch: ch} 
+          , results: json
+        };
+        if (extra) {
+            Object.keys(extra).forEach(function(key) {
+                response[key] = extra[key];
+            });
+        }
+        res.json(response);
+    };
+
+    next();
+};
+
+// --------------------------------------------------------------------------------
+// controllers
+// --------------------------------------------------------------------------------
+
+// the client is done with a buffer; forget
+//  its text and let its Ast be evicted
+controllers['/close'] = function(req, res) {
+    var path = req.body.path;
+    if (!path)
+        return res.send(400, "No path");
+
+    buffers.remove(path, req.body.client);
+    ClassLoader.cachedFromSource(path).unpin(path);
+    res.send(204);
+};
+controllers['/close'].usesBuffers = false;
+
+fs.readdirSync(CONTROLLERS_DIR).forEach(function(file) {
+    var endpoint = '/' + file.substr(0, file.indexOf('.'));
+    if (endpoint == '/')
+        return;
+
+    controllers[endpoint] = require(path.join(CONTROLLERS_DIR, file));
+});
+
+/** @return The endpoints we have controllers for (IE: '/suggest') */
+function endpoints() {
+    return Object.keys(controllers);
+}
+
+/**
+ * @return True if the endpoint must be handled by the
+ *  process that got the request (IE: it reports on that
+ *  process), rather than by a worker
+ */
+function isLocal(endpoint) {
+    return !!controllers[endpoint].local;
+}
+
+/**
+ * Handle a request to the endpoint. The req needs a body
+ *  and a timer (see util/stats); the res needs send() and
+ *  json() that work like express's
+ */
+function handle(endpoint, req, res) {
+    var controller = controllers[endpoint];
+    if (!controller)
+        return res.send(404, "No such endpoint: " + endpoint);
+
+    if (controller.usesBuffers === false)
+        return controller(req, res);
+
+    bufferParser(req, res, function() {
+        controller(req, res);
+    });
+}
+
+module.exports = {
+    endpoints: endpoints
+  , isLocal: isLocal
+  , handle: handle
+};
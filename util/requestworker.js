@@ -0,0 +1,121 @@
+/**
+ * WorkerPool module that handles requests to the
+ *  controllers; see util/requests and server.js
+ *
+ * Job: {endpoint: "/suggest", body: {...}}
+ * Result: {status: 200, body: ..., json: true, phases: {...}}
+ *  where `json` is set if the body should be sent as json,
+ *  and `phases` is the ms spent in each phase of handling
+ *  it (see Stats.RequestTimer)
+ *
+ * Types we change are versioned by the pool, which tells
+ *  every worker about each change (see util/requestpool)
+ *  with messages like `{path, types, versions, origin}`
+ *
+ * Projects are indexed by the pool, too; we ask with
+ *  `{index: searches}` and it replies with messages like
+ *  `{indexed: {searches, err, fileTypes}}`
+ */
+
+var path = require('path')
+  , ClassLoader = require('../classloader')
+  , Requests = require('./requests')
+  , SingleFlight = require('./singleflight')
+  , Stats = require('./stats');
+
+// one ask of the pool for each project's index, however
+//  many loaders want it; its reply goes to _indexed[searches]
+var _indexing = new SingleFlight()
+  , _indexed = {};
+
+ClassLoader.onTypesChanged(function(path, types) {
+    process.send({job: {changed: {path: path, types: types}}});
+});
+
+ClassLoader.indexWith(function(searches, callback) {
+    var key = searches.join(path.delimiter);
+    _indexing.run(key, function(done) {
+        _indexed[key] = done;
+        process.send({job: {index: searches}});
+    }, callback);
+});
+
+process.on('message', function(message) {
+    if (message.id === undefined && message.job.indexed)
+        return indexed(message.job.indexed);
+    if (message.id === undefined)
+        return sync(message.job);
+
+    var endpoint = message.job.endpoint;
+    var timer = new Stats.RequestTimer(endpoint);
+    var replied = false;
+
+    var reply = function(status, body, json) {
+        if (replied) return;
+        replied = true;
+
+        // the pool records the request (with our phases),
+        //  so we don't finish() it here too
+        process.send({
+            id: message.id
+          , result: {
+                status: status
+              , body: body
+              , json: json
+              , phases: timer.phases
+            }
+        });
+    };
+
+    // just enough of express's
+    var req = {body: message.job.body, timer: timer};
+    var res = {
+        send: function(status, body) {
+            if (typeof(status) != 'number') {
+                body = status;
+                status = 200;
+            }
+
+            if (body instanceof Error)
+                body = body.message;
+            reply(status, body, !!body && typeof(body) == 'object');
+        }
+
+      , json: function(status, body) {
+            if (typeof(status) != 'number') {
+                body = status;
+                status = 200;
+            }
+            reply(status, body, true);
+        }
+    };
+
+    try {
+        Requests.handle(endpoint, req, res);
+    } catch (e) {
+        console.error("requestworker:", endpoint, e.stack || e);
+        res.send(500, e.message);
+    }
+});
+
+/** Catch up with a change from the pool */
+function sync(change) {
+    // the worker that made it already knows it
+    if (change.path && change.origin !== process.pid)
+        ClassLoader.invalidate(change.path, change.types);
+
+    if (change.versions)
+        ClassLoader.setVersions(change.versions);
+}
+
+/** Hand the pool's index to whoever's waiting on it */
+function indexed(index) {
+    var done = _indexed[index.searches];
+    if (!done) return;
+
+    delete _indexed[index.searches];
+    if (index.err)
+        return done(new Error(index.err));
+
+    done(null, index.fileTypes);
+}
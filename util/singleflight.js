@@ -0,0 +1,40 @@
+/**
+ * Table of in-flight work by key, so concurrent callers
+ *  asking for the same thing share one computation
+ *  instead of each doing it themselves
+ */
+function SingleFlight() {
+    this._pending = Object.create(null);
+}
+
+/**
+ * Call `work(done)` for the key, unless it's already in
+ *  flight, in which case the callback just waits for that.
+ *  Either way, the callback gets whatever args `done` does.
+ */
+SingleFlight.prototype.run = function(key, work, callback) {
+    var pending = this._pending[key];
+    if (pending)
+        return pending.push(callback);
+
+    var self = this;
+    var callbacks = this._pending[key] = [callback];
+    work(function() {
+        if (self._pending[key] !== callbacks)
+            return; // called twice?
+
+        delete self._pending[key];
+
+        var args = arguments;
+        callbacks.forEach(function(cb) {
+            cb.apply(null, args);
+        });
+    });
+};
+
+/** @return True if there's work in flight for the key */
+SingleFlight.prototype.has = function(key) {
+    return key in this._pending;
+};
+
+module.exports = SingleFlight;
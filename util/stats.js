@@ -0,0 +1,266 @@
+/**
+ * Latency histograms by name, for the /stats endpoint.
+ *
+ * Requests are timed with a RequestTimer, which records
+ *  the time spent in each phase of handling it (parsing,
+ *  locating, evaluating types, etc.) and, when finished,
+ *  adds them to the histograms for its endpoint. Work that
+ *  isn't tied to a request (IE: inside the ClassLoaders)
+ *  is timed directly with Stats.time()
+ */
+
+// upper bounds of our histogram buckets, in ms
+var BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+  // how many of the most recent requests we keep
+  //  the phase breakdowns of
+  , MAX_RECENT = 20;
+
+var _histograms = {}
+  , _recent = [];
+
+function Histogram() {
+    this.count = 0;
+    this.total = 0;
+    this.max = 0;
+
+    // the last is for everything over our biggest bucket
+    this.buckets = BUCKETS.map(function() { return 0; });
+    this.buckets.push(0);
+}
+
+Histogram.prototype.add = function(ms) {
+    this.count++;
+    this.total += ms;
+    this.max = Math.max(this.max, ms);
+
+    for (var i=0; i < BUCKETS.length; i++) {
+        if (ms <= BUCKETS[i])
+            break;
+    }
+    this.buckets[i]++;
+};
+
+/**
+ * Add the measurements of another Histogram (or one
+ *  from snapshot(), IE: from another process) to ours
+ */
+Histogram.prototype.merge = function(other) {
+    this.count += other.count;
+    this.total += other.total;
+    this.max = Math.max(this.max, other.max);
+    other.buckets.forEach(function(count, i) {
+        this.buckets[i] += count;
+    }, this);
+};
+
+/**
+ * @return The upper bound of the bucket holding the
+ *  given percentile (0-100), or our max if it's past
+ *  our biggest bucket
+ */
+Histogram.prototype.percentile = function(p) {
+    var wanted = Math.ceil(this.count * p / 100);
+    var seen = 0;
+    for (var i=0; i < BUCKETS.length; i++) {
+        seen += this.buckets[i];
+        if (seen >= wanted)
+            return Math.min(BUCKETS[i], this.max);
+    }
+    return this.max;
+};
+
+Histogram.prototype.toJSON = function() {
+    var buckets = {};
+    this.buckets.forEach(function(count, i) {
+        if (!count)
+            return;
+
+        var name = i < BUCKETS.length
+            ? '<=' + BUCKETS[i]
+            : '>' + BUCKETS[BUCKETS.length - 1];
+        buckets[name] = count;
+    });
+
+    return {
+        count: this.count
+      , mean: this.count ? round(this.total / this.count) : 0
+      , p50: round(this.percentile(50))
+      , p90: round(this.percentile(90))
+      , p99: round(this.percentile(99))
+      , max: round(this.max)
+      , buckets: buckets
+    };
+};
+
+
+/**
+ * Times the phases of a single request to the endpoint
+ */
+function RequestTimer(endpoint) {
+    this.endpoint = endpoint;
+    this.phases = {}; // phase -> total ms
+    this._started = process.hrtime();
+}
+
+/**
+ * Start timing a phase
+ * @return A function to call when the phase is done;
+ *  it returns the elapsed ms. A phase may be timed
+ *  more than once; its times are summed
+ */
+RequestTimer.prototype.start = function(phase) {
+    var phases = this.phases;
+    var started = process.hrtime();
+    return function() {
+        var ms = elapsed(started);
+        phases[phase] = (phases[phase] || 0) + ms;
+        return ms;
+    };
+};
+
+/**
+ * Time a phase from now until the returned
+ *  function is called, then call through to
+ *  the callback
+ */
+RequestTimer.prototype.wrap = function(phase, callback) {
+    var stop = this.start(phase);
+    return function() {
+        stop();
+        return callback.apply(this, arguments);
+    };
+};
+
+/**
+ * Record the request and its phases in our histograms.
+ *  Only the first call has any effect
+ */
+RequestTimer.prototype.finish = function() {
+    if (this.total !== undefined)
+        return;
+
+    this.total = elapsed(this._started);
+
+    var endpoint = this.endpoint;
+    var phases = this.phases;
+    record(endpoint, this.total);
+    Object.keys(phases).forEach(function(phase) {
+        record(endpoint + ' ' + phase, phases[phase]);
+    });
+
+    _recent.push(this.toJSON());
+    if (_recent.length > MAX_RECENT)
+        _recent.shift();
+};
+
+RequestTimer.prototype.toJSON = function() {
+    var phases = this.phases;
+    return {
+        endpoint: this.endpoint
+      , total: round(this.total)
+      , phases: Object.keys(phases).reduce(function(result, phase) {
+            result[phase] = round(phases[phase]);
+            return result;
+        }, {})
+    };
+};
+
+
+/** Add a measurement (in ms) to the named histogram */
+function record(name, ms) {
+    var histogram = _histograms[name];
+    if (!histogram)
+        histogram = _histograms[name] = new Histogram();
+
+    histogram.add(ms);
+}
+
+/**
+ * Start timing something outside of a request
+ * @return A function to call when it's done, which
+ *  records the elapsed ms under the name
+ */
+function time(name) {
+    var started = process.hrtime();
+    return function() {
+        var ms = elapsed(started);
+        record(name, ms);
+        return ms;
+    };
+}
+
+/**
+ * @return Our histograms, raw, for another process to
+ *  merge into its report()
+ */
+function snapshot() {
+    var histograms = {};
+    Object.keys(_histograms).forEach(function(name) {
+        var histogram = _histograms[name];
+        histograms[name] = {
+            count: histogram.count
+          , total: histogram.total
+          , max: histogram.max
+          , buckets: histogram.buckets.slice()
+        };
+    });
+    return histograms;
+}
+
+/**
+ * @param snapshots (optional) snapshot()s from other
+ *  processes (IE: request workers) to merge into ours
+ * @return A dict with:
+ *  - histograms: name -> summary of the histogram
+ *  - recent: phase breakdowns of the most recent requests,
+ *      oldest first
+ */
+function report(snapshots) {
+    var merged = _histograms;
+    if (snapshots && snapshots.length) {
+        merged = {};
+        [_histograms].concat(snapshots).forEach(function(histograms) {
+            Object.keys(histograms).forEach(function(name) {
+                if (!merged[name])
+                    merged[name] = new Histogram();
+                merged[name].merge(histograms[name]);
+            });
+        });
+    }
+
+    var histograms = {};
+    Object.keys(merged).sort().forEach(function(name) {
+        histograms[name] = merged[name].toJSON();
+    });
+
+    return {
+        histograms: histograms
+      , recent: _recent.slice()
+    };
+}
+
+function reset() {
+    _histograms = {};
+    _recent = [];
+}
+
+/** @return ms since the process.hrtime() */
+function elapsed(started) {
+    var diff = process.hrtime(started);
+    return diff[0] * 1e3 + diff[1] / 1e6;
+}
+
+function round(ms) {
+    return Math.round(ms * 100) / 100;
+}
+
+module.exports = {
+    Histogram: Histogram
+  , RequestTimer: RequestTimer
+  , record: record
+  , time: time
+  , snapshot: snapshot
+  , report: report
+  , reset: reset
+};
@@ -0,0 +1,75 @@
+var NameIndex = require('./nameindex');
+
+/**
+ * Registry of the types declared in a set of source
+ *  files, with O(1) membership tests and per-file updates
+ *  (IE: the cost of re-registering a file is proportional
+ *  to the number of types in it, not the whole project)
+ */
+function TypeRegistry() {
+    this._types = Object.create(null); // type -> file
+    this._files = Object.create(null); // file -> {type: true}
+    this._names = new NameIndex();
+    this.size = 0;
+}
+
+/**
+ * Replace the types registered for the file
+ *  with the given list
+ */
+TypeRegistry.prototype.setFileTypes = function(file, types) {
+    var existing = this._files[file];
+    var updated = Object.create(null);
+    var self = this;
+
+    types.forEach(function(type) {
+        updated[type] = true;
+        if (self._types[type] === file)
+            return; // already have it
+
+        if (!(type in self._types))
+            self.size++;
+        self._types[type] = file;
+        self._names.add(type);
+    });
+
+    if (existing) {
+        Object.keys(existing).forEach(function(type) {
+            if (updated[type] || self._types[type] !== file)
+                return; // still here, or moved to another file
+
+            delete self._types[type];
+            self._names.remove(type);
+            self.size--;
+        });
+    }
+
+    this._files[file] = updated;
+};
+
+TypeRegistry.prototype.has = function(type) {
+    return type in this._types;
+};
+
+/** @return An array of every registered type */
+TypeRegistry.prototype.types = function() {
+    return Object.keys(this._types);
+};
+
+/** @return An array of the types registered for the file */
+TypeRegistry.prototype.fileTypes = function(file) {
+    var types = this._files[file];
+    return types ? Object.keys(types) : [];
+};
+
+/** @return The file the type was registered for, if any */
+TypeRegistry.prototype.fileOf = function(type) {
+    return this._types[type];
+};
+
+/** @return An array of the types with the given simple name */
+TypeRegistry.prototype.suggest = function(name) {
+    return this._names.get(name);
+};
+
+module.exports = TypeRegistry;
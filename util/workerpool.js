@@ -0,0 +1,376 @@
+/**
+ * Pool of forked node processes for spreading cpu-bound
+ *  work (like parsing) across cores. Workers are started
+ *  lazily, as there's work for them, up to `size`.
+ *
+ * Jobs may be given a `key`; jobs with the same key always
+ *  run on the same worker (for as long as it lives, or until
+ *  the key is released) so any state it keeps for them stays
+ *  warm. Queued jobs run in
+ *  order of their `priority`, then in the order they came in.
+ *
+ * A worker gets one job at a time, except INTERACTIVE ones:
+ *  those are sent right away, busy or not, so they never wait
+ *  behind a long job (IE: one that indexes a whole project).
+ *  So, workers given those must handle jobs concurrently,
+ *  as an async module does anyway.
+ *
+ * The worker module should listen for messages like
+ *  `{id, job}` and reply to each with `{id, err, result}`,
+ *  where `err` is a message string (Errors don't survive
+ *  the trip between processes). Messages without an `id`
+ *  aren't jobs, and get no reply: the pool sends them with
+ *  tell() or broadcast(), and emits those from a worker as
+ *  a 'message' event (with the worker). A 'spawn' event is
+ *  emitted (with the worker) for each new worker, before
+ *  it's given any jobs
+ */
+
+var fork = require('child_process').fork
+  , os = require('os')
+  , util = require('util')
+  , EventEmitter = require('events').EventEmitter;
+
+/**
+ * @param module Path to the worker module
+ * @param size (optional) Max number of workers;
+ *  defaults to the number of cores
+ * @param env (optional) Environment for the workers;
+ *  defaults to ours
+ */
+function WorkerPool(module, size, env) {
+    EventEmitter.call(this);
+
+    this.module = module;
+    this.size = size || os.cpus().length;
+    this.env = env;
+
+    this._workers = [];
+    this._idle = [];
+    this._queue = []; // un-keyed tasks, for any worker
+    this._affinity = {}; // key -> worker
+    this._nextId = 0;
+    this._closed = false;
+}
+util.inherits(WorkerPool, EventEmitter);
+
+/** Lower runs first */
+WorkerPool.Priority = {
+    INTERACTIVE: 0
+  , NORMAL: 1
+  , BACKGROUND: 2
+};
+
+/**
+ * Run a job on the next free worker
+ *
+ * @param job Anything json-serializable; it's passed
+ *  to the worker as-is
+ * @param options (optional) A dict with:
+ *  - key: Jobs with the same key run on the same worker
+ *  - priority: One of WorkerPool.Priority (default: NORMAL)
+ * @param callback fn(err, result)
+ */
+WorkerPool.prototype.run = function(job, options, callback) {
+    if (!callback) {
+        callback = options;
+        options = {};
+    }
+
+    if (this._closed)
+        return callback(new Error("WorkerPool is closed"));
+
+    this._enqueue({
+        id: this._nextId++
+      , job: job
+      , key: options.key
+      , priority: options.priority === undefined
+            ? WorkerPool.Priority.NORMAL
+            : options.priority
+      , callback: callback
+    });
+    this._dispatch();
+};
+
+/**
+ * Run the job once on every running worker (IE: to ask
+ *  each about itself); options are as for run()
+ * @param callback fn(err, results), with the result from
+ *  each worker; if any fails, only its err is given
+ */
+WorkerPool.prototype.runEach = function(job, options, callback) {
+    if (!callback) {
+        callback = options;
+        options = {};
+    }
+
+    if (this._closed)
+        return callback(new Error("WorkerPool is closed"));
+
+    var results = [];
+    var pending = this._workers.length;
+    var failed = false;
+    if (!pending)
+        return callback(null, results);
+
+    this._workers.forEach(function(worker, i) {
+        this._enqueue({
+            id: this._nextId++
+          , job: job
+          , worker: worker
+          , priority: options.priority === undefined
+                ? WorkerPool.Priority.NORMAL
+                : options.priority
+          , callback: function(err, result) {
+                if (failed) return;
+                if (err) {
+                    failed = true;
+                    return callback(err);
+                }
+
+                results[i] = result;
+                if (!--pending)
+                    callback(null, results);
+            }
+        });
+    }, this);
+    this._dispatch();
+};
+
+/**
+ * Send the worker something that isn't a job
+ *  (see above); it doesn't reply
+ */
+WorkerPool.prototype.tell = function(worker, message) {
+    if (worker.connected)
+        worker.send({job: message});
+};
+
+/** tell() every running worker */
+WorkerPool.prototype.broadcast = function(message) {
+    this._workers.forEach(function(worker) {
+        this.tell(worker, message);
+    }, this);
+};
+
+/**
+ * Forget which worker runs jobs for the key (IE: once it's
+ *  dropped whatever it kept for them); the key's next job
+ *  goes to whichever worker is least busy
+ */
+WorkerPool.prototype.release = function(key) {
+    var worker = this._affinity[key];
+    if (!worker)
+        return;
+
+    delete this._affinity[key];
+    worker._keys.splice(worker._keys.indexOf(key), 1);
+};
+
+/**
+ * Let the workers exit once they're done with what
+ *  they're working on. Anything still queued fails
+ */
+WorkerPool.prototype.close = function() {
+    this._closed = true;
+
+    var queued = this._workers.reduce(function(tasks, worker) {
+        var queue = worker._queue;
+        worker._queue = [];
+        return tasks.concat(queue);
+    }, this._queue);
+    this._queue = [];
+    queued.forEach(function(task) {
+        task.callback(new Error("WorkerPool is closed"));
+    });
+
+    this._idle.forEach(function(worker) {
+        worker.disconnect();
+    });
+    this._idle = [];
+};
+
+WorkerPool.prototype._enqueue = function(task) {
+    var queue = task.worker
+        ? task.worker._queue
+        : task.key === undefined
+            ? this._queue
+            : this._workerFor(task.key)._queue;
+
+    // keep it sorted by priority; FIFO within one
+    var i = queue.length;
+    while (i > 0 && queue[i - 1].priority > task.priority)
+        i--;
+    queue.splice(i, 0, task);
+};
+
+/**
+ * @return The worker that runs jobs for the key,
+ *  assigning one if there isn't one yet
+ */
+WorkerPool.prototype._workerFor = function(key) {
+    var worker = this._affinity[key];
+    if (worker)
+        return worker;
+
+    if (this._workers.length < this.size) {
+        worker = this._spawn();
+    } else {
+        worker = leastLoaded(this._workers);
+    }
+
+    worker._keys.push(key);
+    this._affinity[key] = worker;
+    return worker;
+};
+
+WorkerPool.prototype._dispatch = function() {
+    var self = this;
+    for (;;) {
+        this._idle = this._idle.filter(function(worker) {
+            return !self._next(worker);
+        });
+
+        if (!this._queue.length || this._workers.length >= this.size)
+            break; // nothing left, or everyone's busy
+
+        this._spawn();
+    }
+
+    // urgent ones don't wait for anyone to be free
+    this._workers.forEach(function(worker) {
+        while (isUrgent(worker._queue[0]))
+            self._send(worker, worker._queue.shift());
+    });
+    while (isUrgent(this._queue[0]))
+        this._send(leastLoaded(this._workers), this._queue.shift());
+};
+
+/**
+ * Send the worker the most urgent task it can run
+ * @return True if it got one
+ */
+WorkerPool.prototype._next = function(worker) {
+    var own = worker._queue[0];
+    var shared = this._queue[0];
+    var task;
+    if (own && (!shared || !runsBefore(shared, own)))
+        task = worker._queue.shift();
+    else if (shared)
+        task = this._queue.shift();
+    else
+        return false;
+
+    this._send(worker, task);
+    return true;
+};
+
+/** Send the worker the task, busy or not */
+WorkerPool.prototype._send = function(worker, task) {
+    worker._running[task.id] = task;
+    worker._busy++;
+    worker.send({id: task.id, job: task.job});
+};
+
+WorkerPool.prototype._spawn = function() {
+    var self = this;
+    var worker = fork(this.module, [], {env: this.env});
+    worker._queue = [];
+    worker._keys = [];
+    worker._running = {}; // id -> task
+    worker._busy = 0;
+    this._workers.push(worker);
+    this._idle.push(worker);
+
+    worker.on('message', function(message) {
+        if (message.id === undefined)
+            return self.emit('message', message.job, worker);
+
+        var task = worker._running[message.id];
+        if (!task)
+            return; // not for us?
+
+        delete worker._running[message.id];
+        if (!--worker._busy) {
+            if (self._closed) {
+                worker.disconnect();
+            } else {
+                self._idle.push(worker);
+                self._dispatch();
+            }
+        }
+
+        task.callback(message.err ? new Error(message.err) : null,
+            message.result);
+    });
+
+    worker.on('exit', function(code) {
+        self._workers.splice(self._workers.indexOf(worker), 1);
+
+        var idle = self._idle.indexOf(worker);
+        if (~idle)
+            self._idle.splice(idle, 1);
+
+        // its keys go to whoever gets their next job
+        worker._keys.forEach(function(key) {
+            delete self._affinity[key];
+        });
+
+        var running = worker._running;
+        worker._running = {};
+        worker._busy = 0;
+        Object.keys(running).forEach(function(id) {
+            running[id].callback(new Error("Worker exited (" + code + ")"));
+        });
+
+        var queued = worker._queue;
+        worker._queue = [];
+        if (self._closed) {
+            queued.forEach(function(task) {
+                task.callback(new Error("WorkerPool is closed"));
+            });
+            return;
+        }
+
+        // replace it, if there's still work to do; but
+        //  anything just for it (see runEach) is done for
+        queued.forEach(function(task) {
+            if (task.worker)
+                task.callback(new Error("Worker exited (" + code + ")"));
+            else
+                self._enqueue(task);
+        });
+        self._dispatch();
+    });
+
+    this.emit('spawn', worker);
+    return worker;
+};
+
+/** @return True if task a should run before task b */
+function runsBefore(a, b) {
+    return a.priority < b.priority
+        || (a.priority == b.priority && a.id < b.id);
+}
+
+function isUrgent(task) {
+    return task && task.priority == WorkerPool.Priority.INTERACTIVE;
+}
+
+/**
+ * @return How busy the worker is, for picking one to
+ *  take a new key; queued work counts most, then keys
+ */
+function load(worker) {
+    var tasks = worker._queue.length + worker._busy;
+    return tasks + worker._keys.length / 1000;
+}
+
+/** @return The worker with the least on its plate */
+function leastLoaded(workers) {
+    return workers.reduce(function(best, candidate) {
+        return load(candidate) < load(best) ? candidate : best;
+    });
+}
+
+module.exports = WorkerPool;